@@ -0,0 +1,373 @@
+import sys
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Battle_game_headless import Match, Random_Policy
+from Battle_game_rng import Roll_Stream
+from Battle_game_state import state_from_match, state_from_roster
+
+# Computer players which choose moves by searching ahead through Game_States
+# There are two searches:
+# - "expectimax" looks at every action and every way it can turn out, to a fixed number of decisions ahead
+# - "mcts" (Monte Carlo tree search) plays random matches from the current state and favours the actions...
+#...which have done best so far
+# Both use the same hit and crit chances as hit_or_miss, and keep a transposition table of states they have...
+#...already looked at, keyed on Game_State.key(), so the same state reached in different ways is only searched once
+# Both stop at a deadline and return the best action found so far
+
+# Raised inside a search when it runs out of time
+class Search_Timeout(Exception):
+    pass
+
+# Returns how good the state is for each team, by team number, as values which add up to 1 (or 0 if everyone is down)
+# A finished match is worth 1 to the winning team, or is shared between the teams left in a draw
+# Otherwise, each team is worth its share of the health left, with each player's health out of their class's health
+def evaluate(state):
+    setup = state.setup
+    values = [0.0] * len(setup.team_names)
+
+    if state.is_over():
+        remaining = [team for team, size in enumerate(state.team_sizes) if size > 0]
+
+        for team in remaining:
+            values[team] = 1 / len(remaining)
+
+        return values
+
+    for player_id in state.active:
+        values[setup.teams[player_id]] += max(state.players[player_id].health, 0) / setup.classes[player_id].health
+
+    total = sum(values)
+    if total > 0:
+        values = [value / total for value in values]
+
+    return values
+
+# Depth limited expectimax, with each player choosing the action that is best for their own team
+# The search gets one decision deeper at a time until the deadline, so there is always a finished answer to return
+class Expectimax_Search:
+
+    def __init__(self, max_depth = 12, table_size = 500000):
+        self.max_depth = max_depth
+        self.table_size = table_size
+
+        # {state key: (depth searched, team values, best action)}
+        self.table = {}
+
+        self.nodes = 0
+        self.deadline = None
+
+    # Returns the best action for the acting player, and the depth it was found at
+    def search(self, state, deadline):
+        if len(self.table) > self.table_size:
+            self.table.clear()
+
+        self.deadline = deadline
+        best_action = None
+        depth = 0
+
+        try:
+            for depth in range(1, self.max_depth + 1):
+                values, best_action = self.value(state, depth)
+
+        except Search_Timeout:
+            depth -= 1
+
+        if best_action is None:
+            best_action = state.legal_actions()[0]
+
+        return best_action, depth
+
+    # Returns (team values, best action) for the state, looking depth decisions ahead
+    def value(self, state, depth):
+        if state.is_over() or depth == 0:
+            return evaluate(state), None
+
+        key = state.key()
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= depth:
+            return entry[1], entry[2]
+
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise Search_Timeout()
+
+        team = state.setup.teams[state.acting]
+        actions = state.legal_actions()
+
+        # Try the best action from a shallower search first
+        if entry is not None:
+            actions.remove(entry[2])
+            actions.insert(0, entry[2])
+
+        best_values = None
+        best_action = None
+
+        for action in actions:
+            values = [0.0] * len(state.team_sizes)
+
+            for probability, outcome in state.outcomes(action):
+                outcome_values = self.value(outcome, depth - 1)[0]
+
+                for i in range(len(values)):
+                    values[i] += probability * outcome_values[i]
+
+            if best_values is None or values[team] > best_values[team]:
+                best_values = values
+                best_action = action
+
+        self.table[key] = (depth, best_values, best_action)
+
+        return best_values, best_action
+
+# How often each action has been tried from a state in a Monte Carlo tree search, and how well it did
+# values holds the total value each action has given the acting player's team
+class Search_Node:
+
+    __slots__ = ("actions", "team", "visits", "action_visits", "values")
+
+    def __init__(self, state):
+        self.actions = state.legal_actions()
+        self.team = state.setup.teams[state.acting]
+        self.visits = 0
+        self.action_visits = [0] * len(self.actions)
+        self.values = [0.0] * len(self.actions)
+
+    # Chooses the action to try next with UCB1, trying every action once first
+    def select(self, exploration):
+        log_visits = math.log(self.visits + 1)
+        best = 0
+        best_score = -1.0
+
+        for i, visits in enumerate(self.action_visits):
+            if visits == 0:
+                return i
+
+            score = self.values[i] / visits + exploration * math.sqrt(log_visits / visits)
+            if score > best_score:
+                best = i
+                best_score = score
+
+        return best
+
+# Monte Carlo tree search
+# Hits and crits are rolled with the same chances as the match, so each chance node is sampled as often as...
+#...it would really happen. Nodes are stored by state key, so transpositions share their statistics
+class MCTS_Search:
+
+    def __init__(self, seed = None, exploration = 1.4, rollout_depth = 20, table_size = 500000):
+        self.rng = Roll_Stream(seed)
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.table_size = table_size
+
+        # {state key: Search_Node}
+        self.table = {}
+
+    # Returns the root Search_Node once the deadline has passed
+    def search(self, state, deadline):
+        if len(self.table) > self.table_size:
+            self.table.clear()
+
+        key = state.key()
+        if key not in self.table:
+            self.table[key] = Search_Node(state)
+
+        root = self.table[key]
+
+        # At least one iteration is made, so there is an action to choose even if the deadline has already passed
+        self.iterate(state)
+        while time.perf_counter() < deadline:
+            self.iterate(state)
+
+        return root
+
+    # Walks down the tree from the state, adds one new node, and plays randomly from there
+    def iterate(self, state):
+        path = []
+
+        while not state.is_over():
+            key = state.key()
+            node = self.table.get(key)
+
+            if node is None:
+                self.table[key] = Search_Node(state)
+                break
+
+            i = node.select(self.exploration)
+            path.append((node, i))
+            state = state.apply(node.actions[i], self.rng)
+
+        values = self.rollout(state)
+
+        for node, i in path:
+            node.visits += 1
+            node.action_visits[i] += 1
+            node.values[i] += values[node.team]
+
+    # Plays random actions for up to rollout_depth decisions, then evaluates the state
+    def rollout(self, state):
+        rng = self.rng
+
+        for i in range(self.rollout_depth):
+            if state.is_over():
+                break
+
+            actions = state.legal_actions()
+            state = state.apply(actions[int(rng.random() * len(actions))], rng)
+
+        return evaluate(state)
+
+# Runs an MCTS search in a worker process for root parallel search
+# Returns the root actions with how often each was tried and the total value each gave
+def mcts_worker(state, time_limit, seed, exploration, rollout_depth):
+    search = MCTS_Search(seed, exploration, rollout_depth)
+    root = search.search(state, time.perf_counter() + time_limit)
+
+    return root.actions, root.action_visits, root.values
+
+# A policy for headless matches which searches for the best move each turn
+# time_limit_ms is how long each decision can take
+# algorithm is "mcts" or "expectimax"
+# With workers > 1, MCTS runs that many separate searches in a process pool and adds up how often each action was tried
+# Call close() when finished with a policy that has workers
+class Search_Policy:
+
+    def __init__(self, time_limit_ms = 100, algorithm = "mcts", workers = 1, seed = None, max_depth = 12, exploration = 1.4, rollout_depth = 20):
+        if algorithm not in ("mcts", "expectimax"):
+            raise ValueError(f"Unknown search algorithm {algorithm}")
+
+        self.time_limit = time_limit_ms / 1000
+        self.algorithm = algorithm
+        self.workers = workers
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+
+        self.seeds = Roll_Stream(seed)
+        self.pool = None
+
+        if algorithm == "mcts":
+            self.search = MCTS_Search(seed, exploration, rollout_depth)
+
+        else:
+            self.search = Expectimax_Search(max_depth)
+
+        # The match and Game_Setup the transposition table belongs to
+        self.match = None
+        self.setup = None
+
+        # Targets of the action chosen by choose_move, as player ids, for choose_targets to return
+        self.targets = None
+
+    # Returns the best action for the acting player in the state
+    def choose_action(self, state):
+        actions = state.legal_actions()
+        if len(actions) == 1:
+            return actions[0]
+
+        deadline = time.perf_counter() + self.time_limit
+
+        if self.algorithm == "expectimax":
+            return self.search.search(state, deadline)[0]
+
+        if self.workers <= 1:
+            root = self.search.search(state, deadline)
+            return root.actions[max(range(len(root.actions)), key = lambda i: root.action_visits[i])]
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+
+        futures = [self.pool.submit(mcts_worker, state, self.time_limit, self.seeds.randint(0, 2 ** 32 - 1), self.exploration, self.rollout_depth)
+                   for i in range(self.workers)]
+
+        visits = {}
+        for future in futures:
+            root_actions, action_visits, values = future.result()
+
+            for action, count in zip(root_actions, action_visits):
+                visits[action] = visits.get(action, 0) + count
+
+        return max(actions, key = lambda action: visits.get(action, 0))
+
+    def choose_move(self, player, moves, match):
+
+        # Moves are searched from a fresh table in each match, as the state keys don't include the roster
+        if match is not self.match:
+            self.match = match
+            self.setup = None
+            self.search.table.clear()
+
+        state = state_from_match(match, player, self.setup)
+        self.setup = state.setup
+
+        move_index, self.targets = self.choose_action(state)
+        return moves[move_index]
+
+    def choose_targets(self, player, move, possible_targets, count, match):
+        return [match.roster.players[player_id] for player_id in self.targets]
+
+    # Chooses a move and its targets for a player in the interactive game
+    # Returns (move, targets), where targets is a list of players
+    def choose_in_roster(self, player, roster, round_count):
+        state = state_from_roster(roster, player, max_rounds = round_count + 200, round_count = round_count)
+
+        move_index, targets = self.choose_action(state)
+        return list(player.move_set.values())[move_index], [roster.players[player_id] for player_id in targets]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+# Usage: python Battle_game_ai.py <class> <class> [<class> ...] [--matches N] [--time MS] [--algorithm mcts|expectimax] [--workers N] [--seed S]
+# Plays N matches with the first player using a Search_Policy and everyone else choosing at random...
+#...and prints how often each player won
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default, convert):
+        if name not in args:
+            return default
+
+        i = args.index(name)
+        value = convert(args[i + 1])
+        del args[i:i + 2]
+        return value
+
+    num_matches = option("--matches", 20, int)
+    time_limit_ms = option("--time", 50, int)
+    algorithm = option("--algorithm", "mcts", str)
+    workers = option("--workers", 1, int)
+    seed = option("--seed", 0, int)
+
+    if len(args) < 2:
+        args = ["Warrior", "Mage"]
+
+    roster = [(f"{class_name} {i + 1}", class_name) for i, class_name in enumerate(args)]
+    search_policy = Search_Policy(time_limit_ms, algorithm, workers, seed)
+
+    policies = {name: Random_Policy() for name, class_name in roster}
+    policies[roster[0][0]] = search_policy
+
+    wins = {name: 0 for name, class_name in roster}
+    draws = 0
+
+    start = time.perf_counter()
+    for i in range(num_matches):
+        result = Match(roster, policies, seed + i).play()
+
+        if result.winning_team is None:
+            draws += 1
+
+        else:
+            wins[result.winning_team] += 1
+
+    elapsed = time.perf_counter() - start
+    search_policy.close()
+
+    for name in wins:
+        print(f"{name}: {wins[name]} wins ({100 * wins[name] / num_matches:.1f}%)")
+
+    print(f"Draws: {draws}")
+    print(f"{num_matches} matches in {elapsed:.2f}s")
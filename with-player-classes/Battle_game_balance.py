@@ -0,0 +1,297 @@
+import os
+import sys
+import math
+import time
+import zlib
+from itertools import combinations_with_replacement
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from numpy.random import SeedSequence
+
+from Battle_game_classes import all_classes
+from Battle_game_headless import play_match
+from Battle_game_rules import select_ruleset
+
+# Runs Monte Carlo matches for every matchup of classes and builds win-rate tables
+# Work is split into fixed-size chunks, each seeded from (root seed, matchup, chunk number)...
+#...so results are the same whatever the number of workers
+
+# One side of a matchup is a tuple of class names, e.g. ("Warrior", "Mage")
+# win_rate counts draws as half a win for team_a, and low/high is its confidence interval
+Matchup_Result = namedtuple("Matchup_Result", ["team_a", "team_b", "matches", "wins", "losses", "draws", "rounds", "win_rate", "low", "high"])
+
+# Counts of results from a set of matches, from team_a's point of view
+Tally = namedtuple("Tally", ["matches", "wins", "losses", "draws", "rounds"])
+
+# Returns every pairing of team makeups of the given size
+# Team makeups ignore order, so ("Warrior", "Mage") and ("Mage", "Warrior") are the same team
+def make_matchups(class_names = None, team_size = 1):
+    if class_names is None:
+        class_names = list(all_classes)
+
+    makeups = list(combinations_with_replacement(class_names, team_size))
+
+    return [(makeups[i], makeups[j]) for i in range(len(makeups)) for j in range(i, len(makeups))]
+
+# Returns a label for a team makeup, e.g. "Warrior+Mage"
+def team_label(team):
+    return "+".join(team)
+
+# Stable number identifying a matchup, used to pick its random stream
+# It only depends on the classes involved, so adding classes doesn't change the streams of existing matchups
+def matchup_key(team_a, team_b):
+    return zlib.crc32(f"{team_label(team_a)} vs {team_label(team_b)}".encode())
+
+# Wilson score interval for a proportion
+def wilson_interval(successes, n, z = 1.96):
+    if n == 0:
+        return 0.0, 1.0
+
+    p = successes / n
+    denominator = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+# Plays one chunk of matches between two teams and returns a Tally from team_a's point of view
+# Every other match swaps which team moves first, so turn order doesn't favour either side
+# ruleset is the path of a ruleset file to play with, or None for the built in classes
+def play_chunk(team_a, team_b, root_seed, chunk_index, chunk_size, max_rounds, ruleset = None):
+    select_ruleset(ruleset)
+
+    stream = SeedSequence(root_seed, spawn_key = (matchup_key(team_a, team_b), chunk_index))
+    seeds = stream.generate_state(chunk_size)
+
+    side_a = [(f"A{i + 1} {class_name}", class_name) for i, class_name in enumerate(team_a)]
+    side_b = [(f"B{i + 1} {class_name}", class_name) for i, class_name in enumerate(team_b)]
+
+    teams = {name: "A" for name, class_name in side_a}
+    teams.update({name: "B" for name, class_name in side_b})
+
+    wins = losses = draws = rounds = 0
+    for i in range(chunk_size):
+        roster = side_a + side_b if i % 2 == 0 else side_b + side_a
+
+        result = play_match(roster, seed = int(seeds[i]), teams = teams, max_rounds = max_rounds)
+        rounds += result.rounds
+
+        if result.winning_team == "A":
+            wins += 1
+
+        elif result.winning_team == "B":
+            losses += 1
+
+        else:
+            draws += 1
+
+    return Tally(chunk_size, wins, losses, draws, rounds)
+
+# Adds two tallies together
+def merge_tallies(first, second):
+    return Tally(*(a + b for a, b in zip(first, second)))
+
+# Builds the Matchup_Result for a matchup from its merged tally
+def summarise(team_a, team_b, tally, z = 1.96):
+    score = tally.wins + tally.draws / 2
+    low, high = wilson_interval(score, tally.matches, z)
+    win_rate = score / tally.matches if tally.matches > 0 else 0.0
+
+    return Matchup_Result(team_a, team_b, tally.matches, tally.wins, tally.losses, tally.draws, tally.rounds, win_rate, low, high)
+
+# Keeps track of the chunks played for one matchup
+# Chunks are merged strictly in order, so the point where a matchup stops doesn't depend on which worker finished first
+class Matchup_Progress:
+
+    def __init__(self, team_a, team_b, precision, min_matches, max_matches, chunk_size, z):
+        self.team_a = team_a
+        self.team_b = team_b
+        self.precision = precision
+        self.min_matches = min_matches
+        self.max_chunks = max(1, math.ceil(max_matches / chunk_size))
+        self.z = z
+
+        self.tally = Tally(0, 0, 0, 0, 0)
+        self.next_chunk = 0
+        self.next_merge = 0
+        self.waiting = {}
+        self.done = False
+
+    # Returns the index of the next chunk to play, or None if no more are needed
+    def take_chunk(self):
+        if self.done or self.next_chunk >= self.max_chunks:
+            return None
+
+        self.next_chunk += 1
+        return self.next_chunk - 1
+
+    # Merge a finished chunk, along with any later chunks that were waiting on it
+    def add_chunk(self, chunk_index, tally):
+        if self.done:
+            return
+
+        self.waiting[chunk_index] = tally
+
+        while self.next_merge in self.waiting and not self.done:
+            self.tally = merge_tallies(self.tally, self.waiting.pop(self.next_merge))
+            self.next_merge += 1
+
+            if self.is_precise() or self.next_merge >= self.max_chunks:
+                self.done = True
+                self.waiting.clear()
+
+    # Checks if the confidence interval is narrow enough to stop
+    def is_precise(self):
+        if self.tally.matches < self.min_matches:
+            return False
+
+        result = self.result()
+        return (result.high - result.low) / 2 <= self.precision
+
+    def result(self):
+        return summarise(self.team_a, self.team_b, self.tally, self.z)
+
+# Plays matches for every matchup until each win rate is known to within +/- precision
+# workers is the number of processes to use. With 0 workers everything runs in this process
+# on_result is called with each Matchup_Result as soon as that matchup finishes
+# ruleset is the path of a ruleset file (see Battle_game_rules), which every worker loads for itself
+def run_balance(matchups = None, precision = 0.005, seed = 0, workers = None, chunk_size = 500, min_matches = 2000, max_matches = 200000, max_rounds = 200, z = 1.96, on_result = None, ruleset = None):
+    select_ruleset(ruleset)
+
+    if matchups is None:
+        matchups = make_matchups()
+
+    progress = [Matchup_Progress(team_a, team_b, precision, min_matches, max_matches, chunk_size, z) for team_a, team_b in matchups]
+    results = {}
+
+    # Report matchups as they finish
+    def collect(i):
+        if progress[i].done and i not in results:
+            results[i] = progress[i].result()
+
+            if on_result is not None:
+                on_result(results[i])
+
+    if workers == 0:
+        for i, matchup in enumerate(progress):
+            while True:
+                chunk_index = matchup.take_chunk()
+                if chunk_index is None:
+                    break
+
+                matchup.add_chunk(chunk_index, play_chunk(matchup.team_a, matchup.team_b, seed, chunk_index, chunk_size, max_rounds, ruleset))
+
+            collect(i)
+
+    else:
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        with ProcessPoolExecutor(workers) as pool:
+
+            # Keep a couple of chunks per worker queued so no process sits idle
+            max_pending = 2 * workers
+            pending = {}
+            turn = 0
+
+            while True:
+
+                # Hand out chunks round-robin between unfinished matchups
+                skipped = 0
+                while len(pending) < max_pending and skipped < len(progress):
+                    i = turn % len(progress)
+                    matchup = progress[i]
+                    chunk_index = matchup.take_chunk()
+
+                    if chunk_index is None:
+                        skipped += 1
+
+                    else:
+                        skipped = 0
+                        future = pool.submit(play_chunk, matchup.team_a, matchup.team_b, seed, chunk_index, chunk_size, max_rounds, ruleset)
+                        pending[future] = (i, chunk_index)
+
+                    turn += 1
+
+                if len(pending) == 0:
+                    break
+
+                finished, _ = wait(pending, return_when = FIRST_COMPLETED)
+
+                for future in finished:
+                    i, chunk_index = pending.pop(future)
+                    progress[i].add_chunk(chunk_index, future.result())
+                    collect(i)
+
+    for i in range(len(progress)):
+        collect(i)
+
+    return [results[i] for i in range(len(progress))]
+
+# Formats 1v1-style results as a table of win rates, with row teams against column teams
+# The table is filled in both directions, as team_b's win rate is 1 - team_a's
+def format_matrix(results):
+    teams = []
+    rates = {}
+
+    for result in results:
+        for team in (result.team_a, result.team_b):
+            if team not in teams:
+                teams.append(team)
+
+        rates[result.team_a, result.team_b] = result
+        rates[result.team_b, result.team_a] = result
+
+    labels = [team_label(team) for team in teams]
+    width = max(len(label) for label in labels + ["vs"]) + 2
+
+    lines = ["vs".ljust(width) + "".join(label.rjust(width) for label in labels)]
+    for row, row_label in zip(teams, labels):
+        line = row_label.ljust(width)
+
+        for column in teams:
+            result = rates.get((row, column))
+
+            if result is None:
+                line += "-".rjust(width)
+                continue
+
+            win_rate = result.win_rate if result.team_a == row else 1 - result.win_rate
+            line += f"{100 * win_rate:.1f}%".rjust(width)
+
+        lines.append(line)
+
+    return "\n".join(lines)
+
+# Usage: python Battle_game_balance.py [--team-size N] [--workers N] [--precision P] [--seed S] [--classes Warrior,Mage] [--ruleset FILE]
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default, convert):
+        if name in args:
+            return convert(args[args.index(name) + 1])
+        return default
+
+    team_size = option("--team-size", 1, int)
+    workers = option("--workers", None, int)
+    precision = option("--precision", 0.005, float)
+    seed = option("--seed", 0, int)
+    class_names = option("--classes", None, lambda names: names.split(","))
+    ruleset = option("--ruleset", None, str)
+
+    # The ruleset is selected here too, so the default class names come from it
+    select_ruleset(ruleset)
+
+    # Print each matchup as it finishes
+    def report(result):
+        print(f"{team_label(result.team_a)} vs {team_label(result.team_b)}: {100 * result.win_rate:.2f}% "
+              f"({100 * result.low:.2f}% - {100 * result.high:.2f}%) over {result.matches} matches")
+
+    start = time.perf_counter()
+    results = run_balance(make_matchups(class_names, team_size), precision, seed, workers, on_result = report, ruleset = ruleset)
+    elapsed = time.perf_counter() - start
+
+    print()
+    print(format_matrix(results))
+    print(f"\n{sum(result.matches for result in results)} matches in {elapsed:.1f}s")
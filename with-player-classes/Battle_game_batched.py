@@ -0,0 +1,478 @@
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from Battle_game_classes import all_classes
+from Battle_game_headless import play_match
+
+# Simulates many matches with the same roster in lockstep, storing each match as a row of NumPy arrays
+# Every player uses the same choices as Random_Policy: a random move, then random opponents as targets
+# The rules follow get_true_accuracy, hit_or_miss, execute_move and increment_turns, but are applied...
+#...to every match at once, with masks for players who are down and matches which are over
+
+# Status effect kinds stored in the effect arrays. 0 marks an empty slot
+EFFECT_KINDS = {"+Attack": 1, "-Attack": 2, "+Speed": 3, "-Speed": 4, "Protection": 5, "Weakness": 6, "Burning": 7}
+ATTACK_UP, ATTACK_DOWN, SPEED_UP, SPEED_DOWN, PROTECTION, WEAKNESS, BURNING = range(1, 8)
+
+# winning_team holds the index of the winning team for each match (-1 for a draw)
+# team_names maps those indexes back to team names
+Batch_Result = namedtuple("Batch_Result", ["winning_team", "rounds", "turns", "health", "team_names"])
+
+# The rules of a Move in the form used by the batched engine
+class Batched_Move:
+
+    def __init__(self, move):
+        self.move = move
+        self.name = move.name
+
+        self.always_hits = move.accuracy == True
+        self.accuracy = 0 if self.always_hits else move.accuracy
+        self.ranged = "Ranged" in move.move_type
+
+        self.has_crit = move.crit_info != False
+        self.crit_chance = move.crit_info["chance"] if self.has_crit else 0
+        self.crit_effect = move.crit_info["crit_effect"] if self.has_crit else 1
+
+        # Speed only adds to crit chance for moves which are neither ranged nor self-targetting
+        self.speed_crits = not self.ranged and move.targets != "Self"
+
+        self.targets = move.targets
+        self.staggered = move.stagger is not None
+        self.stagger_turns = move.stagger[0] if self.staggered else 0
+        self.stagger_blocks = bool(move.stagger[1]) if self.staggered else False
+
+        self.effects = list(move.effect.items())
+
+# Plays a batch of matches between the same roster
+class Batched_Match:
+
+    # roster and teams are the same as for Match. count is the number of matches to play at once
+    def __init__(self, roster, count, seed = None, teams = None, max_rounds = 200, effect_slots = 8, stagger_slots = 2):
+        self.rng = np.random.default_rng(seed)
+        self.count = count
+        self.max_rounds = max_rounds
+
+        self.names = [name for name, atk_class in roster]
+        atk_classes = [all_classes[atk_class] if isinstance(atk_class, str) else atk_class for name, atk_class in roster]
+        num_players = len(roster)
+
+        if teams is None:
+            teams = {name: name for name in self.names}
+
+        self.team_names = []
+        for name in self.names:
+            if teams[name] not in self.team_names:
+                self.team_names.append(teams[name])
+
+        self.team = np.array([self.team_names.index(teams[name]) for name in self.names])
+
+        # Build a move table shared by every match and each player's move indexes into it
+        self.moves = []
+        self.player_moves = []
+        for atk_class in atk_classes:
+            indexes = []
+
+            for move in atk_class.move_set.values():
+                known = [i for i, batched in enumerate(self.moves) if batched.move is move]
+
+                if len(known) == 0:
+                    self.moves.append(Batched_Move(move))
+                    known = [len(self.moves) - 1]
+
+                indexes.append(known[0])
+
+            self.player_moves.append(np.array(indexes))
+
+        self.max_targets = max([move.targets for move in self.moves if isinstance(move.targets, int)] + [num_players])
+
+        # Per-match player state, with one row per match and one column per player
+        self.health = np.tile(np.array([atk_class.health for atk_class in atk_classes], dtype = float), (count, 1))
+        self.speed = np.array([atk_class.speed for atk_class in atk_classes], dtype = float)
+        self.alive = np.ones((count, num_players), dtype = bool)
+
+        # Status effects, stored in slots which are grown whenever a player runs out
+        self.fx_kind = np.zeros((count, num_players, effect_slots), dtype = np.int8)
+        self.fx_value = np.zeros((count, num_players, effect_slots))
+        self.fx_turns = np.zeros((count, num_players, effect_slots), dtype = np.int32)
+
+        # Staggered moves, stored as a move index (-1 for an empty slot), turns left and chosen targets
+        self.stag_move = np.full((count, num_players, stagger_slots), -1, dtype = np.int32)
+        self.stag_turns = np.zeros((count, num_players, stagger_slots), dtype = np.int32)
+        self.stag_targets = np.full((count, num_players, stagger_slots, self.max_targets), -1, dtype = np.int32)
+
+        # Match progress
+        self.team_alive = np.zeros((count, len(self.team_names)), dtype = np.int32)
+        for team in self.team:
+            self.team_alive[:, team] += 1
+
+        self.running = (self.team_alive > 0).sum(axis = 1) > 1
+        self.winning_team = np.full(count, -1)
+        self.rounds = np.zeros(count, dtype = np.int32)
+        self.turns = np.zeros(count, dtype = np.int32)
+
+    # Returns every player's speed adjusted for +Speed and -Speed, as in Player.get_true_speed
+    def true_speed(self, matches, players):
+        kinds = self.fx_kind[matches, players]
+        values = self.fx_value[matches, players]
+
+        change = np.where(kinds == SPEED_UP, values, 0).sum(axis = -1) - np.where(kinds == SPEED_DOWN, values, 0).sum(axis = -1)
+        return self.speed[players] + change
+
+    # Product of the multipliers of every effect of the given kind
+    def effect_product(self, matches, players, kind):
+        kinds = self.fx_kind[matches, players]
+        values = self.fx_value[matches, players]
+
+        return np.where(kinds == kind, values, 1.0).prod(axis = -1)
+
+    # Same as Player.inflict_damage, returning the rounded damage dealt
+    def inflict_damage(self, matches, players, damage):
+        damage = damage * self.effect_product(matches, players, PROTECTION) / self.effect_product(matches, players, WEAKNESS)
+        damage = np.round(damage)
+
+        self.health[matches, players] -= damage
+        return damage
+
+    # Doubles the number of effect slots
+    def grow_effect_slots(self):
+        self.fx_kind = np.concatenate([self.fx_kind, np.zeros_like(self.fx_kind)], axis = 2)
+        self.fx_value = np.concatenate([self.fx_value, np.zeros_like(self.fx_value)], axis = 2)
+        self.fx_turns = np.concatenate([self.fx_turns, np.zeros_like(self.fx_turns)], axis = 2)
+
+    # Gives each (match, player) pair a status effect, like Player.add_status_effect
+    def add_status_effect(self, matches, players, kinds, values, duration):
+        if len(matches) == 0:
+            return
+
+        free = self.fx_kind[matches, players] == 0
+        while not free.any(axis = 1).all():
+            self.grow_effect_slots()
+            free = self.fx_kind[matches, players] == 0
+
+        slots = free.argmax(axis = 1)
+
+        self.fx_kind[matches, players, slots] = kinds
+        self.fx_value[matches, players, slots] = values
+        self.fx_turns[matches, players, slots] = duration
+
+    # Gives each player a staggered move to use later, like Player.add_staggered_move
+    def add_staggered_move(self, matches, player, move_index, targets):
+        move = self.moves[move_index]
+
+        free = self.stag_move[matches, player] < 0
+        while not free.any(axis = 1).all():
+            self.stag_move = np.concatenate([self.stag_move, np.full_like(self.stag_move, -1)], axis = 2)
+            self.stag_turns = np.concatenate([self.stag_turns, np.zeros_like(self.stag_turns)], axis = 2)
+            self.stag_targets = np.concatenate([self.stag_targets, np.full_like(self.stag_targets, -1)], axis = 2)
+
+            free = self.stag_move[matches, player] < 0
+
+        slots = free.argmax(axis = 1)
+
+        self.stag_move[matches, player, slots] = move_index
+        self.stag_turns[matches, player, slots] = move.stagger_turns
+        self.stag_targets[matches, player, slots] = targets
+
+    # Knocks out any of the given players whose health is below 1
+    def check_knockouts(self, matches, players):
+        down = (self.health[matches, players] < 1) & self.alive[matches, players]
+        matches = matches[down]
+        players = players[down]
+
+        if len(matches) == 0:
+            return
+
+        self.alive[matches, players] = False
+        np.subtract.at(self.team_alive, (matches, self.team[players]), 1)
+
+        # Finish any matches which only have one team left
+        finished = matches[((self.team_alive[matches] > 0).sum(axis = 1) <= 1) & self.running[matches]]
+
+        if len(finished) > 0:
+            self.running[finished] = False
+            self.winning_team[finished] = np.where(self.team_alive[finished].max(axis = 1) > 0, self.team_alive[finished].argmax(axis = 1), -1)
+
+    # Same as hit_or_miss, for one move used by one player in each of the given matches
+    def hit_or_miss(self, move, matches, user, targets):
+        users = np.full(len(matches), user)
+
+        if move.always_hits:
+            hit = np.ones(len(matches), dtype = bool)
+
+        else:
+            target_speed = self.true_speed(matches, targets)
+
+            if move.ranged:
+                hit_chance = move.accuracy - target_speed / 6
+
+            else:
+                hit_chance = move.accuracy - target_speed / 3 + self.true_speed(matches, users) / 3
+
+            # A move used on oneself only uses the move's accuracy
+            hit_chance = np.where(targets == user, move.accuracy, hit_chance)
+            hit_chance = np.minimum(np.round(hit_chance), 99)
+
+            hit = self.rng.integers(1, 101, len(matches)) < hit_chance
+
+        if not move.has_crit:
+            return hit, np.zeros(len(matches), dtype = bool)
+
+        crit_chance = np.full(len(matches), float(move.crit_chance))
+        if move.speed_crits:
+            crit_chance += self.true_speed(matches, users) / 10
+
+        crit = self.rng.integers(1, 101, len(matches)) <= np.round(crit_chance)
+
+        return hit, crit
+
+    # Same as execute_move, for one move which hit its target in each of the given matches
+    def execute_move(self, move, matches, user, targets, crit):
+        users = np.full(len(matches), user)
+        crit_effect = np.where(crit, move.crit_effect, 1.0)
+
+        for effect, props in move.effects:
+
+            if effect == "Damage":
+                damage = props["value"] * self.effect_product(matches, users, ATTACK_UP)
+                damage = np.where(crit, np.round(damage * crit_effect), damage)
+
+                self.inflict_damage(matches, targets, damage)
+
+            elif effect == "Heal":
+                heal = np.where(crit, np.round(props["value"] * crit_effect), props["value"])
+                self.health[matches, targets] += heal
+
+            elif effect == "+Attack" or effect == "-Attack":
+                multiplier = props["percentage"] / 100 + 1
+
+                # Critical multipliers are cut down to whole numbers, as in execute_move
+                multiplier = np.where(crit, np.trunc(np.round(multiplier * crit_effect, 2)), multiplier)
+                kinds = np.where(multiplier < 1, ATTACK_DOWN, ATTACK_UP)
+
+                self.add_status_effect(matches, targets, kinds, multiplier, props["duration"])
+
+            elif effect == "+Speed" or effect == "-Speed":
+                change = np.where(crit, np.round(props["value"] * crit_effect), props["value"])
+
+                # A negative change flips the effect to its opposite
+                kinds = np.where(change < 0, SPEED_DOWN if effect == "+Speed" else SPEED_UP, EFFECT_KINDS[effect])
+
+                self.add_status_effect(matches, targets, kinds, np.abs(change), props["duration"])
+
+            elif effect == "Protection" or effect == "Weakness":
+                percentage = props["value"] if effect == "Protection" else props["value"] + 100
+                multiplier = percentage / 100 * crit_effect
+
+                self.add_status_effect(matches, targets, EFFECT_KINDS[effect], multiplier, props["duration"])
+
+            elif effect == "Burning":
+                self.add_status_effect(matches, targets, BURNING, props["value"] * crit_effect, props["duration"])
+
+    # Same as attempt_move, with targets holding a row of target indexes (-1 for none) for each match
+    def attempt_move(self, move, matches, user, targets):
+        for i in range(targets.shape[1]):
+            target = targets[:, i]
+
+            # Skip empty target slots, players who are already down and matches which have finished
+            valid = target >= 0
+            valid[valid] &= self.alive[matches[valid], target[valid]] & self.running[matches[valid]]
+
+            in_play = matches[valid]
+            target = target[valid]
+
+            if len(in_play) == 0:
+                continue
+
+            hit, crit = self.hit_or_miss(move, in_play, user, target)
+            self.execute_move(move, in_play[hit], user, target[hit], crit[hit])
+
+            self.check_knockouts(in_play, target)
+
+    # Works out the targets of a move for each match, picking random opponents for moves with a number of targets
+    def find_targets(self, move, matches, user):
+        targets = np.full((len(matches), self.max_targets), -1, dtype = np.int32)
+        num_players = len(self.names)
+
+        if move.targets == "Self":
+            targets[:, 0] = user
+
+        elif move.targets == "All" or move.targets == "All others":
+            candidates = self.alive[matches].copy()
+
+            if move.targets == "All others":
+                candidates[:, user] = False
+
+            order = np.where(candidates, np.arange(num_players), num_players)
+            order.sort(axis = 1)
+            targets[:, :num_players] = np.where(order < num_players, order, -1)
+
+        else:
+            candidates = self.alive[matches] & (self.team != self.team[user])
+
+            # Shuffle the candidates by giving them random keys, then take the first few
+            keys = np.where(candidates, self.rng.random(candidates.shape), -1.0)
+            order = np.argsort(-keys, axis = 1)[:, :move.targets]
+            chosen = np.take_along_axis(candidates, order, axis = 1)
+
+            targets[:, :order.shape[1]] = np.where(chosen, order, -1)
+
+        return targets
+
+    # Gives the player a turn in each of the given matches
+    def take_turn(self, player, matches):
+        players = np.full(len(matches), player)
+        self.turns[matches] += 1
+
+        # Make all status effects and staggered moves progress by 1 turn, as in Player.increment_turns
+        kinds = self.fx_kind[matches, player]
+        turns = self.fx_turns[matches, player]
+
+        kinds[(kinds != 0) & (turns <= 0)] = 0
+        turns -= kinds != 0
+
+        self.fx_kind[matches, player] = kinds
+        self.fx_turns[matches, player] = turns
+        self.stag_turns[matches, player] -= self.stag_move[matches, player] >= 0
+
+        # Burning damage, as in Player.burn_tick
+        kinds = self.fx_kind[matches, player]
+        burning = (kinds == BURNING).any(axis = 1)
+        if burning.any():
+            burn_matches = matches[burning]
+            burn_players = players[burning]
+
+            defense = self.effect_product(burn_matches, burn_players, PROTECTION) / self.effect_product(burn_matches, burn_players, WEAKNESS)
+            burn_total = np.where(self.fx_kind[burn_matches, player] == BURNING, self.fx_value[burn_matches, player], 0).sum(axis = 1)
+
+            self.health[burn_matches, player] -= np.round(burn_total * defense)
+            self.check_knockouts(burn_matches, burn_players)
+
+        matches = matches[self.alive[matches, player] & self.running[matches]]
+
+        # Use any staggered moves which are ready, and block choosing a move while one that blocks is pending
+        stag_moves = self.stag_move[matches, player]
+        blocks = np.array([False] + [move.stagger_blocks for move in self.moves])
+        blocked = blocks[stag_moves + 1].any(axis = 1)
+
+        for slot in range(stag_moves.shape[1]):
+            ready = (self.stag_move[matches, player, slot] >= 0) & (self.stag_turns[matches, player, slot] <= 0)
+
+            for move_index in np.unique(self.stag_move[matches[ready], player, slot]):
+                using = matches[ready & (self.stag_move[matches, player, slot] == move_index)]
+                targets = self.stag_targets[using, player, slot]
+
+                self.stag_move[using, player, slot] = -1
+                self.attempt_move(self.moves[move_index], using, player, targets)
+
+        matches = matches[~blocked & self.running[matches]]
+
+        # Choose and use a move
+        player_moves = self.player_moves[player]
+        choices = player_moves[(self.rng.random(len(matches)) * len(player_moves)).astype(int)]
+
+        for move_index in np.unique(choices):
+            move = self.moves[move_index]
+            using = matches[choices == move_index]
+            targets = self.find_targets(move, using, player)
+
+            if move.staggered:
+                self.add_staggered_move(using, player, move_index, targets)
+
+            else:
+                self.attempt_move(move, using, player, targets)
+
+    # Plays every match to the end and returns a Batch_Result
+    def play(self):
+        round_count = 0
+
+        while self.running.any() and round_count < self.max_rounds:
+            round_count += 1
+            self.rounds[self.running] = round_count
+
+            for player in range(len(self.names)):
+                matches = np.nonzero(self.running & self.alive[:, player])[0]
+
+                if len(matches) > 0:
+                    self.take_turn(player, matches)
+
+        return Batch_Result(self.winning_team, self.rounds, self.turns, self.health, self.team_names)
+
+# Play a batch of matches between the same roster and return a Batch_Result
+def play_batch(roster, count, seed = None, teams = None, max_rounds = 200):
+    return Batched_Match(roster, count, seed, teams, max_rounds).play()
+
+# Counts how often each team won in a Batch_Result, with draws under None
+def win_counts(result):
+    counts = {name: int((result.winning_team == i).sum()) for i, name in enumerate(result.team_names)}
+    counts[None] = int((result.winning_team < 0).sum())
+
+    return counts
+
+# Compares the batched engine with the scalar headless engine by playing the same roster in both
+# Returns a list of (outcome, batched rate, scalar rate, z score) rows, including the mean number of rounds
+# Each z score is a two-sample test, so values beyond about 4 point to a difference in the rules
+def check_against_scalar(roster, matches = 20000, seed = 0, teams = None, max_rounds = 200):
+    batched = play_batch(roster, matches, seed, teams, max_rounds)
+    batched_counts = win_counts(batched)
+
+    scalar_counts = {name: 0 for name in batched.team_names}
+    scalar_counts[None] = 0
+    scalar_rounds = np.zeros(matches)
+
+    for i in range(matches):
+        result = play_match(roster, seed = seed + i, teams = teams, max_rounds = max_rounds)
+        scalar_counts[result.winning_team] += 1
+        scalar_rounds[i] = result.rounds
+
+    rows = []
+    for outcome in batched_counts:
+        p1 = batched_counts[outcome] / matches
+        p2 = scalar_counts[outcome] / matches
+        pooled = (p1 + p2) / 2
+        error = np.sqrt(2 * pooled * (1 - pooled) / matches)
+
+        rows.append((outcome, p1, p2, float((p1 - p2) / error) if error > 0 else 0.0))
+
+    rounds1 = batched.rounds.astype(float)
+    error = np.sqrt(rounds1.var() / matches + scalar_rounds.var() / matches)
+    rows.append(("mean rounds", float(rounds1.mean()), float(scalar_rounds.mean()), float((rounds1.mean() - scalar_rounds.mean()) / error) if error > 0 else 0.0))
+
+    return rows
+
+# Usage: python Battle_game_batched.py <class> <class> [<class> ...] [--matches N] [--check]
+# Plays N matches at once and prints the win counts. With --check, compares the results with the scalar engine
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    num_matches = 100000
+    if "--matches" in args:
+        i = args.index("--matches")
+        num_matches = int(args[i + 1])
+        del args[i:i + 2]
+
+    check = "--check" in args
+    if check:
+        args.remove("--check")
+
+    if len(args) < 2:
+        args = ["Warrior", "Mage"]
+
+    roster = [(f"{class_name} {i + 1}", class_name) for i, class_name in enumerate(args)]
+
+    if check:
+        print(f"{'Outcome':<16}{'Batched':>10}{'Scalar':>10}{'z':>8}")
+
+        for outcome, batched_value, scalar_value, z in check_against_scalar(roster, num_matches):
+            print(f"{str(outcome):<16}{batched_value:>10.4f}{scalar_value:>10.4f}{z:>8.2f}")
+
+    else:
+        start = time.perf_counter()
+        result = play_batch(roster, num_matches, seed = 0)
+        elapsed = time.perf_counter() - start
+
+        for name, wins in win_counts(result).items():
+            print(f"{name if name is not None else 'Draws'}: {wins} ({100 * wins / num_matches:.1f}%)")
+
+        print(f"{num_matches} matches in {elapsed:.2f}s ({num_matches / elapsed:.0f} matches per second)")
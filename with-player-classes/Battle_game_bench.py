@@ -0,0 +1,354 @@
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+from collections import namedtuple
+
+from Battle_game_classes import Move, Player, Turn_Scheduler, all_classes, effect_compilers, get_true_accuracy, hit_or_miss, execute_move
+from Battle_game_headless import Match
+from Battle_game_rng import Roll_Stream
+
+# Benchmarks for the parts of the engine that run the most, with results saved as JSON so runs from...
+#...different commits can be compared
+# Each benchmark has a setup function which is called before every sample and returns the function to time...
+#...so every sample starts from the same players and the same seed
+# A sample times number calls in a row, after a few warm-up samples which are thrown away...
+#...and the garbage collector is turned off while timing, as timeit does
+
+# Format of the results files
+RESULTS_VERSION = 1
+
+# Seed used for every roll the benchmarks make
+SEED = 0
+
+# setup(seed) returns a function which takes no arguments
+# number is how many calls each sample times, and repeats is how many samples are taken
+Benchmark = namedtuple("Benchmark", ["name", "setup", "number", "repeats"])
+
+# Statistics of a benchmark's samples, all in seconds per call
+# low and high are the quartiles, and ci95 is the half-width of the 95% confidence interval of the mean
+Bench_Stats = namedtuple("Bench_Stats", ["samples", "min", "median", "mean", "stdev", "low", "high", "ci95"])
+
+# Every benchmark, in the order they are run
+benchmarks = []
+
+def add_benchmark(name, setup, number, repeats = 20):
+    benchmarks.append(Benchmark(name, setup, number, repeats))
+
+# Returns a list of players sharing a scheduler, with classes taken in turn from class_names
+def make_players(count, class_names = ("Warrior", "Mage", "Monk")):
+    scheduler = Turn_Scheduler()
+
+    return [Player(f"Player {i + 1}", all_classes[class_names[i % len(class_names)]], scheduler) for i in range(count)]
+
+def setup_accuracy(seed):
+    user, target = make_players(2)
+    target.add_status_effect("-Speed", 2, value = 15)
+    move = all_classes["Warrior"].move_set["Sword slash"]
+
+    return lambda: get_true_accuracy(move, user, target)
+
+# Sword slash rolls for both a hit and a crit
+def setup_hit_or_miss(seed):
+    user, target = make_players(2)
+    move = all_classes["Warrior"].move_set["Sword slash"]
+    rng = Roll_Stream(seed)
+
+    return lambda: hit_or_miss(move, user, target, rng)
+
+# Example properties for each kind of effect, used to make a move with only that effect
+effect_examples = {
+    "Damage": {"value": 20},
+    "Heal": {"value": 5},
+    "+Attack": {"percentage": 50, "duration": 2},
+    "-Attack": {"percentage": -50, "duration": 2},
+    "+Speed": {"value": 30, "duration": 1},
+    "-Speed": {"value": 15, "duration": 2},
+    "Protection": {"value": 50, "duration": 0},
+    "Weakness": {"value": 30, "duration": 2},
+    "Burning": {"value": 5, "duration": 3}
+}
+
+# Returns the setup for a benchmark of execute_move with a move that only has the given effect
+def execute_move_setup(effect_name):
+
+    def setup(seed):
+        move = Move(f"Bench {effect_name}", "Melee", {effect_name: effect_examples[effect_name]}, 90, {"chance": 20, "crit_effect": 1.5}, 1, "")
+        user, target = make_players(2)
+
+        return lambda: execute_move(move, user, target, False)
+
+    return setup
+
+# Returns the setup for a benchmark of increment_turns on a player with stack_size status effects
+# The effects are spread over the next 8 turns, so timing 8 calls sees every effect expire
+def increment_turns_setup(stack_size):
+    effects = (("+Speed", "value", 5), ("Burning", "value", 2), ("Weakness", "multiplier", 1.1), ("+Attack", "multiplier", 1.1))
+
+    def setup(seed):
+        player = make_players(1)[0]
+
+        for i in range(stack_size):
+            name, power_key, power = effects[i % len(effects)]
+            player.add_status_effect(name, i % 8, **{power_key: power})
+
+        return player.increment_turns
+
+    return setup
+
+# A player with a few effects and staggered moves, like one partway through a match
+def summary_player():
+    player, target = make_players(2)
+    player.add_status_effect("+Attack", 2, multiplier = 1.5)
+    player.add_status_effect("-Speed", 1, value = 15)
+    player.add_status_effect("Burning", 3, value = 5)
+    player.add_staggered_move(all_classes["Mage"].move_set["Lightning bolt"], player, [target], [2, True])
+
+    return player
+
+# Nothing changes between calls, so this times reading the cached summary
+def setup_format_self(seed):
+    return summary_player().format_self
+
+# Times making the summary from scratch, as after the player's health or effects change
+def setup_format_self_uncached(seed):
+    player = summary_player()
+
+    def format_uncached():
+        player.clear_formatting()
+        return player.format_self()
+
+    return format_uncached
+
+# Returns the setup for a benchmark of a whole headless match between num_players players
+def match_setup(num_players):
+    class_names = list(all_classes)
+    roster = [(f"Player {i + 1}", class_names[i % len(class_names)]) for i in range(num_players)]
+
+    def setup(seed):
+        return lambda: Match(roster, seed = seed).play()
+
+    return setup
+
+add_benchmark("get_true_accuracy", setup_accuracy, 10000)
+add_benchmark("hit_or_miss", setup_hit_or_miss, 10000)
+
+for effect_name in effect_compilers:
+    if effect_name in effect_examples:
+        add_benchmark(f"execute_move[{effect_name}]", execute_move_setup(effect_name), 1000)
+
+add_benchmark("increment_turns[100 effects]", increment_turns_setup(100), 8)
+add_benchmark("increment_turns[1000 effects]", increment_turns_setup(1000), 8, 10)
+add_benchmark("format_self", setup_format_self, 2000)
+add_benchmark("format_self[uncached]", setup_format_self_uncached, 2000)
+add_benchmark("match[2 players]", match_setup(2), 20)
+add_benchmark("match[8 players]", match_setup(8), 5)
+add_benchmark("match[100 players]", match_setup(100), 1, 10)
+add_benchmark("match[1000 players]", match_setup(1000), 1, 5)
+
+# Times one sample and returns the seconds per call
+def time_sample(benchmark, seed):
+    function = benchmark.setup(seed)
+    calls = range(benchmark.number)
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        start = time.perf_counter()
+        for i in calls:
+            function()
+
+        elapsed = time.perf_counter() - start
+
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return elapsed / benchmark.number
+
+def summarise(samples):
+    if len(samples) > 1:
+        stdev = statistics.stdev(samples)
+        low, median, high = statistics.quantiles(samples, n = 4, method = "inclusive")
+
+    else:
+        stdev = 0.0
+        low = median = high = samples[0]
+
+    mean = statistics.fmean(samples)
+
+    return Bench_Stats(samples, min(samples), median, mean, stdev, low, high, 1.96 * stdev / len(samples) ** 0.5)
+
+# Runs a benchmark and returns its Bench_Stats
+# repeats replaces the benchmark's own number of samples if given
+def run_benchmark(benchmark, warmup = 2, repeats = None, seed = SEED):
+    if repeats is None:
+        repeats = benchmark.repeats
+
+    for i in range(warmup):
+        time_sample(benchmark, seed)
+
+    return summarise([time_sample(benchmark, seed) for i in range(repeats)])
+
+# Returns the commit of the checkout this file is in, wherever it is run from, or None outside of a git checkout
+def current_commit():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output = True, text = True, check = True,
+                              cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Runs every benchmark with a name containing name_filter and returns the results as a dictionary for JSON
+# progress is called with (name, Bench_Stats) after each benchmark
+def run_benchmarks(name_filter = "", warmup = 2, repeats = None, progress = None):
+    results = {
+        "version": RESULTS_VERSION,
+        "commit": current_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "benchmarks": {}
+    }
+
+    for benchmark in benchmarks:
+        if name_filter not in benchmark.name:
+            continue
+
+        stats = run_benchmark(benchmark, warmup, repeats)
+        results["benchmarks"][benchmark.name] = dict(stats._asdict(), number = benchmark.number)
+
+        if progress is not None:
+            progress(benchmark.name, stats)
+
+    return results
+
+def load_results(path):
+    with open(path) as file:
+        results = json.load(file)
+
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{path} is not a version {RESULTS_VERSION} benchmark results file")
+
+    return results
+
+# Compares two sets of results and returns a list of (name, old median, new median, ratio, verdict)
+# A benchmark is only "slower" or "faster" if its median changed by more than threshold (e.g. 0.1 for 10%)...
+#...and the middle halves of the two runs' samples don't overlap, so noisy benchmarks aren't flagged
+# Benchmarks in only one of the results get the verdict "added" or "removed"
+def compare_results(old, new, threshold = 0.1):
+    old_benchmarks = old["benchmarks"]
+    new_benchmarks = new["benchmarks"]
+    rows = []
+
+    for name in old_benchmarks:
+        if name not in new_benchmarks:
+            rows.append((name, old_benchmarks[name]["median"], None, None, "removed"))
+
+    for name, after in new_benchmarks.items():
+        before = old_benchmarks.get(name)
+
+        if before is None:
+            rows.append((name, None, after["median"], None, "added"))
+            continue
+
+        ratio = after["median"] / before["median"]
+        verdict = "same"
+
+        if ratio > 1 + threshold and after["low"] > before["high"]:
+            verdict = "slower"
+
+        elif ratio < 1 / (1 + threshold) and after["high"] < before["low"]:
+            verdict = "faster"
+
+        rows.append((name, before["median"], after["median"], ratio, verdict))
+
+    return rows
+
+# Formats a time in seconds with a sensible unit, e.g. "1.23 us"
+def format_time(seconds):
+    if seconds is None:
+        return "-"
+
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+
+    return f"{seconds / 1e-9:.3g} ns"
+
+def print_stats(name, stats):
+    spread = 100 * stats.stdev / stats.mean if stats.mean > 0 else 0.0
+    print(f"{name:32} {format_time(stats.median):>10} {format_time(stats.mean):>10} +- {format_time(stats.ci95):<10} {spread:5.1f}% {1 / stats.median:14,.0f}/s")
+
+# Usage:
+#   python Battle_game_bench.py run [--output FILE] [--filter TEXT] [--repeats N] [--warmup N]
+#   python Battle_game_bench.py compare <old results> <new results> [--threshold PERCENT]
+#   python Battle_game_bench.py list
+# run saves its results to bench_<commit>.json unless given --output
+# compare exits with status 1 if anything got slower, so it can be used in scripts
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default, convert):
+        if name not in args:
+            return default
+
+        i = args.index(name)
+        value = convert(args[i + 1])
+        del args[i:i + 2]
+        return value
+
+    command = args.pop(0) if len(args) > 0 else "run"
+
+    if command == "list":
+        for benchmark in benchmarks:
+            print(f"{benchmark.name:32} {benchmark.number} calls x {benchmark.repeats} samples")
+
+    elif command == "run":
+        output = option("--output", None, str)
+        name_filter = option("--filter", "", str)
+        repeats = option("--repeats", None, int)
+        warmup = option("--warmup", 2, int)
+
+        print(f"{'Benchmark':32} {'Median':>10} {'Mean':>10}    {'95% CI':<10} {'Stdev':>6} {'Calls':>16}")
+        results = run_benchmarks(name_filter, warmup, repeats, print_stats)
+
+        if output is None:
+            output = f"bench_{results['commit'] or 'results'}.json"
+
+        with open(output, "w") as file:
+            json.dump(results, file, indent = 1)
+
+        print(f"Saved results to {output}")
+
+    elif command == "compare":
+        threshold = option("--threshold", 10, float) / 100
+
+        if len(args) != 2:
+            print("compare needs an old and a new results file")
+            sys.exit(2)
+
+        old, new = load_results(args[0]), load_results(args[1])
+        rows = compare_results(old, new, threshold)
+
+        print(f"Comparing {old['commit']} ({args[0]}) with {new['commit']} ({args[1]})")
+        print(f"{'Benchmark':32} {'Old':>10} {'New':>10} {'Change':>8}  Verdict")
+
+        for name, before, after, ratio, verdict in rows:
+            change = "-" if ratio is None else f"{100 * (ratio - 1):+.1f}%"
+            print(f"{name:32} {format_time(before):>10} {format_time(after):>10} {change:>8}  {verdict.upper() if verdict == 'slower' else verdict}")
+
+        slower = [row for row in rows if row[4] == "slower"]
+        if len(slower) > 0:
+            print(f"{len(slower)} benchmark(s) got slower by more than {100 * threshold:g}%")
+            sys.exit(1)
+
+    else:
+        print(f"Unknown command {command}. Use run, compare or list")
+        sys.exit(2)
@@ -1,25 +1,35 @@
 import time
-import random
+import heapq
+from types import MappingProxyType
+from collections.abc import Sequence
 from numpy import arange
 from collections import namedtuple
 
-all_players = {}
-game_speed = 1
+from Battle_game_rng import Roll_Stream
+from Battle_game_events import Event_Buffer, Terminal_Renderer, RoundStart, MoveUsed, Hit, Miss, Crit, EffectApplied, BurnTick, PlayerDown
+
+# Above this many active players, each turn only shows the current player's summary rather than everyone's
+# Games use this unless they are given their own limit
+summary_limit = 10
+
+# Rolls for anything not given its own Roll_Stream
+default_rolls = Roll_Stream()
 
 # Format a player's name
 def name_fmt(player_name):
     return '\033[1m' + '\033[4m' + player_name + '\033[0m'
 
 # Generate names for default players
-def default_players():
+# rng is used to shuffle the names and choose classes, e.g. a game's Roll_Stream
+def default_players(rng = default_rolls):
 
     # Define default names and classes
     default_names = ["Mitchell", "Dave", "Kyran", "Chuckles", "Ford", "Alex", "Briff"]
     default_classes = ["Warrior", "Mage"]
 
     # Rearrange names and classes to randomise output order
-    random.shuffle(default_names)
-    random.shuffle(default_names)
+    rng.shuffle(default_names)
+    rng.shuffle(default_names)
 
     no_of_names = len(default_names)
     
@@ -29,36 +39,29 @@ def default_players():
     # Return the next generated name and class each time it is called
     for i in range(no_of_names):
         name = next(default_names)
-        atk_class = random.choice(default_classes)
+        atk_class = rng.choice(default_classes)
 
         yield (name, atk_class)
 
-# Format and print the given message 
-def error_message(header, message):
-    top_str = f"\n/ / / / / / {header} / / / / / /" 
-    print(top_str)
-    time.sleep(0.25 / game_speed)
-    input(f"{message}. Press Enter to continue: ")
-    print((int(len(top_str)) // 2) * "/ " + "\n")
-
-# Create a new player instance with the given name and class
-def add_new_player(name, atk_class):
-    all_players[name] = Player(name, atk_class)
-
-    new_player = list(all_players.values())[-1]
-
-    return f'{str(new_player)} is joining the battle as a {new_player.atk_class_name}! '
-
 # Used to define moves players can use
+# Moves are shared by every player of a class, so they should be treated as read-only
 class Move:
+
+    __slots__ = ("name", "move_type", "effect", "accuracy", "crit_info", "targets", "description", "stagger", "compiled_effects")
+
     def __init__(self, name, move_type, effect, accuracy, crit_info, targets, description, stagger = None):
         
-        # Set an attribute for each given parameter
-        all_attr = locals().copy()
-        del all_attr["self"]
+        self.name = name
+        self.move_type = move_type
+        self.effect = effect
+        self.accuracy = accuracy
+        self.crit_info = crit_info
+        self.targets = targets
+        self.description = description
+        self.stagger = stagger
 
-        for attr in all_attr:
-            setattr(self, attr, all_attr[attr])
+        # The move's effects as a tuple of handlers, ready to apply (see compile_effects)
+        self.compiled_effects = compile_effects(self)
 
     # Format and return status effects as a human-readable string
     def format_effects(self):
@@ -108,307 +111,674 @@ class Attack_Class:
         self.speed = speed
         self.health = health
 
-        # Creates a dictionary containing all moves the class can perform
-        self.move_set = {}
+        # Creates a read-only dictionary containing all moves the class can perform
+        # Every player of the class shares it rather than having their own copy
+        move_set = {}
         for move in moves:
-            self.move_set[move.name] = move
+            move_set[move.name] = move
+
+        self.move_set = MappingProxyType(move_set)
+        self.move_list = tuple(move_set.values())
+
+# A status effect on a player
+# power_key is "value" or "multiplier", depending on which one the effect uses
+# Effects can also be read like a dictionary, e.g. effect["value"]
+class Status_Effect:
+
+    __slots__ = ("name", "power_key", "power", "expires_on")
+
+    def __init__(self, name, power_key, power, expires_on):
+        self.name = name
+        self.power_key = power_key
+        self.power = power
+        self.expires_on = expires_on
+
+    def __getitem__(self, key):
+        if key == self.power_key:
+            return self.power
+
+        return getattr(self, key)
+
+# A move a player is charging up to use later
+class Staggered_Move:
+
+    __slots__ = ("move", "user", "targets", "ready_on", "block_use_move")
+
+    def __init__(self, move, user, targets, ready_on, block_use_move):
+        self.move = move
+        self.user = user
+        self.targets = targets
+        self.ready_on = ready_on
+        self.block_use_move = block_use_move
+
+    def __getitem__(self, key):
+        return getattr(self, key)
         
+# Keeps track of when each player's status effects expire and staggered moves are ready
+# Each player has a timing wheel of slots, one for each of their next WHEEL_SIZE turns, and a heap of anything...
+#...due further away than that. Things move from the heap to the wheel as their turn comes within range, so each...
+#...slot only ever holds what is due on its turn, and starting a turn only looks at what is due then
+# Everything due on the same turn comes out in the order it was scheduled
+class Turn_Scheduler:
+
+    WHEEL_SIZE = 8
+
+    def __init__(self):
+
+        # {player: slots}, with a slot for each of the next WHEEL_SIZE turns
+        self.wheels = {}
+
+        # {player: heap} of (turn, order, kind, item) for entries further off than that, which are rare...
+        #...so players only get a heap once they need one
+        self.heaps = {}
+
+        # Counts up with every entry scheduled, to keep entries in the order they were scheduled
+        self.scheduled = 0
+
+    # Schedule something for the start of the given turn of the player's, which must be after their current turn
+    # kind is "expire" for status effects and "ready" for staggered moves
+    def schedule(self, player, turn, kind, item):
+        self.scheduled += 1
+        entry = (turn, self.scheduled, kind, item)
+
+        if turn - player.turn_number > self.WHEEL_SIZE:
+            heap = self.heaps.get(player)
+
+            if heap is None:
+                heap = self.heaps[player] = []
+
+            heapq.heappush(heap, entry)
+
+        else:
+            self.schedule_entry(player, entry)
+
+    # Take out and return everything due at the start of the given turn of the player's, as (kind, item) pairs
+    # Turns must be popped one after another, as they are when the player starts each turn
+    def pop(self, player, turn):
+        heap = self.heaps.get(player)
+
+        # Bring in anything which is now within a wheel's turn of being due, which can't be due on this turn
+        if heap is not None:
+            while len(heap) > 0 and heap[0][0] - turn <= self.WHEEL_SIZE:
+                entry = heapq.heappop(heap)
+                self.schedule_entry(player, entry)
+
+            if len(heap) == 0:
+                del self.heaps[player]
+
+        slots = self.wheels.get(player)
+
+        if slots is None:
+            return []
+
+        slot = slots[turn % self.WHEEL_SIZE]
+        if slot is None:
+            return []
+
+        slots[turn % self.WHEEL_SIZE] = None
+
+        # Entries from the heap can land after ones scheduled later
+        if len(slot) > 1:
+            slot.sort(key = scheduled_order)
+
+        return [(kind, item) for due_turn, order, kind, item in slot]
+
+    # Put an entry into its slot
+    def schedule_entry(self, player, entry):
+        slots = self.wheels.get(player)
+
+        # Slots are only made once something is put in them
+        if slots is None:
+            slots = self.wheels[player] = [None] * self.WHEEL_SIZE
+
+        slot = slots[entry[0] % self.WHEEL_SIZE]
+
+        if slot is None:
+            slots[entry[0] % self.WHEEL_SIZE] = [entry]
+
+        else:
+            slot.append(entry)
+
+    # Forget everything scheduled for a player, e.g. when they are knocked out
+    def remove(self, player):
+        self.wheels.pop(player, None)
+        self.heaps.pop(player, None)
+
+def scheduled_order(entry):
+    return entry[1]
+
+# Returns the (damage taken multiplier, attack multiplier) given by counts of multiplier effects, as {(name, power): count}
+# The powers are multiplied in sorted order, so the result only depends on which effects there are...
+#...and not on the order they were given in
+def effect_multipliers(counts):
+    damage_taken_multiplier = 1
+    attack_multiplier = 1
+
+    for (name, power), count in sorted(counts.items()):
+        if name == "Protection":
+            damage_taken_multiplier *= power ** count
+
+        elif name == "Weakness":
+            damage_taken_multiplier /= power ** count
+
+        else:
+            attack_multiplier *= power ** count
+
+    return damage_taken_multiplier, attack_multiplier
+
+# Scheduler used by players who aren't given one
+# Players in a Game or Match are given that game's scheduler instead
+game_scheduler = Turn_Scheduler()
+
+# Text shown for each kind of status effect, as {(name, power key, power): text}, e.g. "+Attack: x1.5"
+# Each one is made the first time an effect like it is shown, and shared by every player from then on
+effect_labels = {}
+
 # Used to define player names, stats, and classes
 class Player:
 
+    __slots__ = ("name", "atk_class_name", "move_set", "speed", "health", "scheduler", "turn_number",
+                 "status_fx", "staggered_moves", "ready_moves", "block_use_move", "blocking_moves",
+                 "speed_change", "damage_taken_multiplier", "attack_multiplier", "multiplier_counts", "burn_total", "speed_listener",
+                 "formatted_fx", "formatted_staggered", "formatted_summary")
+
     # Sets the name and stats
-    def __init__(self, name, atk_class):
+    # Players in the same match should share a scheduler
+    def __init__(self, name, atk_class, scheduler = None):
         
         self.name = name
         self.atk_class_name = atk_class.name
-        self.move_set = atk_class.move_set.copy()
+        self.move_set = atk_class.move_set
         self.speed = atk_class.speed
         self.health = atk_class.health
 
-        # Stat multiplier = [multiplier, remaining turns]
-        self.status_fx = []
-        self.staggered_moves = []
+        if scheduler is None:
+            scheduler = game_scheduler
+
+        self.scheduler = scheduler
+
+        # Number of turns the player has started, which effects and staggered moves are timed against
+        self.turn_number = 0
+
+        # Status_Effect and Staggered_Move records, in the order they were given
+        # They are kept as the keys of dictionaries, so expired ones can be deleted without going through the rest
+        self.status_fx = {}
+        self.staggered_moves = {}
+
+        # Staggered moves which became ready at the start of this turn, and whether the player is blocked...
+        #...from choosing a move this turn
+        self.ready_moves = ()
+        self.block_use_move = False
+        self.blocking_moves = 0
+
+        # Totals of all active status effects, kept up to date as effects are added and expire...
+        #...so stats can be read without going through status_fx
+        self.speed_change = 0
+        self.damage_taken_multiplier = 1
+        self.attack_multiplier = 1
+        self.burn_total = 0
+
+        # How many of each multiplier effect the player has, as {(name, power): count}, which the multipliers are...
+        #...worked out from. There are only ever a few different powers, however many effects are stacked
+        self.multiplier_counts = {}
+
+        # Called with (player, old speed, new speed) whenever the player's true speed changes, e.g. by an Initiative_Queue
+        self.speed_listener = None
+
+        # The text from format_stat_fx, format_staggered_moves and format_self, or None if something has...
+        #...changed since it was made
+        self.clear_formatting()
 
     # Give the player a status effect
-    def add_status_effect(self, name, **properties):
-        self.status_fx.append({"name": name, **properties})
+    # An effect with 0 remaining turns lasts until the start of the player's next turn and is...
+    #...removed then, so it expires remaining_turns + 1 turns from now
+    # properties is either value or multiplier, e.g. add_status_effect("Burning", 2, value = 5)
+    def add_status_effect(self, name, remaining_turns, **properties):
+        (power_key, power), = properties.items()
+
+        self.apply_status_effect(Status_Effect(name, power_key, power, self.turn_number + 1 + remaining_turns))
+
+    # Put a Status_Effect record on the player, e.g. one restored from a saved match
+    def apply_status_effect(self, effect):
+        name = effect.name
+        power = effect.power
+
+        self.status_fx[effect] = None
+        self.scheduler.schedule(self, effect.expires_on, "expire", effect)
+
+        self.formatted_fx = None
+        self.formatted_summary = None
+
+        if name == "+Speed":
+            self.change_speed(power)
+
+        elif name == "-Speed":
+            self.change_speed(-power)
+
+        elif name == "Protection" or name == "Weakness" or name == "+Attack":
+            key = (name, power)
+            self.multiplier_counts[key] = self.multiplier_counts.get(key, 0) + 1
+            self.update_multipliers()
+
+        elif name == "Burning":
+            self.burn_total += power
+
+    # Take an expired status effect's stats away from the totals
+    # The caller takes the effect out of status_fx
+    def remove_status_effect(self, effect):
+        name = effect.name
+
+        self.formatted_fx = None
+        self.formatted_summary = None
+
+        if name == "+Speed":
+            self.change_speed(-effect.power)
+
+        elif name == "-Speed":
+            self.change_speed(effect.power)
+
+        elif name == "Burning":
+            self.burn_total -= effect.power
+
+        elif name == "Protection" or name == "Weakness" or name == "+Attack":
+            key = (name, effect.power)
+            self.multiplier_counts[key] -= 1
+
+            if self.multiplier_counts[key] == 0:
+                del self.multiplier_counts[key]
+
+            self.update_multipliers()
+
+    # Works out the multipliers from the counts of each multiplier effect
+    # They are made again from the counts rather than divided out, so they can't drift and go back to exactly 1...
+    #...once the effects are gone, and this only goes through the different powers, not every effect
+    def update_multipliers(self):
+        self.damage_taken_multiplier, self.attack_multiplier = effect_multipliers(self.multiplier_counts)
     
     # Have the player charge up a move to use later
+    # The move is ready at the start of the player's turn stagger[0] turns from now, and never sooner than their next turn
     def add_staggered_move(self, move, user, targets, stagger):
-        self.staggered_moves.append({"move": move, "user": user, "targets": targets, "remaining_turns": stagger[0], "block_use_move": stagger[1]})
+        self.apply_staggered_move(Staggered_Move(move, user, targets, self.turn_number + max(stagger[0], 1), stagger[1]))
 
-    # Allows the program to access a player's speed adjusted with any relevent effects
-    def get_true_speed(self):
+    # Put a Staggered_Move record on the player, e.g. one restored from a saved match
+    def apply_staggered_move(self, stag_move):
+        self.staggered_moves[stag_move] = None
+        self.scheduler.schedule(self, stag_move.ready_on, "ready", stag_move)
+
+        self.formatted_staggered = None
+        self.formatted_summary = None
 
-        true_speed = self.speed
+        if stag_move.block_use_move == True:
+            self.blocking_moves += 1
 
-        for status_effect in self.status_fx:
-            effect_name = status_effect["name"]
+    # Returns how many more turns a status effect or staggered move has left
+    def remaining_turns(self, entry):
+        if isinstance(entry, Status_Effect):
+            return entry.expires_on - 1 - self.turn_number
 
-            if effect_name == "+Speed" :
-                true_speed += status_effect["value"]
+        return entry.ready_on - self.turn_number
 
-            elif effect_name == "-Speed":
-                true_speed -= status_effect["value"]
+    # Adjust the player's speed and let the speed listener know
+    def change_speed(self, change):
+        old_speed = self.get_true_speed()
+        self.speed_change += change
 
-        return true_speed
+        if self.speed_listener is not None:
+            self.speed_listener(self, old_speed, self.get_true_speed())
+
+    # Allows the program to access a player's speed adjusted with any relevent effects
+    def get_true_speed(self):
+        return self.speed + self.speed_change
 
     # Make all status effects and staggered moves progress by 1 turn
+    # Only the effects and moves scheduled for this turn are looked at
     def increment_turns(self):
+        self.turn_number += 1
+
+        # A move which blocks the player still blocks them on the turn it is used
+        self.block_use_move = self.blocking_moves > 0
+        self.ready_moves = ()
+
+        # Everything scheduled is one of the player's effects or staggered moves, so without any there's nothing to do
+        if len(self.status_fx) == 0 and len(self.staggered_moves) == 0:
+            return
+
+        # Remaining turns are counted from the turn number, so any effects or staggered moves read differently now
+        self.clear_formatting()
+
+        due = self.scheduler.pop(self, self.turn_number)
+        if len(due) == 0:
+            return
 
-        for i, effect in zip(range(len(self.status_fx)), self.status_fx.copy()):
+        self.ready_moves = [item for kind, item in due if kind == "ready"]
 
-            turns = effect["remaining_turns"]
-            if turns <= 0:
-                del self.status_fx[i]
+        # Only the due entries are deleted, so this costs the same however many effects and moves are still going
+        for kind, item in due:
+            if kind == "expire":
+                del self.status_fx[item]
+                self.remove_status_effect(item)
 
             else:
-                effect["remaining_turns"] -= 1
+                del self.staggered_moves[item]
 
-        for i, move in zip(range(len(self.staggered_moves)), self.staggered_moves):
-            
-            turns = move["remaining_turns"]
-            
-            move["remaining_turns"] -= 1
+                if item.block_use_move == True:
+                    self.blocking_moves -= 1
+
+    # Forget the text made by the format methods, so it is made again next time
+    # Anything which changes a player's health, effects or staggered moves without going through their methods should call this
+    def clear_formatting(self):
+        self.formatted_fx = None
+        self.formatted_staggered = None
+        self.formatted_summary = None
 
     # Format and return player's status effets as a human-readable string
+    # The text is kept until the player's effects or turn number change
     def format_stat_fx(self):
-        formatted = f""
-        
+        if self.formatted_fx is not None:
+            return self.formatted_fx
+
+        labels = []
         for effect in self.status_fx:
+            key = (effect.name, effect.power_key, effect.power)
+            label = effect_labels.get(key)
 
-            # Seperates different effects with a comma
-            if len(formatted) > 0:
-                formatted += ", "
+            if label is None:
+                power = str(effect.power)
 
-            name = effect["name"]
-            turns = effect["remaining_turns"]
+                if effect.power_key == "multiplier":
+                    power = "x" + power
 
-            # Creates a dictionary which only includes the items which relate the the effect's power level
-            power_key = list(filter(lambda key: key not in ["name", "remaining_turns", "chance"], effect.keys()))[0]
-            power = str(effect[power_key])
+                label = effect_labels[key] = f"{effect.name}: {power}"
 
-            if power_key == "multiplier":
-                power = "x" + power
+            labels.append(f"{label} ({effect.expires_on - 1 - self.turn_number} turns)")
 
-            formatted += f"{name}: {power} ({turns} turns)"
-             
         # Return default message or status effects, depending on if there are any active
-        if len(formatted) == 0:
-            formatted = "No status effects"
+        if len(labels) == 0:
+            self.formatted_fx = "No status effects"
 
         else:
-            formatted = "Status FX- " + formatted
-        
-        return formatted
+            self.formatted_fx = "Status FX- " + ", ".join(labels)
+
+        return self.formatted_fx
 
     # Return default message or staggered moves, depending on if there are any active
+    # The text is kept until the player's staggered moves or turn number change
     def format_staggered_moves(self):
-        formatted = ""
+        if self.formatted_staggered is not None:
+            return self.formatted_staggered
 
-        for move in self.staggered_moves:
+        if len(self.staggered_moves) == 0:
+            self.formatted_staggered = "No staggered moves"
 
-            if len(formatted) > 0:
-                formatted += ", "
-            formatted += f"{move['move']}: {move['remaining_turns']} turns"
-        
-        if len(formatted) == 0:
-            formatted = "No staggered moves"
+        else:
+            self.formatted_staggered = ", ".join(f"{stag_move.move.name}: {stag_move.ready_on - self.turn_number} turns" for stag_move in self.staggered_moves)
 
-        return formatted
+        return self.formatted_staggered
     
     # Make the player take damage from burning 
-    def burn_tick(self):
+    # All Burning effects are added together and dealt as one lot of damage
+    def burn_tick(self, events = None):
     
-        for effect in self.status_fx:
+        if self.burn_total > 0:
+            damage = self.inflict_damage(self.burn_total)
 
-            if effect["name"] == "Burning":
-                damage = self.inflict_damage(effect["value"])
-                print(f"{self.name} was burned for {damage} damage")
-
-                time.sleep(1 / game_speed)
+            if events is not None:
+                events.emit(BurnTick(self, damage))
 
 
     def __str__(self):
         return name_fmt(self.name)
     
     # Return the player's summary as a human-readable string
+    # The summary is kept until the player's health, effects, staggered moves or turn number change
     def format_self(self):
-        formatted_fx = self.format_stat_fx()
-        formatted_staggered_moves = self.format_staggered_moves()
+        if self.formatted_summary is None:
+
+            # Displays HP, Speed, Status FX, and Staggered Moves
+            self.formatted_summary = f"{self.name}: {self.health} HP --- {self.get_true_speed()} Speed --- {self.format_stat_fx()} --- {self.format_staggered_moves()}"
 
-        # Displays HP, Speed, Status FX, and Staggered Moves
-        return f"{self.name}: {self.health} HP --- {self.get_true_speed()} Speed --- {formatted_fx} --- {formatted_staggered_moves}"
+        return self.formatted_summary
     
     # Update the player to reflect a turn being used
-    def new_turn(self):
+    def new_turn(self, events = None):
         self.increment_turns()
-        self.burn_tick()
+        self.burn_tick(events)
         
 
     # Inflicts damage on the player
     def inflict_damage(self, damage):
 
-        # Check player Status FX for relevent FX and apply them
-        for effect in self.status_fx:
-            if effect["name"] == "Protection":  
-                damage *= effect["multiplier"]
-            
-            elif effect["name"] == "Weakness":
-                damage /= effect["multiplier"]
+        # Apply the combined multiplier of any Protection and Weakness FX
+        damage *= self.damage_taken_multiplier
 
         # Round damage to nearest whole number
         damage = round(damage, 0)
 
         # Reduce the player's health by the given damage
         self.health -= damage
+        self.formatted_summary = None
         return damage
     
     # Heals the player
     def heal(self, heal):
         self.health += heal
+        self.formatted_summary = None
 
-# Format and return move accuracy as a human-readable string
-def format_accuracy(accuracy):
-    return str(accuracy) + '%' if accuracy != True else 'Cannot miss'
+# Keeps track of which players are still in a match
+# Each player gets a stable id in the order they joined, which is also the order they take their turns
+# Active ids are kept in a list with each one's position stored, so a player can be knocked out...
+#...by moving the last id into their place rather than shifting the whole list
+class Roster:
 
-# Check user input to decide whether move info should be displayed
-def check_if_info_req(req):
+    def __init__(self, players = ()):
+        self.players = []
+        self.ids = {}
+        self.active = []
+        self.positions = []
 
-    is_info_req = False
-    if len(req) >= 5:
-        is_info_req = req[0:5].upper() == 'INFO '
-    
-    if is_info_req:
-        req = req[5:]
+        for player in players:
+            self.add(player)
 
-    return is_info_req, req
+    # Add a player and return their id
+    def add(self, player):
+        if player.name in self.ids:
+            raise ValueError(f"{player.name} is in the roster more than once")
 
-# Allow the player to select a move from their class move list
-def select_move(player):
-    is_valid_move = False
+        player_id = len(self.players)
 
-    while True:
-        move_set = player.move_set
+        self.players.append(player)
+        self.ids[player.name] = player_id
+        self.positions.append(len(self.active))
+        self.active.append(player_id)
 
-        print("CHOOSE YOUR MOVE")
-        time.sleep(0.25 / game_speed)
+        return player_id
 
-        # Print all ofthe user's moves in a human-readable format
-        for i, move in zip(range(1, len(move_set) + 1), move_set):
-            time.sleep(0.1 / game_speed)
-            print(f"{i}: {move} --- {move_set[move].description}")
+    # Number of active players
+    def __len__(self):
+        return len(self.active)
 
-        # Get the user's move choice
-        move = input("Which move would you like to use? Type \'INFO <choice>\' to get information about that move. ")
-        is_info_req, move = check_if_info_req(move)
+    def __contains__(self, name):
+        player_id = self.ids.get(name)
+        return player_id is not None and self.positions[player_id] >= 0
 
-        if move != "":
+    # Returns the player with the given name, whether they are active or not
+    def get(self, name):
+        return self.players[self.ids[name]]
 
-            # Allow user to enter move name in full
-            if move.capitalize() in move_set:
-                is_valid_move = True
-            
-            # Allow user to enter move number as shorthand
-            elif move.isnumeric():
-                move = int(move)
-
-                # If move is a valid number, set move to its...
-                #...corresponding attack
-                if move in range(1, len(move_set) + 1):
-                    move = move_set[list(move_set.keys())[move - 1]]
-                    is_valid_move = True
+    def is_active(self, player):
+        return self.positions[self.ids[player.name]] >= 0
 
-                else:
-                    error_message("INVALID NUMBER", f"You must either enter the move name or a number from 1 to {len(move_set)}")
+    # Knock a player out of the match
+    def remove(self, player):
+        player_id = self.ids[player.name]
+        position = self.positions[player_id]
+
+        if position < 0:
+            return
+
+        last_id = self.active.pop()
+        if last_id != player_id:
+            self.active[position] = last_id
+            self.positions[last_id] = position
+
+        self.positions[player_id] = -1
+
+    # Returns the active players in the order they take their turns
+    def turn_order(self):
+        return [self.players[player_id] for player_id in sorted(self.active)]
+
+    # Returns the active players other than the given one, in no particular order
+    def others(self, player):
+        return Other_Players(self, self.positions[self.ids[player.name]])
+
+# Decides who goes next when turn order comes from speed rather than the order players joined in
+# In "round" mode, every active player has one turn each round, fastest first
+# In "timeline" mode there are no fixed rounds. Each player acts again BASE_SPEED / speed rounds after their last turn...
+#...so faster players get more turns, and a player with BASE_SPEED acts once a round
+# Waiting players are kept in a heap. When someone's speed changes, a new entry is pushed for them and the old one...
+#...is skipped when it comes out, so nothing needs re-sorting
+class Initiative_Queue:
+
+    BASE_SPEED = 50
+
+    def __init__(self, mode = "round"):
+        if mode not in ("round", "timeline"):
+            raise ValueError(f"Unknown initiative mode {mode}")
+
+        self.mode = mode
+        self.heap = []
+
+        # Current heap key and entry version of each waiting player, and the time of the latest turn
+        self.keys = {}
+        self.versions = {}
+        self.now = 0.0
+
+    # Returns how long a player with the given speed waits between turns in timeline mode
+    def delay(self, speed):
+        return self.BASE_SPEED / max(speed, 1)
+
+    # Puts a player in the queue
+    # order breaks ties between players, e.g. their roster id
+    # In timeline mode, the player acts one delay after time, or after the latest turn if no time is given
+    def add(self, player, order, time = None):
+        if self.mode == "round":
+            key = -player.get_true_speed()
 
-            else:
-                error_message("INVALID INPUT", f"{move} is not in your move set")
         else:
-            error_message("NOTHING ENTERED", "You must enter a move to use")
+            if time is None:
+                time = self.now
 
-        # Print the move's information or allow the move to be used
-        if is_valid_move:
-            if is_info_req:
-                print('\n', move.format_self(), '\n')
-                input('Press Enter to continue: ')
+            key = time + self.delay(player.get_true_speed())
 
-            else:
-                break
+        self.push(player, key, order)
+        player.speed_listener = self.speed_changed
 
-    return move
+    def push(self, player, key, order):
+        version = self.versions.get(player, 0) + 1
+        self.versions[player] = version
+        self.keys[player] = (key, order)
 
-# Allow the player to slect their move's target
-def select_target(num_targets, possible_targets, move_info = None):
+        heapq.heappush(self.heap, (key, order, version, player))
 
-    chosen_trgts = []
+    # Returns (time, player) for the player whose turn is next without taking them out, or None if nobody is waiting
+    def peek(self):
+        while len(self.heap) > 0:
+            key, order, version, player = self.heap[0]
 
-    # Allows the user to select a number of targets equal to...
-    #...whichever is lowest; num_targets or length of possible_targets
-    for i in range(min( num_targets, len( possible_targets))):
-        
-        print("CHOOSE YOUR TARGET")
-        time.sleep(0.25 / game_speed)
+            if self.versions.get(player) == version:
+                return (key if self.mode == "timeline" else 0.0), player
 
-        is_valid_target = False
-        while True:
+            heapq.heappop(self.heap)
 
-            # Creates a dictionary which holds each potential target and a corresponding number
-            targets_dict = {}
-            for trgt_num, target in zip(range(len(possible_targets)), possible_targets):
-                trgt_num += 1
-                targets_dict[trgt_num] = all_players[target]
-                print(f"{trgt_num}: {target}")
-            
-            new_trgt = input("Who would you like to target? Type \'INFO <choice>\' to see how accurate the move will be on them. ")
-            is_info_req, new_trgt = check_if_info_req(new_trgt)
-
-            # Decides if the user had entered a number or a name
-            # Gives appropriate error messages if input is invalid
-            # Validates input
-            target_names = [target.name for target in targets_dict.values()]
-            if new_trgt in target_names:
-                new_trgt = all_players[new_trgt]
-                is_valid_target = True
-
-            elif new_trgt.isnumeric():
-                new_trgt = int(new_trgt)
-
-                if new_trgt in targets_dict:
-                    
-                    new_trgt = targets_dict[new_trgt]
-                    is_valid_target = True
-                
-                else:       
-                    error_message("INVALID NUMBER", f"You must only enter a number between 1 and {len(targets_dict)} (inclusive)")
-                
-            else:
-                error_message("INVALID TARGET", f"You must enter a player name with correct casing or corresponding number")
+        return None
 
-            # If a valid target was chosen, print info or allow the move to progress
-            if is_valid_target: 
-                
-                if is_info_req:
-                    print('\n', new_trgt.format_self(), '\n')
+    # Takes out the player whose turn is next and returns (time, player)
+    # In round mode, time is 0 and None is returned once everyone has had their turn
+    def pop(self):
+        while len(self.heap) > 0:
+            key, order, version, player = heapq.heappop(self.heap)
 
-                    # Print the liklihood of landing a hit on that target
-                    if move_info != None:
-                        usual_accuracy = format_accuracy(move_info[0].accuracy)
-                        actual_accuracy = format_accuracy(str(get_true_accuracy(*move_info, new_trgt)))
+            if self.versions.get(player) != version:
+                continue
 
-                        print('Baseline chance of hitting: ', usual_accuracy)
-                        print('Actual chance of hitting: ', actual_accuracy, '\n')
-                    
-                    input('Press Enter to continue: ')
+            del self.keys[player]
 
-                else:
-                    chosen_trgts.append(new_trgt)
-                    possible_targets.remove(new_trgt.name)
-                    break
+            if self.mode == "timeline":
+                self.now = key
+                return key, player
+
+            return 0.0, player
+
+        return None
+
+    # Takes a player out of the queue, e.g. when they are knocked out
+    def discard(self, player):
+        if player in self.keys:
+            del self.keys[player]
+            self.versions[player] += 1
+
+        player.speed_listener = None
+
+    # Moves a waiting player when their speed changes
+    # In timeline mode, the time they have left to wait is scaled by how much faster or slower they now are
+    def speed_changed(self, player, old_speed, new_speed):
+        if player not in self.keys:
+            return
 
-       
+        key, order = self.keys[player]
+
+        if self.mode == "round":
+            key = -new_speed
+
+        else:
+            key = self.now + (key - self.now) * max(old_speed, 1) / max(new_speed, 1)
+
+        self.push(player, key, order)
+
+    def __len__(self):
+        return len(self.keys)
+
+# A read-only list of a roster's active players, leaving out one of them
+# Nothing is copied, so it can be made for every move even with thousands of players
+class Other_Players(Sequence):
+
+    def __init__(self, roster, skip_position):
+        self.roster = roster
+        self.skip_position = skip_position
+
+    def __len__(self):
+        return len(self.roster.active) - (1 if self.skip_position >= 0 else 0)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+
+        if i < 0 or i >= len(self):
+            raise IndexError("player index out of range")
+
+        if self.skip_position >= 0 and i >= self.skip_position:
+            i += 1
+
+        return self.roster.players[self.roster.active[i]]
+
+# Format and return move accuracy as a human-readable string
+def format_accuracy(accuracy):
+    return str(accuracy) + '%' if accuracy != True else 'Cannot miss'
+
+# Check user input to decide whether move info should be displayed
+def check_if_info_req(req):
+
+    is_info_req = False
+    if len(req) >= 5:
+        is_info_req = req[0:5].upper() == 'INFO '
     
-    return chosen_trgts
+    if is_info_req:
+        req = req[5:]
+
+    return is_info_req, req
 
 # Finds the real accuracy of a move based on it user and target
 def get_true_accuracy(move, user, target):
@@ -442,11 +812,23 @@ def get_true_accuracy(move, user, target):
 
     return hit_chance
 
+# Finds the chance (%) of a move landing a critical hit, based on its user
+def get_crit_chance(move, user):
+
+    crit_chance = move.crit_info["chance"]
+
+    # The user's speed will increase the chance of a crit if the move is...
+    #...neither ranged nor self-targetting
+    if "Ranged" not in move.move_type and move.targets != "Self":
+        crit_chance += user.get_true_speed() / 10
+
+    return int(round(crit_chance, 0))
+
 # Decide whether the user landed or didn't land a hit on the target
-def hit_or_miss(move, user, target):
+# rng can be any object with a randint method, e.g. a seeded Roll_Stream or random.Random
+def hit_or_miss(move, user, target, rng = default_rolls):
 
     accuracy = move.accuracy
-    move_type = move.move_type
     crit_info = move.crit_info
     target_speed = target.speed
     user_speed = user.speed
@@ -460,7 +842,7 @@ def hit_or_miss(move, user, target):
 
         # If the hit chance (%) is below the generated number, it misses...
         # ... otherwise it hits
-        roll = random.randint(1, 100)
+        roll = rng.randint(1, 100)
         if roll >= hit_chance:
             hit = False
         
@@ -474,15 +856,8 @@ def hit_or_miss(move, user, target):
     crit = False
     if crit_info != False:
         
-        crit_chance = crit_info["chance"]
-
-        # The user's speed will increase the chance of a crit if the move is...
-        #...neither ranged nor self-targetting
-        if "Ranged" not in move_type and move.targets != "Self":
-            crit_chance += user.get_true_speed() / 10
-        
-        crit_chance = int(round(crit_chance, 0))
-        roll = random.randint(1, 100)
+        crit_chance = get_crit_chance(move, user)
+        roll = rng.randint(1, 100)
 
         if  roll > crit_chance:
             crit = False
@@ -494,205 +869,693 @@ def hit_or_miss(move, user, target):
 
     return hit, crit
 
-# Executes a move regardless of accuracy
-def execute_move(move, user, target, crit):
+# Each kind of effect a move can have is turned into a handler function when the move is made, with...
+#...everything that doesn't change between hits (values, crit versions, effect names) worked out up front
+# A compiler is called as compiler(move, name, props) for an effect like {name: props} in a move's effects...
+#...and returns a handler(user, target, crit, events) which applies the effect to the target
+# Effect compilers, as {effect name: compiler}
+effect_compilers = {}
 
-    # If the move doesn't do anything (right now), print a default message
+# Add a new kind of effect, or replace an existing one
+# Moves made after this can use the effect
+def register_effect(name, compiler):
+    effect_compilers[name] = compiler
+
+# Turns a move's effects into a tuple of handlers, in the same order as move.effect
+def compile_effects(move):
+
+    # If the move doesn't do anything (right now), say so
     if len(move.effect) == 0:
-        msg = 'He\'s just standing there... MENACINGLY'
-        
-        print(msg)
-        time.sleep(1 / game_speed)
+
+        def do_nothing(user, target, crit, events):
+            if events is not None:
+                events.emit(EffectApplied(user, target, move, None, None, crit))
+
+        return (do_nothing,)
+
+    handlers = []
+    for name, props in move.effect.items():
+        if name not in effect_compilers:
+            raise ValueError(f"{move.name} has an unknown effect {name}")
+
+        handlers.append(effect_compilers[name](move, name, props))
+
+    return tuple(handlers)
+
+# The multiplier a crit applies to the move's effects, or None if the move can't crit
+def crit_effect_of(move):
+    if move.crit_info == False:
+        return None
+
+    return move.crit_info["crit_effect"]
+
+def compile_damage(move, name, props):
+    value = props["value"]
+    crit_effect = crit_effect_of(move)
+
+    def apply_damage(user, target, crit, events):
+
+        # Applies the combined multiplier of the user's +Attack FX
+        damage = value * user.attack_multiplier
+
+        if crit == True:
+            damage *= crit_effect
+            damage = int(round(damage, 0))
+
+        damage = target.inflict_damage(damage)
+
+        if events is not None:
+            events.emit(Hit(user, target, move, damage, crit))
+
+    return apply_damage
+
+def compile_heal(move, name, props):
+    heal = props["value"]
+    crit_heal = heal
+
+    if crit_effect_of(move) is not None:
+        crit_heal = int(round(heal * crit_effect_of(move), 0))
+
+    def apply_heal(user, target, crit, events):
+        amount = crit_heal if crit == True else heal
+        target.heal(amount)
+
+        if events is not None:
+            events.emit(EffectApplied(user, target, move, name, amount, crit))
+
+    return apply_heal
+
+# Returns a handler which gives the target a status effect
+# normal and crit are the (effect name, power key, power) to give without and with a crit
+def status_effect_handler(move, normal, crit_version, duration):
+
+    def apply_status_effect(user, target, crit, events):
+        effect, power_key, power = crit_version if crit == True else normal
+        target.add_status_effect(effect, duration, **{power_key: power})
+
+        if events is not None:
+            events.emit(EffectApplied(user, target, move, effect, power, crit))
+
+    return apply_status_effect
+
+# Attack modifiers below x1 become -Attack
+def compile_attack(move, name, props):
+    multiplier = (props["percentage"] / 100) + 1
+    crit_multiplier = multiplier
+
+    if crit_effect_of(move) is not None:
+        crit_multiplier = int(round(multiplier * crit_effect_of(move), 2))
+
+    versions = []
+    for power in (multiplier, crit_multiplier):
+        versions.append(("-Attack" if power < 1 else "+Attack", "multiplier", power))
+
+    return status_effect_handler(move, versions[0], versions[1], props["duration"])
+
+# Returns the (effect name, value) of a speed effect, swapping +Speed and -Speed if the value is negative
+def speed_version(name, speed_change):
+    if speed_change < 0:
+        name = "-Speed" if name == "+Speed" else "+Speed"
+        speed_change = -speed_change
+
+    return name, speed_change
+
+def compile_speed(move, name, props):
+    speed_change = props["value"]
+    crit_speed_change = speed_change
+
+    if crit_effect_of(move) is not None:
+        crit_speed_change = int(round(speed_change * crit_effect_of(move), 0))
+
+    normal = speed_version(name, speed_change)
+    crit_version = speed_version(name, crit_speed_change)
+
+    return status_effect_handler(move, (normal[0], "value", normal[1]), (crit_version[0], "value", crit_version[1]), props["duration"])
+
+# A crit sets the multiplier to the speed change of an earlier speed effect in the same move, as execute_move...
+#...always has. A crit with no earlier speed effect is an error
+def compile_defense(move, name, props):
+    if name == "Protection":
+        percentage = props["value"]
+
+    else:
+        percentage = props["value"] + 100
+
+    multiplier = (percentage / 100)
+    crit_multiplier = None
+
+    if crit_effect_of(move) is not None:
+        for earlier_name, earlier_props in move.effect.items():
+            if earlier_name == name:
+                break
+
+            if earlier_name == "+Speed" or earlier_name == "-Speed":
+                crit_multiplier = speed_version(earlier_name, int(round(earlier_props["value"] * crit_effect_of(move), 0)))[1]
+
+    apply_status_effect = status_effect_handler(move, (name, "multiplier", multiplier), (name, "multiplier", crit_multiplier), props["duration"])
+
+    if crit_multiplier is not None or crit_effect_of(move) is None:
+        return apply_status_effect
+
+    def apply_defense(user, target, crit, events):
+        if crit == True:
+            raise ValueError(f"{move.name} can't crit with {name}, as it has no speed effect before it")
+
+        apply_status_effect(user, target, crit, events)
+
+    return apply_defense
+
+def compile_burning(move, name, props):
+    burn_dmg = props["value"]
+    crit_burn_dmg = burn_dmg
+
+    if crit_effect_of(move) is not None:
+        crit_burn_dmg = burn_dmg * crit_effect_of(move)
+
+    return status_effect_handler(move, (name, "value", burn_dmg), (name, "value", crit_burn_dmg), props["duration"])
+
+register_effect("Damage", compile_damage)
+register_effect("Heal", compile_heal)
+register_effect("+Attack", compile_attack)
+register_effect("-Attack", compile_attack)
+register_effect("+Speed", compile_speed)
+register_effect("-Speed", compile_speed)
+register_effect("Protection", compile_defense)
+register_effect("Weakness", compile_defense)
+register_effect("Burning", compile_burning)
+
+# Executes a move regardless of accuracy
+# What happens is added to events, if given, for a renderer to show
+def execute_move(move, user, target, crit, events = None):
+
+    if crit == True and events is not None:
+        events.emit(Crit(user, target, move))
 
     # Apply all effects from the used move
-    for effect in move.effect:
+    for apply_effect in move.compiled_effects:
+        apply_effect(user, target, crit, events)
+
+# One interactive game, with everything it needs kept on the instance rather than in module globals...
+#...so several games can be run in the same interpreter
+# rng is used for hit and crit rolls and default players, and clock is anything with a sleep(seconds) method...
+#...which is used for the pauses between messages
+# profiler is an optional Profiler to time each phase of the game, including the pauses
+class Game:
+
+    def __init__(self, game_speed = 1, seed = None, clock = time, summary_limit = summary_limit, profiler = None):
+        self.game_speed = game_speed
+        self.rng = Roll_Stream(seed)
+
+        self.profiler = profiler
+        if profiler is not None:
+            clock = profiler.wrap_clock(clock)
+
+        self.clock = clock
+
+        # Above this many active players, each turn only shows the current player's summary rather than everyone's
+        self.summary_limit = summary_limit
+
+        # Every player who joined, as {name: Player}, and the Roster of players still in the game
+        self.all_players = {}
+        self.active_players = Roster()
+        self.round_count = 0
+
+        # Times status effects and staggered moves for every player in the game
+        self.scheduler = Turn_Scheduler()
+
+        # Events from the game, and the renderer which shows them in the terminal
+        self.events = Event_Buffer()
+        self.renderer = Terminal_Renderer(game_speed, clock)
+
+        # Names of the players who are controlled by the computer, and the policy which chooses their moves
+        self.computer_players = set()
+        self.computer_policy = None
+
+    # Wait for the given number of seconds, scaled by the game speed
+    def pause(self, seconds):
+        self.clock.sleep(seconds / self.game_speed)
+
+    # Everything the game shows goes through show() and every question through ask()...
+    #...so another display, like the dashboard, can take over the terminal
+    def show(self, *text):
+        print(*text)
+
+    def ask(self, prompt):
+        return input(prompt)
 
-        if user.name == target.name:
-            target_name = "themself"
+    # Print the player's summary at the start of their turn, and everyone else's if there aren't too many to read
+    def show_summaries(self, player):
+        self.show(f"\n------ {str(player)}'s turn ------")
+        if len(self.active_players) <= self.summary_limit:
+            for p in self.active_players.turn_order():
+                self.show(p.format_self())
+                self.pause(0.25)
 
         else:
-            target_name = target.name
+            self.show(player.format_self())
+            self.show(f"...and {len(self.active_players) - 1} other players")
 
-        # Stores the properties of an effect, e.g., {"Damage": {"value": 10}}
-        effect_props = move.effect[effect]
-        
-        # Apply damage
-        if effect == "Damage":
 
-            damage = effect_props["value"]
+        self.show()
+        self.pause(0.5)
 
-            # Checks for any status effects that affect the damage output
-            for status_effect in user.status_fx:
+    # Format and print the given message 
+    def error_message(self, header, message):
+        top_str = f"\n/ / / / / / {header} / / / / / /" 
+        self.show(top_str)
+        self.pause(0.25)
+        self.ask(f"{message}. Press Enter to continue: ")
+        self.show((int(len(top_str)) // 2) * "/ " + "\n")
 
-                if status_effect["name"] == "+Attack":
-                    damage *= status_effect["multiplier"]
+    # Create a new player instance with the given name and class
+    def add_new_player(self, name, atk_class):
+        new_player = Player(name, atk_class, self.scheduler)
+        self.all_players[name] = new_player
 
-            if crit == True:
+        return f'{str(new_player)} is joining the battle as a {new_player.atk_class_name}! '
 
-                damage *= move.crit_info["crit_effect"]
-                damage = int(round(damage, 0))
+    # Allow the player to select a move from their class move list
+    def select_move(self, player):
+        is_valid_move = False
 
-                damage = target.inflict_damage(damage)
-                msg = f"*** {user.name} landed a critical hit on {target_name} with {move.name}, causing {damage} damage! ***"
-                
-            else:
-                damage = target.inflict_damage(damage)
-                msg = f"{user.name} hit {target_name} with {move.name}, causing {damage} damage!"
+        while True:
+            move_set = player.move_set
+
+            self.show("CHOOSE YOUR MOVE")
+            self.pause(0.25)
 
+            # Print all ofthe user's moves in a human-readable format
+            for i, move in zip(range(1, len(move_set) + 1), move_set):
+                self.pause(0.1)
+                self.show(f"{i}: {move} --- {move_set[move].description}")
 
-        # Apply healing
-        elif effect == "Heal":
+            # Get the user's move choice
+            move = self.ask("Which move would you like to use? Type \'INFO <choice>\' to get information about that move. ")
+            is_info_req, move = check_if_info_req(move)
+
+            if move != "":
+
+                # Allow user to enter move name in full
+                if move.capitalize() in move_set:
+                    is_valid_move = True
 
-            heal = effect_props["value"]
+                # Allow user to enter move number as shorthand
+                elif move.isnumeric():
+                    move = int(move)
 
-            if crit == True:
+                    # If move is a valid number, set move to its...
+                    #...corresponding attack
+                    if move in range(1, len(move_set) + 1):
+                        move = move_set[list(move_set.keys())[move - 1]]
+                        is_valid_move = True
 
-                heal *= move.crit_info["crit_effect"]
-                heal = int(round(heal, 0))
+                    else:
+                        self.error_message("INVALID NUMBER", f"You must either enter the move name or a number from 1 to {len(move_set)}")
 
-                msg = f"*** {user.name} healed themself for {heal} HP! ***"
-                
+                else:
+                    self.error_message("INVALID INPUT", f"{move} is not in your move set")
             else:
-                msg = f"{user.name} healed themself for {heal} HP"
+                self.error_message("NOTHING ENTERED", "You must enter a move to use")
 
-            target.heal(heal)
+            # Print the move's information or allow the move to be used
+            if is_valid_move:
+                if is_info_req:
+                    self.show('\n', move.format_self(), '\n')
+                    self.ask('Press Enter to continue: ')
 
-        # Apply attack modifiers
-        elif effect == "+Attack" or effect == "-Attack":
-            
-            percentage = effect_props["percentage"]
-            multiplier = (percentage / 100) + 1
-            duration = effect_props["duration"]
+                else:
+                    break
+
+        return move
 
-            if crit == True:
-                multiplier *= move.crit_info["crit_effect"]
+    # Allow the player to slect their move's target
+    # possible_targets is a list of players
+    def select_target(self, num_targets, possible_targets, move_info = None):
 
-                multiplier = int(round(multiplier, 2))
+        chosen_trgts = []
+        possible_targets = list(possible_targets)
+
+        # Allows the user to select a number of targets equal to...
+        #...whichever is lowest; num_targets or length of possible_targets
+        for i in range(min( num_targets, len( possible_targets))):
+
+            self.show("CHOOSE YOUR TARGET")
+            self.pause(0.25)
+
+            # Holds the position of each potential target, so names can be looked up without searching the list
+            target_positions = {target.name: trgt_num for trgt_num, target in enumerate(possible_targets)}
+
+            while True:
+                is_valid_target = False
+
+                for trgt_num, target in enumerate(possible_targets):
+                    self.show(f"{trgt_num + 1}: {target.name}")
+
+                new_trgt = self.ask("Who would you like to target? Type \'INFO <choice>\' to see how accurate the move will be on them. ")
+                is_info_req, new_trgt = check_if_info_req(new_trgt)
+
+                # Decides if the user had entered a number or a name
+                # Gives appropriate error messages if input is invalid
+                # Validates input
+                if new_trgt in target_positions:
+                    trgt_num = target_positions[new_trgt]
+                    is_valid_target = True
+
+                elif new_trgt.isnumeric():
+                    trgt_num = int(new_trgt) - 1
+
+                    if trgt_num in range(len(possible_targets)):
+                        is_valid_target = True
+
+                    else:       
+                        self.error_message("INVALID NUMBER", f"You must only enter a number between 1 and {len(possible_targets)} (inclusive)")
 
-                if multiplier < 1:
-                    effect = "-Attack"
-                
                 else:
-                    effect = "+Attack"
+                    self.error_message("INVALID TARGET", f"You must enter a player name with correct casing or corresponding number")
+
+                # If a valid target was chosen, print info or allow the move to progress
+                if is_valid_target: 
+                    new_trgt = possible_targets[trgt_num]
+
+                    if is_info_req:
+                        self.show('\n', new_trgt.format_self(), '\n')
 
-                msg = f"*** {user.name} gave {target_name} {effect}(x{multiplier}) ***"
+                        # Print the liklihood of landing a hit on that target
+                        if move_info != None:
+                            usual_accuracy = format_accuracy(move_info[0].accuracy)
+                            actual_accuracy = format_accuracy(str(get_true_accuracy(*move_info, new_trgt)))
+
+                            self.show('Baseline chance of hitting: ', usual_accuracy)
+                            self.show('Actual chance of hitting: ', actual_accuracy, '\n')
+
+                        self.ask('Press Enter to continue: ')
+
+                    else:
+                        chosen_trgts.append(new_trgt)
+                        possible_targets.pop(trgt_num)
+                        break
+
+
+
+        return chosen_trgts
+
+    # Show everything that has happened since the last time
+    def render(self):
+        if self.profiler is not None:
+            self.profiler.enter("rendering")
+
+        self.renderer.render(self.events.drain())
+
+        if self.profiler is not None:
+            self.profiler.exit()
+
+    # Calculates whether a move crits, hits, or misses, and executes it...
+    #...on each target
+    def attempt_move(self, move, user, targets):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter("attempt move")
+            profiler.count("moves")
+            rolls_before = self.rng.position()
+
+        self.events.emit(MoveUsed(user, move, targets))
+
+        for target in targets:
+
+            # Players who were knocked out before a staggered move landed can't be hit again
+            if not self.active_players.is_active(target):
+                continue
+
+            # Find whether the move lands and if it is a critical hit
+            hit, crit = hit_or_miss(move, user, target, self.rng)
+
+            if profiler is not None:
+                profiler.record_hit(move, hit, crit)
+
+            if hit == True:
             
+                execute_move(move, user, target, crit, self.events)
+        
             else:
-                if multiplier < 1:
-                    effect = "-Attack"
-                
+                self.events.emit(Miss(user, target, move))
+
+            # 'Kill' the player if their health is below 1
+            if target.health < 1:
+                self.remove_player(target)
+
+        if profiler is not None:
+            profiler.count("rolls", self.rng.position() - rolls_before)
+            profiler.exit()
+
+        self.render()
+
+    # Remove a player from the game
+    def remove_player(self, player):
+        self.active_players.remove(player)
+        player.scheduler.remove(player)
+
+        self.events.emit(PlayerDown(player))
+
+    # Makes a Player class character for each name entered
+    def enter_players(self):
+        self.ask("Enter each player's name below. \nOnce each name is entered, leave the input blank and press Enter. \nTo use default players, type \'default<number of players>\'. \nTo add computer players, type \'cpu<number of players>\'. \nPress Enter to continue ")
+
+        while True:
+            name = self.ask("Enter a name: ")
+
+            # Checks that the user entered a name
+            # If the player name is not already present, ask for their class...
+            #... and add them to the self.all_players dictionary
+
+            if name != "":
+
+                # If the first part of a name input is the default trigger, use default players
+                # The computer trigger does the same, but the players are controlled by the computer
+                default_trigger = "default"
+                computer_trigger = "cpu"
+                use_computer = name[0:len(computer_trigger)] == computer_trigger
+
+                if use_computer:
+                    default_trigger = computer_trigger
+
+                def_trig_length = len(default_trigger)
+                use_default = name[0:def_trig_length] == default_trigger
+
+                if use_default:
+                    try:
+                        # Get number of defaults from end of user's input
+                        num_defaults = int(name[def_trig_length:])
+
+                    except:
+                        pass
+
+                    else:
+
+                        try:
+                            # Define player generator and create a number of default players...
+                            #... equal to the number entered after the default trigger phrase
+                            default_player_generator = default_players(self.rng)
+
+                            for i in range(num_defaults):
+                                while True:
+                                    name, atk_class = next(default_player_generator)
+
+                                    atk_class = all_classes[atk_class]
+
+                                    # Only add the name if it doesn't already exist
+                                    if name not in self.all_players:
+                                        self.show(self.add_new_player(name, atk_class))
+                                        self.pause(0.25)
+
+                                        if use_computer:
+                                            self.computer_players.add(name)
+
+                                        break
+
+                        # Print an error if the generator has reached the end of its name list
+                        except StopIteration:
+                            self.error_message("NO MORE DEFAULTS", "No more default players can be added")
+
+                    use_default = False
+
                 else:
-                    effect = "+Attack"
+                    # Only add the player if their name isn't already in use
+                    if name not in self.all_players:
 
-                msg = f"{user.name} gave {target_name} {effect}(x{multiplier})"
-            
-            target.add_status_effect(effect, multiplier = multiplier, remaining_turns = duration)
-            
+                        # Forces the user to enter either a class name or its corresponding number
+                        while True:
+                            for i, class_name in zip(range(len(all_classes)), all_classes):
+
+                                self.show(f"{i + 1}: {class_name}")
 
-        # Apply speed modifiers
-        elif effect == "+Speed" or effect == "-Speed":
+                            atk_class = self.ask(f"Which class is {name}? ")
 
-            reverse_speed = lambda effect: "-Speed" if effect == "+Speed" else "+Speed" if effect == "-Speed" else effect
+                            # If they entered a class name, add the person as that class
+                            if atk_class in all_classes:
+                                atk_class = all_classes[atk_class]
+                                self.all_players[name] = Player(name, atk_class, self.scheduler)
+                                break 
 
-            speed_change = effect_props["value"]
-            duration = effect_props["duration"]
+                            # If they didn't enter a class name, check if they entered a number
+                            # If so, add them as the corresponding class 
+                            elif atk_class.isnumeric():
+                                atk_class = int(atk_class)
+                                if atk_class in range(1, len(all_classes) + 1):
+                                    atk_class = list(all_classes.values())[atk_class - 1]
 
-            if crit == True:
-                speed_change *= move.crit_info["crit_effect"]
+                                    self.show(self.add_new_player(name, atk_class))
+                                    break
 
-                speed_change = int(round(speed_change, 0))
+                                else: 
+                                    self.error_message("INVALID CLASS", f"You must enter either a class name or a number from 1 to {len(all_classes)}")
 
-                # If speed_change is negative, change the effect to "-Speed" and...
-                #...use the positive version of speed_change
-                if speed_change < 0:
-                    effect = reverse_speed(effect)
-                    speed_change = -speed_change
+                            else:
+                                self.error_message("IVALID CLASS", f"You must enter one of the following: {'/ '.join(all_classes)}")
 
-                msg = f"*** {user.name} gave {target_name} {effect}({speed_change}) ***"
-            
+                    else:
+                        self.error_message("INVALID PLAYER NAME", "You cannot enter the same name more than once")
             else:
-                if speed_change < 0:
-                    effect = reverse_speed(effect)
-                    speed_change = -speed_change
-                msg = f"{user.name} gave {target_name} {effect}({speed_change})"
+                if len(self.all_players) >= 2:
+                    break
 
-            target.add_status_effect(effect, value = speed_change, remaining_turns = duration)
+                else:
+                    self.error_message("INVALID PLAYER COUNT", "You must enter 2 or more players")
 
-        # Apply defense modifiers
-        elif effect == "Protection" or effect == "Weakness":
+    # Plays rounds until there is one player left, and returns the winner
+    def play(self):
+        profiler = self.profiler
 
-            if effect == "Protection":
-                percentage = effect_props["value"]
+        # Stores all players which are still alive
+        self.active_players = Roster(self.all_players.values())
+        self.round_count = 0
 
-            elif effect == "Weakness":
-                percentage = effect_props["value"] + 100
-            
-            multiplier = (percentage / 100)
+        # Computer players search ahead for their best move
+        if len(self.computer_players) > 0 and self.computer_policy is None:
+            from Battle_game_ai import Search_Policy
+            self.computer_policy = Search_Policy(time_limit_ms = 500)
 
-            duration = effect_props["duration"]
+        # Keeps making new rounds until there is one player left
+        while True:
 
-            if crit == True:
-                multiplier *= move.crit_info["crit_effect"]
-                multiplier = int(round(speed_change, 0))
+            # If there is only 1 player left, they win
+            if len(self.active_players) == 1:
+                    winner = self.active_players.turn_order()[0]
 
-                msg = f"*** {target.name} will now take {multiplier}x damage! ***"
+                    self.show("\n=======================================")
+                    self.show(f"{winner.name} wins!\n")
+                    return winner
 
-            else:
-                msg = f"{target.name} will now take {multiplier}x damage!"
-            
-            target.add_status_effect(effect, multiplier = multiplier, remaining_turns = duration)
+            # Increments the round counter and starts a new round
+            if profiler is not None:
+                profiler.enter("round start")
+                profiler.count("rounds")
 
-        elif effect == "Burning":
-            burn_dmg = effect_props["value"]
-            duration = effect_props["duration"]
+            self.round_count += 1
+            self.events.emit(RoundStart(self.round_count))
+            self.render()
 
-            if crit == True:
-                burn_dmg *= move.crit_info["crit_effect"]
-            
-                msg = f"*** {user.name} inflicted {target_name} with Burning ({burn_dmg}) ***"
-            
-            else:
-                msg = f"{user.name} inflicted {target_name} with Burning ({burn_dmg})"
+            if profiler is not None:
+                profiler.exit()
 
-            target.add_status_effect(effect, value = burn_dmg, remaining_turns = duration)
+            # Gives each active player a turn each round
+            for player in self.active_players.turn_order():
 
+                # Skip players knocked out earlier in the round, and stop once there is a winner
+                if not self.active_players.is_active(player) or len(self.active_players) == 1:
+                    continue
 
-        if len(msg) > 0:
-            print(msg)
-            time.sleep(1 / game_speed)
-    
+                if profiler is not None:
+                    profiler.enter("new turn")
+                    profiler.count("turns")
 
-# Calculates whether a move crits, hits, or misses, and executes it...
-#...on each target
-def attempt_move(move, user, targets):
-    for target in targets:
+                player.new_turn(self.events)
 
-        # Find whether the move lands and if it is a critical hit
-        hit, crit = hit_or_miss(move, user, target)
+                # Players can be knocked out by burning at the start of their turn
+                if player.health < 1:
+                    self.remove_player(player)
 
-        if hit == True:
-        
-            execute_move(move, user, target, crit)
-    
-        else:
+                if profiler is not None:
+                    profiler.exit()
+
+                self.render()
+
+                if not self.active_players.is_active(player):
+                    continue
+
+                # Print the player's summary, and everyone else's if there aren't too many to read
+                if profiler is not None:
+                    profiler.enter("summaries")
+
+                self.show_summaries(player)
+
+                if profiler is not None:
+                    profiler.exit()
+
+                # If a staggered move is ready to use, force the player to use it
+                if len(player.ready_moves) > 0:
+                    if profiler is not None:
+                        profiler.enter("staggered moves")
+
+                    for stag_move in player.ready_moves:
+                        self.attempt_move(stag_move.move, player, stag_move.targets)
+
+                    if profiler is not None:
+                        profiler.exit()
+
+                # Prints a status update for each move still charging
+                for stag_move in player.staggered_moves:
+                    self.show(f'{str(player)} is charging a {stag_move.move.name}')
+                    self.pause(1)
+
+                # Blocks using other moves if necessary
+                block_use_move = player.block_use_move
+
+                # Allow the player to choose a move to use...
+                #... if they aren't blocked from doing so
+                if block_use_move != True:
+
+                    if profiler is not None:
+                        profiler.enter("move selection")
+
+                    if player.name in self.computer_players:
+                        move, computer_targets = self.computer_policy.choose_in_roster(player, self.active_players, self.round_count)
+                        self.show(f"{str(player)} chose {move.name}")
 
-            # Executes only if the move misses
-            print(f"{user.name} missed {target.name} with {move.name}")
-            time.sleep(1 / game_speed)
+                    else:
+                        move = self.select_move(player)
 
-        # 'Kill' the player if their health is below 1
-        if target.health < 1:
-            remove_player(target)
+                    self.show()
 
-            print(f"{target.name} is down!")
-            time.sleep(1 / game_speed)
+                    # Determine who will be targeted with the move
+                    if move.targets == "Self":
 
-# Remove a player from the game
-def remove_player(player):
-    global active_players
+                        targets = [player]
 
-    active_players.remove(player.name)
+                    elif move.targets == "All":
+                        targets = self.active_players.turn_order()
 
+                    elif move.targets == "All others":
+                        targets = [target for target in self.active_players.turn_order() if target is not player]
+
+                    # If needed, allow the user to select all required targets
+                    elif isinstance(move.targets, int) and player.name in self.computer_players:
+                        targets = computer_targets
+
+                    elif isinstance(move.targets, int): 
+                        possible_targets = [target for target in self.active_players.turn_order() if target is not player]
+
+                        targets = self.select_target(move.targets, possible_targets, (move, player))
+                        self.show()
+
+                    if profiler is not None:
+                        profiler.exit()
+
+                    if move.stagger == None:
+
+                        self.attempt_move(move, player, targets)
+
+                    else:
+                        player.add_staggered_move(move, player, targets, move.stagger)
 
 # All moves
 # Name, type, effect {effect: {property: value}}, accuracy %, crit_info {chance, effect}, targets, description
@@ -855,189 +1718,27 @@ all_classes["Monk"] = Attack_Class("Monk", [ATK_flying_kick, ATK_pressure_points
 #all_classes["Test"] = Attack_Class("Test", [ATK_sword_slash, ATK_lightning_bolt, EFX_literally_nothing], 50, 100)
 
 # Prevents the main program from running if it is not being run directly
+# Usage: python Battle_game_classes.py [--profile FILE]
+# Plays an interactive game in the terminal
+# --profile times each phase of the game, prints a summary at the end and saves a Chrome trace to FILE
 if __name__ == "__main__":
-    # Makes a Player class character for each name entered
-    input("Enter each player's name below. \nOnce each name is entered, leave the input blank and press Enter. \nTo use default players, type \'default<number of players>\'. \nPress Enter to continue ")
-
-    while True:
-        name = input("Enter a name: ")
-
-        # Checks that the user entered a name
-        # If the player name is not already present, ask for their class...
-        #... and add them to the all_players dictionary
-
-        if name != "":
-            
-            # If the first part of a name input is the default trigger, use default players
-            default_trigger = "default"
-            def_trig_length = len(default_trigger)
-            use_default = name[0:def_trig_length] == default_trigger
-
-            if use_default:
-                try:
-                    # Get number of defaults from end of user's input
-                    num_defaults = int(name[def_trig_length:])
-
-                except:
-                    pass
-                    
-                else:
+    import sys
 
-                    try:
-                        # Define player generator and create a number of default players...
-                        #... equal to the number entered after the default trigger phrase
-                        default_player_generator = default_players()
-                        
-                        for i in range(num_defaults):
-                            while True:
-                                name, atk_class = next(default_player_generator)
-
-                                atk_class = all_classes[atk_class]
+    profiler = None
+    if "--profile" in sys.argv:
+        from Battle_game_profile import Profiler
+        profiler = Profiler(trace = True)
 
-                                # Only add the name if it doesn't already exist
-                                if name not in all_players:
-                                    print(add_new_player(name, atk_class))
-                                    time.sleep(0.25 / game_speed)
-                                    break
+    game = Game(profiler = profiler)
+    game.enter_players()
+    game.play()
 
-                    # Print an error if the generator has reached the end of its name list
-                    except StopIteration:
-                        error_message("NO MORE DEFAULTS", "No more default players can be added")
-
-                use_default = False
-
-            else:
-                # Only add the player if their name isn't already in use
-                if name not in all_players:
-                    
-                    # Forces the user to enter either a class name or its corresponding number
-                    while True:
-                        for i, class_name in zip(range(len(all_classes)), all_classes):
-
-                            print(f"{i + 1}: {class_name}")
-
-                        atk_class = input(f"Which class is {name}? ")
-
-                        # If they entered a class name, add the person as that class
-                        if atk_class in all_classes:
-                            atk_class = all_classes[atk_class]
-                            all_players[name] = Player(name, atk_class)
-                            break 
-                        
-                        # If they didn't enter a class name, check if they entered a number
-                        # If so, add them as the corresponding class 
-                        elif atk_class.isnumeric():
-                            atk_class = int(atk_class)
-                            if atk_class in range(1, len(all_classes) + 1):
-                                atk_class = list(all_classes.values())[atk_class - 1]
-                                
-                                print(add_new_player(name, atk_class))
-                                break
-
-                            else: 
-                                error_message("INVALID CLASS", f"You must enter either a class name or a number from 1 to {len(all_classes)}")
-
-                        else:
-                            error_message("IVALID CLASS", f"You must enter one of the following: {'/ '.join(all_classes)}")
-            
-                else:
-                    error_message("INVALID PLAYER NAME", "You cannot enter the same name more than once")
-        else:
-            if len(all_players) >= 2:
-                break
-            
-            else:
-                error_message("INVALID PLAYER COUNT", "You must enter 2 or more players")
+    if profiler is not None:
+        print(profiler.format_summary())
 
-    # Stores the names of all players which are still alive
-    active_players = list(all_players.keys())
-    round_count = 0
-
-    # Keeps making new rounds until there is one player left
-    while True:
-        
-        # If there is only 1 player left, they win
-        if len(active_players) == 1:
-                print("\n=======================================")
-                print(f"{active_players[0]} wins!\n")
-                exit()
-
-        # Increments the round counter and starts a new round
-        round_count += 1
-        print(f"\n========== Round {round_count} ==========")
-        time.sleep(0.5 / game_speed)
-
-        # Gives each active player a turn each round
-        for player in active_players:
-            player = all_players[player]
-
-            player.new_turn()
-
-            # Print the player's summary
-            print(f"\n------ {str(player)}'s turn ------")
-            for p in active_players:
-                print(all_players[p].format_self())
-                time.sleep(0.25 / game_speed)
-
-
-            print()
-            time.sleep(0.5 / game_speed)
-
-            # Prints a status update for each staggered move and blocks using other moves if necessary
-            block_use_move = False
-            for i, stag_move in zip(range(len(player.staggered_moves)), player.staggered_moves):
-            
-                turns = stag_move['remaining_turns']
-
-                stagger_complete = turns <= 0
-                
-                # If a move is ready to use, force the player to use it 
-                if stagger_complete == True:
-
-                    attempt_move(stag_move['move'], player, stag_move['targets'])
-
-                    del player.staggered_moves[i]
-                
-                else:
-                    print(f'{str(player)} is charging a {stag_move["move"].name}')
-                    time.sleep(1 / game_speed)
-
-                if stag_move['block_use_move'] == True:
-                    block_use_move = True
-
-            # Allow the player to choose a move to use...
-            #... if they aren't blocked from doing so
-            if block_use_move != True:
-
-                move = select_move(player)
-                print()
-
-                # Determine who will be targeted with the move
-                if move.targets == "Self":
-                    
-                    targets = [player]
-
-                elif move.targets == "All":
-                    targets = active_players.copy()
-                
-                elif move.targets == "All others":
-                    targets = active_players.copy()
-                    targets.remove(player.name)
-
-                # If needed, allow the user to select all required targets
-                elif isinstance(move.targets, int): 
-                    possible_targets = active_players.copy()
-                    possible_targets.remove(player.name)
-
-                    targets = select_target(move.targets, possible_targets, (move, player))
-                    print()
-
-                if move.stagger == None:
-
-                    attempt_move(move, player, targets)
-
-                else:
-                    player.add_staggered_move(move, player, targets, move.stagger)
+        profile_path = sys.argv[sys.argv.index("--profile") + 1]
+        profiler.save(profile_path)
+        print(f"Saved trace to {profile_path}")
 
     # TO DO ------------------------------------------------------
     # Modualarise project to include multiple files
@@ -0,0 +1,378 @@
+import os
+import sys
+import json
+import time
+
+import numpy as np
+
+from Battle_game_classes import all_classes, all_moves
+from Battle_game_events import Event_Buffer, RoundStart, MoveUsed, Hit, Miss, Crit, EffectApplied, BurnTick
+from Battle_game_headless import Match
+
+# Saves very large simulation runs as columns of fixed-width numbers, one file per column, which can be read...
+#...back with np.memmap and added up a piece at a time without loading everything into memory
+# A run is a folder with schema.json and a .bin file for each column of each table:
+#   matches:  one row per match
+#   players:  one row per player in each match
+#   attempts: one row per target of each move used, whether it hit or not
+# Classes and moves are stored as ids. schema.json lists their names, starting with all_classes and all_moves...
+#...and adding any others (e.g. from a ruleset) the first time they are seen
+# Rows are kept in memory until chunk_rows attempts have built up, then added to the end of each file...
+#...and schema.json is replaced with the new row counts, so a reader never sees half a chunk
+
+SCHEMA_VERSION = 1
+
+# (column, dtype) for each table
+TABLES = {
+    "matches": (("seed", "<u8"), ("players", "<u2"), ("rounds", "<u2"), ("turns", "<u4"),
+                ("winner_slot", "<i4"), ("winner_class", "<i2"), ("first_attempt", "<u8"), ("attempts", "<u4")),
+    "players": (("match", "<u4"), ("slot", "<u2"), ("class", "<i2"), ("survived", "u1"), ("health", "<f4")),
+    "attempts": (("match", "<u4"), ("round", "<u2"), ("user_slot", "<u2"), ("user_class", "<i2"), ("move", "<i2"),
+                 ("target_slot", "<u2"), ("target_class", "<i2"), ("hit", "u1"), ("crit", "u1"), ("damage", "<f4"), ("hp_after", "<f4"))
+}
+
+# Writes matches to a run folder, adding to it if it already exists
+# Only one Column_Sink should write to a folder at a time
+class Column_Sink:
+
+    def __init__(self, path, chunk_rows = 1 << 16):
+        self.path = path
+        self.chunk_rows = chunk_rows
+
+        os.makedirs(path, exist_ok = True)
+        schema_path = os.path.join(path, "schema.json")
+
+        if os.path.exists(schema_path):
+            with open(schema_path) as file:
+                schema = json.load(file)
+
+            if schema["version"] != SCHEMA_VERSION:
+                raise ValueError(f"{path} was written with a different version of the column format")
+
+            self.rows = schema["rows"]
+            self.class_names = schema["classes"]
+            self.move_names = schema["moves"]
+
+        else:
+            self.rows = {table: 0 for table in TABLES}
+            self.class_names = list(all_classes)
+            self.move_names = [move.name for move in all_moves]
+
+        self.class_ids = {name: i for i, name in enumerate(self.class_names)}
+        self.move_ids = {name: i for i, name in enumerate(self.move_names)}
+
+        self.files = {}
+        for table, columns in TABLES.items():
+            for column, dtype in columns:
+                column_path = os.path.join(path, f"{table}.{column}.bin")
+
+                # Anything past the last saved row count is from a chunk which was never finished, so it is cut off
+                with open(column_path, "ab") as file:
+                    file.truncate(self.rows[table] * np.dtype(dtype).itemsize)
+
+                self.files[(table, column)] = open(column_path, "ab")
+
+        self.clear_buffers()
+
+    def clear_buffers(self):
+        self.buffers = {table: {column: [] for column, dtype in columns} for table, columns in TABLES.items()}
+
+    def class_id(self, name):
+        if name not in self.class_ids:
+            self.class_ids[name] = len(self.class_names)
+            self.class_names.append(name)
+
+        return self.class_ids[name]
+
+    def move_id(self, name):
+        if name not in self.move_ids:
+            self.move_ids[name] = len(self.move_names)
+            self.move_names.append(name)
+
+        return self.move_ids[name]
+
+    # Number of rows in a table, including any not written yet
+    def row_count(self, table):
+        return self.rows[table] + len(self.buffers[table][TABLES[table][0][0]])
+
+    # Adds a finished match, going through its events to build the attempts
+    # start_health is {name: health} from before the match started, so health can be followed through the events
+    def add(self, match, result, events, start_health):
+        ids = match.roster.ids
+        match_index = self.row_count("matches")
+        first_attempt = self.row_count("attempts")
+
+        players = self.buffers["players"]
+        classes = {}
+        health = {}
+        survivors = set(result.survivors)
+
+        for name, player in match.players.items():
+            slot = ids[name]
+            classes[slot] = self.class_id(player.atk_class_name)
+            health[slot] = start_health[name]
+
+            players["match"].append(match_index)
+            players["slot"].append(slot)
+            players["class"].append(classes[slot])
+            players["survived"].append(name in survivors)
+            players["health"].append(player.health)
+
+        attempts = self.buffers["attempts"]
+        round_number = 0
+        user = move = None
+
+        # Rows of the move being used, as {target slot: row index in the buffer}
+        move_rows = {}
+
+        for event in events:
+            kind = type(event)
+
+            if kind is RoundStart:
+                round_number = event.round
+
+            elif kind is MoveUsed:
+                user = ids[event.user.name]
+                move = self.move_id(event.move.name)
+                move_rows = {}
+
+            elif kind is BurnTick:
+                health[ids[event.player.name]] -= event.damage
+
+            elif kind is Miss or kind is Crit or kind is Hit or kind is EffectApplied:
+                target = ids[event.target.name]
+                row = move_rows.get(target)
+
+                if row is None:
+                    row = move_rows[target] = len(attempts["match"])
+
+                    for column, value in (("match", match_index), ("round", round_number), ("user_slot", user),
+                                          ("user_class", classes[user]), ("move", move), ("target_slot", target),
+                                          ("target_class", classes[target]), ("hit", kind is not Miss), ("crit", False),
+                                          ("damage", 0), ("hp_after", health[target])):
+                        attempts[column].append(value)
+
+                if kind is Crit:
+                    attempts["crit"][row] = True
+
+                elif kind is Hit:
+                    health[target] -= event.damage
+                    attempts["damage"][row] += event.damage
+                    attempts["hp_after"][row] = health[target]
+
+                elif kind is EffectApplied and event.effect == "Heal":
+                    health[target] += event.power
+                    attempts["hp_after"][row] = health[target]
+
+        winner_slot = -1
+        winner_class = -1
+        if result.winner is not None:
+            winner_slot = ids[result.winner]
+            winner_class = classes[winner_slot]
+
+        matches = self.buffers["matches"]
+        for column, value in (("seed", result.seed), ("players", len(match.players)), ("rounds", result.rounds), ("turns", result.turns),
+                              ("winner_slot", winner_slot), ("winner_class", winner_class), ("first_attempt", first_attempt),
+                              ("attempts", self.row_count("attempts") - first_attempt)):
+            matches[column].append(value)
+
+        if len(attempts["match"]) >= self.chunk_rows:
+            self.flush()
+
+    # Plays a headless match and adds it
+    def play(self, roster, policies = None, seed = None, teams = None, max_rounds = 200, initiative = None):
+        events = Event_Buffer()
+        match = Match(roster, policies, seed, teams, max_rounds, initiative, events)
+        start_health = {name: player.health for name, player in match.players.items()}
+
+        result = match.play()
+        self.add(match, result, events.drain(), start_health)
+
+        return result
+
+    # Adds everything waiting to the end of the column files, then saves the new row counts
+    def flush(self):
+        for table, columns in TABLES.items():
+            added = len(self.buffers[table][columns[0][0]])
+
+            for column, dtype in columns:
+                file = self.files[(table, column)]
+                file.write(np.asarray(self.buffers[table][column], dtype = dtype).tobytes())
+                file.flush()
+
+            self.rows[table] += added
+
+        self.clear_buffers()
+        self.save_schema()
+
+    def save_schema(self):
+        schema = {
+            "version": SCHEMA_VERSION,
+            "rows": self.rows,
+            "columns": {table: dict(columns) for table, columns in TABLES.items()},
+            "classes": self.class_names,
+            "moves": self.move_names
+        }
+
+        # Replaced in one go, so readers always see a whole schema
+        schema_path = os.path.join(self.path, "schema.json")
+        with open(schema_path + ".tmp", "w") as file:
+            json.dump(schema, file, indent = 1)
+
+        os.replace(schema_path + ".tmp", schema_path)
+
+    def close(self):
+        self.flush()
+
+        for file in self.files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+# Reads a run folder, giving each column as a read-only np.memmap
+class Column_Store:
+
+    def __init__(self, path):
+        with open(os.path.join(path, "schema.json")) as file:
+            schema = json.load(file)
+
+        if schema["version"] != SCHEMA_VERSION:
+            raise ValueError(f"{path} was written with a different version of the column format")
+
+        self.path = path
+        self.rows = schema["rows"]
+        self.class_names = schema["classes"]
+        self.move_names = schema["moves"]
+        self.columns = schema["columns"]
+
+    # Returns a column as an array, which is only read from disk as it is used
+    def column(self, table, column):
+        dtype = np.dtype(self.columns[table][column])
+        rows = self.rows[table]
+
+        # np.memmap can't map an empty file
+        if rows == 0:
+            return np.zeros(0, dtype = dtype)
+
+        return np.memmap(os.path.join(self.path, f"{table}.{column}.bin"), dtype = dtype, mode = "r", shape = (rows,))
+
+    # Returns the attempts of the match with the given index, as {column: array}
+    def match_attempts(self, match_index):
+        start = int(self.column("matches", "first_attempt")[match_index])
+        count = int(self.column("matches", "attempts")[match_index])
+
+        return {column: self.column("attempts", column)[start:start + count] for column in self.columns["attempts"]}
+
+# Adds up values for each id like np.bincount, a chunk at a time, so only one chunk of the columns is in memory at once
+# weights can be None to count rows instead
+def chunked_bincount(ids, weights = None, minlength = 0, chunk_rows = 1 << 20):
+    totals = np.zeros(minlength)
+
+    for start in range(0, len(ids), chunk_rows):
+        chunk_weights = None if weights is None else np.asarray(weights[start:start + chunk_rows], dtype = float)
+        counts = np.bincount(ids[start:start + chunk_rows], chunk_weights, minlength)
+
+        if len(counts) > len(totals):
+            totals = np.concatenate((totals, np.zeros(len(counts) - len(totals))))
+
+        totals[:len(counts)] += counts
+
+    return totals
+
+# Returns (class name, players, wins, win rate) for each class which played, where wins only count matches with a single winner
+def class_win_rates(store):
+    num_classes = len(store.class_names)
+    players = chunked_bincount(store.column("players", "class"), minlength = num_classes)
+
+    winner_class = store.column("matches", "winner_class")
+    wins = np.zeros(num_classes)
+
+    # Draws and team wins have no winner_class, so -1 is moved out of the way before counting
+    for start in range(0, len(winner_class), 1 << 20):
+        chunk = np.asarray(winner_class[start:start + (1 << 20)], dtype = np.int64)
+        wins += np.bincount(chunk[chunk >= 0], minlength = num_classes)[:num_classes]
+
+    return [(name, int(players[i]), int(wins[i]), wins[i] / players[i]) for i, name in enumerate(store.class_names) if players[i] > 0]
+
+# Returns (move name, targets, hits, crits, damage) for each move which was used, where targets counts every attempt
+def move_totals(store):
+    move = store.column("attempts", "move")
+    num_moves = len(store.move_names)
+
+    targets = chunked_bincount(move, minlength = num_moves)
+    hits = chunked_bincount(move, store.column("attempts", "hit"), num_moves)
+    crits = chunked_bincount(move, store.column("attempts", "crit"), num_moves)
+    damage = chunked_bincount(move, store.column("attempts", "damage"), num_moves)
+
+    return [(name, int(targets[i]), int(hits[i]), int(crits[i]), damage[i]) for i, name in enumerate(store.move_names) if targets[i] > 0]
+
+# Returns how many matches lasted each number of rounds, as an array indexed by rounds
+def match_lengths(store):
+    return chunked_bincount(store.column("matches", "rounds")).astype(np.int64)
+
+# Usage:
+#   python Battle_game_columns.py write <folder> <class> <class> [<class> ...] [--matches N] [--seed S] [--players N]
+#   python Battle_game_columns.py summary <folder>
+# write plays N matches and adds them to the folder. --players N makes a roster of N players by cycling through the classes
+# summary adds up the whole folder a chunk at a time and prints win rates, move totals and match lengths
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default, convert):
+        if name not in args:
+            return default
+
+        i = args.index(name)
+        value = convert(args[i + 1])
+        del args[i:i + 2]
+        return value
+
+    if len(args) < 2 or args[0] not in ("write", "summary"):
+        print("Use: write <folder> <class> <class> ... or summary <folder>")
+        sys.exit(2)
+
+    command, path = args[0], args[1]
+
+    if command == "write":
+        num_matches = option("--matches", 10000, int)
+        seed = option("--seed", 0, int)
+        num_players = option("--players", None, int)
+
+        class_names = args[2:] or ["Warrior", "Mage"]
+        if num_players is None:
+            num_players = len(class_names)
+
+        roster = [(f"{class_names[i % len(class_names)]} {i + 1}", class_names[i % len(class_names)]) for i in range(num_players)]
+
+        start = time.perf_counter()
+        with Column_Sink(path) as sink:
+            for i in range(num_matches):
+                sink.play(roster, seed = seed + i)
+
+        elapsed = time.perf_counter() - start
+        print(f"Added {num_matches} matches in {elapsed:.2f}s ({num_matches / elapsed:.0f} per second)")
+
+    else:
+        store = Column_Store(path)
+        start = time.perf_counter()
+
+        print(f"{store.rows['matches']} matches, {store.rows['players']} players, {store.rows['attempts']} attempts\n")
+
+        print(f"{'Class':12} {'Players':>10} {'Wins':>10} {'Win rate':>9}")
+        for name, players, wins, win_rate in class_win_rates(store):
+            print(f"{name:12} {players:10} {wins:10} {100 * win_rate:8.1f}%")
+
+        print(f"\n{'Move':18} {'Targets':>10} {'Hit rate':>9} {'Crits/hit':>10} {'Damage/target':>14}")
+        for name, targets, hits, crits, damage in move_totals(store):
+            print(f"{name:18} {targets:10} {hits / targets:9.2f} {crits / max(hits, 1):10.2f} {damage / targets:14.2f}")
+
+        lengths = match_lengths(store)
+        rounds = np.arange(len(lengths))
+        if lengths.sum() > 0:
+            print(f"\nRounds: mean {(rounds * lengths).sum() / lengths.sum():.2f}, longest {rounds[lengths > 0].max()}")
+
+        print(f"\nAdded up in {time.perf_counter() - start:.2f}s")
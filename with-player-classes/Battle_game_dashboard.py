@@ -0,0 +1,224 @@
+import re
+import sys
+import time
+import curses
+from collections import deque
+
+from Battle_game_classes import Game
+from Battle_game_events import Terminal_Renderer
+
+# A full-screen version of the interactive game
+# The top of the screen is a table with a row for every player, the middle is a log of everything that happens...
+#...which scrolls, and the bottom line is where answers are typed
+# Each row remembers what it was drawn from, and is only formatted and redrawn when that changes. curses then...
+#...only sends the characters that changed, and scrolls the log by whole lines, so each turn sends about...
+#...the same amount to the terminal however long the game has gone on
+
+# Matches the escape codes name_fmt puts around names, which curses would show as text
+escape_codes = re.compile("\033\\[[0-9;]*m")
+
+def strip_codes(text):
+    return escape_codes.sub("", text)
+
+# Writes events to the dashboard's log instead of printing them, without pausing after each one
+class Log_Renderer(Terminal_Renderer):
+
+    def __init__(self, game):
+        super().__init__()
+        self.game = game
+
+    def render(self, events):
+        for event in events:
+            text, pause = self.format_event(event)
+
+            if text is not None:
+                self.game.log(text)
+
+        curses.doupdate()
+
+# The interactive game, shown on a curses screen
+# turn_delay is how long to wait at the start of each turn, in seconds at game speed 1, so computer turns can be followed
+class Dashboard_Game(Game):
+
+    def __init__(self, screen, game_speed = 1, seed = None, clock = time, profiler = None, turn_delay = 0.5):
+        super().__init__(game_speed, seed, clock, profiler = profiler)
+
+        self.screen = screen
+        self.renderer = Log_Renderer(self)
+        self.turn_delay = turn_delay
+
+        # What each table row was drawn from, as {row: key}, so unchanged rows can be skipped
+        self.row_keys = {}
+
+        # The first player shown in the table, when there are too many players to show at once
+        self.first_row = 0
+
+        # The most recent log lines, to fill the log again if the screen is laid out again
+        self.log_lines = deque(maxlen = 500)
+
+        curses.curs_set(0)
+        self.layout(0)
+
+    # Splits the screen into the table, log and prompt
+    # The table gets a header and a row for each player, up to half the screen
+    def layout(self, table_rows):
+        height, width = self.screen.getmaxyx()
+        self.width = width
+
+        table_height = 0
+        if table_rows > 0:
+            table_height = min(table_rows + 1, height // 2)
+
+        self.table = None
+        if table_height > 0:
+            self.table = curses.newwin(table_height, width, 0, 0)
+            self.table.addnstr(0, 0, f"{'Player':16} {'Class':8} {'HP':>5} {'Speed':>6}  Status effects / Staggered moves", width - 1, curses.A_BOLD)
+            self.table.noutrefresh()
+
+        self.table_height = table_height
+        self.row_keys = {}
+
+        self.log_height = height - table_height - 1
+        self.log_window = curses.newwin(self.log_height, width, table_height, 0)
+        self.log_window.scrollok(True)
+        self.log_window.idlok(True)
+
+        for i, line in enumerate(list(self.log_lines)[-self.log_height:]):
+            self.log_window.addnstr(self.log_height - min(len(self.log_lines), self.log_height) + i, 0, line, width - 1)
+
+        self.log_window.noutrefresh()
+
+        self.prompt = curses.newwin(1, width, height - 1, 0)
+        self.prompt.noutrefresh()
+
+        curses.doupdate()
+
+    # Adds text to the bottom of the log, scrolling everything else up
+    def log(self, text):
+        for line in strip_codes(text).split("\n"):
+            self.log_lines.append(line)
+            self.log_window.scroll(1)
+            self.log_window.addnstr(self.log_height - 1, 0, line, self.width - 1)
+
+        self.log_window.noutrefresh()
+
+    # The dashboard doesn't pause between messages, as the table doesn't scroll away
+    def pause(self, seconds):
+        pass
+
+    def show(self, *text):
+        self.log(" ".join(str(item) for item in text))
+        curses.doupdate()
+
+    # The question goes in the log and the answer is typed on the bottom line
+    def ask(self, prompt):
+        self.log(prompt)
+
+        self.prompt.erase()
+        self.prompt.addstr(0, 0, "> ")
+        self.prompt.noutrefresh()
+        curses.doupdate()
+
+        curses.echo()
+        curses.curs_set(1)
+        answer = self.prompt.getstr(0, 2, max(self.width - 3, 1)).decode(errors = "replace")
+        curses.curs_set(0)
+        curses.noecho()
+
+        self.prompt.erase()
+        self.prompt.noutrefresh()
+        self.log("> " + answer)
+        curses.doupdate()
+
+        return answer
+
+    # Returns what a player's row is drawn from. The row only needs redrawing when this changes
+    def row_key(self, player, current):
+        if not self.active_players.is_active(player):
+            return (False, player.health)
+
+        return (True, player is current, player.health, player.get_true_speed(), player.turn_number, tuple(player.status_fx), tuple(player.staggered_moves))
+
+    def format_row(self, player):
+        if not self.active_players.is_active(player):
+            return f"{player.name[:16]:16} {player.atk_class_name[:8]:8} {'--':>5} {'--':>6}  Knocked out"
+
+        return f"{player.name[:16]:16} {player.atk_class_name[:8]:8} {player.health:>5} {player.get_true_speed():>6}  {player.format_stat_fx()} / {player.format_staggered_moves()}"
+
+    # Redraws the rows which have changed since they were last drawn, highlighting the current player
+    # If there are more players than rows, the table shows the page with the current player on it
+    def update_table(self, current):
+        if self.table is None:
+            return
+
+        players = list(self.all_players.values())
+        visible = self.table_height - 1
+
+        if current is not None:
+            first_row = players.index(current) // visible * visible
+
+            if first_row != self.first_row:
+                self.first_row = first_row
+                self.row_keys = {}
+
+        for row in range(visible):
+            i = self.first_row + row
+
+            if i >= len(players):
+                key = None
+
+            else:
+                key = self.row_key(players[i], current)
+
+            if self.row_keys.get(row, ()) == key:
+                continue
+
+            self.row_keys[row] = key
+            self.table.move(row + 1, 0)
+            self.table.clrtoeol()
+
+            if key is not None:
+                self.table.addnstr(row + 1, 0, self.format_row(players[i]), self.width - 1, curses.A_REVERSE if players[i] is current else curses.A_NORMAL)
+
+        self.table.noutrefresh()
+        curses.doupdate()
+
+    # The table always shows everyone, so the summaries only need the table updating
+    def show_summaries(self, player):
+        self.update_table(player)
+        self.log(f"\n------ {player.name}'s turn ------")
+        curses.doupdate()
+
+        self.clock.sleep(self.turn_delay / self.game_speed)
+
+    def play(self):
+        self.layout(len(self.all_players))
+        winner = super().play()
+
+        self.update_table(None)
+        self.ask("Press Enter to leave")
+
+        return winner
+
+def run_dashboard(screen, game_speed, seed):
+    game = Dashboard_Game(screen, game_speed, seed)
+    game.enter_players()
+    return game.play()
+
+# Usage: python Battle_game_dashboard.py [--speed N] [--seed S]
+# Plays an interactive game full-screen in the terminal
+# --speed makes the game faster, e.g. --speed 4 waits a quarter as long at the start of each turn
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    game_speed = 1
+    seed = None
+
+    if "--speed" in args:
+        game_speed = float(args[args.index("--speed") + 1])
+
+    if "--seed" in args:
+        seed = int(args[args.index("--seed") + 1])
+
+    winner = curses.wrapper(run_dashboard, game_speed, seed)
+    print(f"{winner.name} wins!")
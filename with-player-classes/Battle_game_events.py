@@ -0,0 +1,138 @@
+import time
+from collections import namedtuple
+
+# Events describe what happened in a match, so the rules don't have to print anything themselves
+# The rules add events to an Event_Buffer, and a renderer decides what to do with them afterwards
+# Events hold the players and moves involved rather than text, so nothing is formatted unless it is shown
+
+# A new round has started
+RoundStart = namedtuple("RoundStart", ["round"])
+
+# A player has used a move on the given targets, before finding out if it hits
+MoveUsed = namedtuple("MoveUsed", ["user", "move", "targets"])
+
+# A damaging move hit its target
+Hit = namedtuple("Hit", ["user", "target", "move", "damage", "crit"])
+
+# A move missed its target
+Miss = namedtuple("Miss", ["user", "target", "move"])
+
+# A move landed a critical hit. The effects it causes come straight after
+Crit = namedtuple("Crit", ["user", "target", "move"])
+
+# A move gave its target a status effect or healed them
+# effect is the name of the effect, e.g. "Burning" or "Heal", and power is its value or multiplier
+# effect is None for a move which doesn't do anything
+EffectApplied = namedtuple("EffectApplied", ["user", "target", "move", "effect", "power", "crit"])
+
+# A player took damage from burning at the start of their turn
+BurnTick = namedtuple("BurnTick", ["player", "damage"])
+
+# A player was knocked out
+PlayerDown = namedtuple("PlayerDown", ["player"])
+
+# Collects events until a renderer is ready for them
+class Event_Buffer:
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+    # Returns all events since the last drain and empties the buffer
+    def drain(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def __len__(self):
+        return len(self.events)
+
+# Shows events in the terminal the same way the interactive game always has, with pauses between them
+# clock is anything with a sleep(seconds) method, e.g. the time module
+class Terminal_Renderer:
+
+    def __init__(self, game_speed = 1, clock = time):
+        self.game_speed = game_speed
+        self.clock = clock
+
+    def render(self, events):
+        for event in events:
+            text, pause = self.format_event(event)
+
+            if text is not None:
+                print(text)
+                self.clock.sleep(pause / self.game_speed)
+
+    # Returns the text to print for an event and how long to pause afterwards, or (None, 0) if it isn't shown
+    def format_event(self, event):
+        kind = type(event)
+
+        if kind is RoundStart:
+            return f"\n========== Round {event.round} ==========", 0.5
+
+        elif kind is Hit:
+            target_name = self.target_name(event.user, event.target)
+
+            if event.crit:
+                return f"*** {event.user.name} landed a critical hit on {target_name} with {event.move.name}, causing {event.damage} damage! ***", 1
+
+            return f"{event.user.name} hit {target_name} with {event.move.name}, causing {event.damage} damage!", 1
+
+        elif kind is Miss:
+            return f"{event.user.name} missed {event.target.name} with {event.move.name}", 1
+
+        elif kind is EffectApplied:
+            return self.format_effect(event), 1
+
+        elif kind is BurnTick:
+            return f"{event.player.name} was burned for {event.damage} damage", 1
+
+        elif kind is PlayerDown:
+            return f"{event.player.name} is down!", 1
+
+        return None, 0
+
+    def format_effect(self, event):
+        user_name = event.user.name
+        target_name = self.target_name(event.user, event.target)
+        effect = event.effect
+
+        if effect is None:
+            return 'He\'s just standing there... MENACINGLY'
+
+        elif effect == "Heal":
+            if event.crit:
+                return f"*** {user_name} healed themself for {event.power} HP! ***"
+
+            return f"{user_name} healed themself for {event.power} HP"
+
+        elif effect == "+Attack" or effect == "-Attack":
+            msg = f"{user_name} gave {target_name} {effect}(x{event.power})"
+
+        elif effect == "+Speed" or effect == "-Speed":
+            msg = f"{user_name} gave {target_name} {effect}({event.power})"
+
+        elif effect == "Protection" or effect == "Weakness":
+            msg = f"{event.target.name} will now take {event.power}x damage!"
+
+        else:
+            msg = f"{user_name} inflicted {target_name} with {effect} ({event.power})"
+
+        if event.crit:
+            msg = f"*** {msg} ***"
+
+        return msg
+
+    def target_name(self, user, target):
+        if user.name == target.name:
+            return "themself"
+
+        return target.name
+
+# Throws events away, for when nobody is watching
+class Null_Renderer:
+
+    def render(self, events):
+        pass
@@ -0,0 +1,612 @@
+import sys
+import math
+import time
+import random
+import hashlib
+from collections import namedtuple
+
+from Battle_game_classes import Player, Roster, Turn_Scheduler, Initiative_Queue, all_classes, effect_multipliers, hit_or_miss, execute_move
+from Battle_game_events import RoundStart, MoveUsed, Miss, PlayerDown
+from Battle_game_rng import Roll_Stream, RULES_STREAM, POLICY_STREAM
+from Battle_game_memory import Array_Roster, Roster_Names
+
+# Headless matches use the same rules as the interactive game but never call input() or time.sleep()
+# Decisions are made by policy objects instead of the console
+
+# A request for a decision which the match is waiting on
+# kind is either "move" or "targets"
+# For "move", options is a tuple of the player's moves and count is 1
+# For "targets", options is a list of players who can be targeted and count is how many to choose
+Decision = namedtuple("Decision", ["kind", "player", "options", "count", "move"])
+
+# The outcome of a finished match
+# winner is the name of the last player standing (or None if the match was a draw or won by a team)
+# winning_team is None if the match was a draw
+Match_Result = namedtuple("Match_Result", ["winner", "winning_team", "rounds", "turns", "survivors", "seed"])
+
+# Chooses moves and targets at random
+class Random_Policy:
+
+    def choose_move(self, player, moves, match):
+        return moves[int(match.policy_rng.random() * len(moves))]
+
+    def choose_targets(self, player, move, possible_targets, count, match):
+        if count == 1:
+            return [possible_targets[int(match.policy_rng.random() * len(possible_targets))]]
+
+        return match.policy_rng.sample(possible_targets, count)
+
+# Always uses the first move in the player's move set and targets the weakest opponents
+class Greedy_Policy:
+
+    def choose_move(self, player, moves, match):
+        return moves[0]
+
+    def choose_targets(self, player, move, possible_targets, count, match):
+        return sorted(possible_targets, key = lambda target: target.health)[:count]
+
+# Runs a single match between the given players
+class Match:
+
+    # roster is a list of (name, atk_class) pairs, where atk_class is an Attack_Class or a class name
+    # policies is either one policy used by every player, or a dictionary of {name: policy}
+    # teams is an optional dictionary of {name: team}. By default, every player is on their own team
+    # initiative is None to take turns in roster order, or "round" or "timeline" to order turns by speed (see Initiative_Queue)
+    # events is an optional Event_Buffer to record what happens in the match. With None, no events are made at all
+    # profiler is an optional Profiler to time each phase of the match and count rolls, hits and crits
+    # array_roster keeps the players in an Array_Roster, which only makes Player objects for players who...
+    #...are in the middle of something, for matches with huge numbers of players. It can't be used with initiative
+    def __init__(self, roster, policies = None, seed = None, teams = None, max_rounds = 200, initiative = None, events = None, profiler = None, array_roster = False):
+
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+
+        self.seed = seed
+        self.rng = Roll_Stream(seed, RULES_STREAM)
+
+        # Policies get their own random numbers, so the rules get the same rolls whatever the policies do...
+        #...which lets a match be replayed from its decisions alone
+        self.policy_rng = Roll_Stream(seed, POLICY_STREAM)
+        self.max_rounds = max_rounds
+
+        self.initiative = initiative
+        self.initiative_queue = None
+
+        self.events = events
+        self.profiler = profiler
+
+        # Called with the match just before each round starts, e.g. to save snapshots for replays
+        self.round_listener = None
+
+        # Times status effects and staggered moves for every player in the match
+        self.scheduler = Turn_Scheduler()
+
+        self.array_roster = array_roster
+
+        if array_roster:
+            if initiative is not None:
+                raise ValueError("array_roster can't be used with initiative, as the initiative queue holds on to every player's Player object between turns")
+
+            self.roster = Array_Roster(roster, self.scheduler)
+            self.players = Roster_Names(self.roster, self.roster.player)
+            self.move_lists = Roster_Names(self.roster, self.roster.move_list)
+
+        else:
+            self.players = {}
+            self.roster = Roster()
+
+            # Each player's moves in the same order as their move set, shared with their class
+            self.move_lists = {}
+
+            for name, atk_class in roster:
+                if isinstance(atk_class, str):
+                    atk_class = all_classes[atk_class]
+
+                if name in self.players:
+                    raise ValueError(f"{name} is in the roster more than once")
+
+                self.players[name] = Player(name, atk_class, self.scheduler)
+                self.roster.add(self.players[name])
+                self.move_lists[name] = atk_class.move_list
+
+        if len(self.players) < 2:
+            raise ValueError("A match needs 2 or more players")
+
+        if teams is None and array_roster:
+            teams = Roster_Names(self.roster, self.roster.names.__getitem__)
+
+        elif teams is None:
+            teams = {name: name for name in self.players}
+
+        self.teams = teams
+
+        # When every player is on their own team, anyone else can be targeted...
+        #...so targets can be read straight from the roster instead of building a list
+        self.free_for_all = len(set(teams[name] for name in self.players)) == len(self.players)
+
+        if policies is None:
+            policies = Random_Policy()
+
+        if isinstance(policies, dict):
+            self.policies = policies
+
+        elif array_roster:
+            self.policies = Roster_Names(self.roster, lambda player_id: policies)
+
+        else:
+            self.policies = {name: policies for name in self.players}
+
+        # Number of active players on each team, so the end of the match can be checked without scanning the roster
+        self.team_sizes = {}
+        for name in self.players:
+            team = self.teams[name]
+            self.team_sizes[team] = self.team_sizes.get(team, 0) + 1
+
+        self.round_count = 0
+        self.turn_count = 0
+
+    # Returns the teams which still have at least one active player
+    def remaining_teams(self):
+        return set(self.team_sizes)
+
+    def is_over(self):
+        return len(self.team_sizes) <= 1
+
+    # Returns the players the given player is allowed to target with a move that picks its targets
+    def possible_targets(self, player):
+        if self.free_for_all:
+            return self.roster.others(player)
+
+        team = self.teams[player.name]
+
+        return [target for target in self.roster.turn_order() if self.teams[target.name] != team]
+
+    # Returns the names of the players still in the match, in turn order
+    def active_names(self):
+        if self.array_roster:
+            return [self.roster.names[player_id] for player_id in sorted(self.roster.active)]
+
+        return [player.name for player in self.roster.turn_order()]
+
+    # Remove a player from the match
+    def remove_player(self, player):
+        self.roster.remove(player)
+        self.scheduler.remove(player)
+
+        # Staggered moves which will now never land no longer hold on to their targets
+        if self.array_roster:
+            for stag_move in player.staggered_moves:
+                self.roster.unpin(stag_move.targets)
+
+        if self.initiative_queue is not None:
+            self.initiative_queue.discard(player)
+
+        if self.events is not None:
+            self.events.emit(PlayerDown(player))
+
+        team = self.teams[player.name]
+        self.team_sizes[team] -= 1
+
+        if self.team_sizes[team] == 0:
+            del self.team_sizes[team]
+
+    # Same as attempt_move in the interactive game, without any output
+    def attempt_move(self, move, user, targets):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter("attempt move")
+            profiler.count("moves")
+            rolls_before = self.rng.position()
+
+        if self.events is not None:
+            self.events.emit(MoveUsed(user, move, targets))
+
+        for target in targets:
+
+            # Players who were knocked out before a staggered move landed can't be hit again
+            if not self.roster.is_active(target):
+                continue
+
+            hit, crit = hit_or_miss(move, user, target, self.rng)
+
+            if profiler is not None:
+                profiler.record_hit(move, hit, crit)
+
+            if hit == True:
+                execute_move(move, user, target, crit, self.events)
+
+            elif self.events is not None:
+                self.events.emit(Miss(user, target, move))
+
+            if target.health < 1:
+                self.remove_player(target)
+
+        if profiler is not None:
+            profiler.count("rolls", self.rng.position() - rolls_before)
+            profiler.exit()
+
+    # Works out who a move will be used on, or returns the Decision to ask the player with if it needs to
+    # This isn't a generator, as most moves don't ask and making a generator for each move costs more than the rest
+    def find_targets(self, player, move):
+
+        if move.targets == "Self":
+            return [player]
+
+        elif move.targets == "All":
+            return list(self.roster.turn_order())
+
+        elif move.targets == "All others":
+            return [target for target in self.roster.turn_order() if target is not player]
+
+        possible_targets = self.possible_targets(player)
+        count = min(move.targets, len(possible_targets))
+
+        return Decision("targets", player, possible_targets, count, move)
+
+    # Starts the next round
+    # round_listener is called first with the match and the new round number, while the match is still between rounds
+    # In timeline mode a round can be skipped if nobody acts in it, so the new round isn't always round_count + 1
+    def start_round(self, round_number):
+        if self.profiler is not None:
+            self.profiler.enter("round start")
+            self.profiler.count("rounds")
+
+        if self.round_listener is not None:
+            self.round_listener(self, round_number)
+
+        self.round_count = round_number
+
+        if self.events is not None:
+            self.events.emit(RoundStart(self.round_count))
+
+        if self.profiler is not None:
+            self.profiler.exit()
+
+    # Returns the players in the order they take their turns, starting new rounds as needed
+    def turns(self):
+
+        if self.initiative is None:
+            while not self.is_over() and self.round_count < self.max_rounds:
+                self.start_round(self.round_count + 1)
+
+                for player in self.roster.turn_order():
+
+                    # Skip players knocked out earlier in the round
+                    if self.roster.is_active(player):
+                        yield player
+
+                    # Nothing holds on to players between turns, so idle ones can be folded back into the arrays
+                    if self.array_roster:
+                        self.roster.settle()
+
+        elif self.initiative == "round":
+            while not self.is_over() and self.round_count < self.max_rounds:
+                self.start_round(self.round_count + 1)
+
+                # Knocked out players are taken out of the queue by remove_player
+                self.initiative_queue = Initiative_Queue("round")
+                for player in self.roster.turn_order():
+                    self.initiative_queue.add(player, self.roster.ids[player.name])
+
+                while not self.is_over():
+                    entry = self.initiative_queue.pop()
+                    if entry is None:
+                        break
+
+                    yield entry[1]
+
+        else:
+            # The queue is only made here if the match hasn't been restored part way through
+            if self.initiative_queue is None:
+                self.initiative_queue = Initiative_Queue("timeline")
+                for player in self.roster.turn_order():
+                    self.initiative_queue.add(player, self.roster.ids[player.name], 0.0)
+
+            while not self.is_over():
+                time, player = self.initiative_queue.peek()
+
+                # Round n covers times from n - 1 up to n
+                turn_round = max(1, math.ceil(time))
+                if turn_round > self.max_rounds:
+                    break
+
+                if turn_round > self.round_count:
+                    self.start_round(turn_round)
+
+                self.initiative_queue.pop()
+                yield player
+
+                if self.roster.is_active(player):
+                    self.initiative_queue.add(player, self.roster.ids[player.name])
+
+    # Plays through the match, yielding a Decision whenever a player needs to choose something
+    # The answer to each decision must be sent back in with send()
+    # Returns the Match_Result once the match is over
+    def steps(self):
+        profiler = self.profiler
+
+        for player in self.turns():
+            self.turn_count += 1
+
+            if profiler is not None:
+                profiler.enter("new turn")
+                profiler.count("turns")
+
+            player.new_turn(self.events)
+
+            if profiler is not None:
+                profiler.exit()
+
+            # Players can be knocked out by burning at the start of their turn
+            if player.health < 1:
+
+                # Staggered moves which were about to land never will
+                if self.array_roster:
+                    for stag_move in player.ready_moves:
+                        self.roster.unpin(stag_move.targets)
+
+                self.remove_player(player)
+
+                if self.is_over():
+                    return self.result()
+
+                continue
+
+            # Use any staggered moves which are ready
+            if len(player.ready_moves) > 0:
+                if profiler is not None:
+                    profiler.enter("staggered moves")
+
+                for stag_move in player.ready_moves:
+                    self.attempt_move(stag_move.move, player, stag_move.targets)
+
+                    if self.array_roster:
+                        self.roster.unpin(stag_move.targets)
+
+                if profiler is not None:
+                    profiler.exit()
+
+            if self.is_over():
+                return self.result()
+
+            if player.block_use_move:
+                continue
+
+            move = yield Decision("move", player, self.move_lists[player.name], 1, None)
+
+            targets = self.find_targets(player, move)
+            if type(targets) is Decision:
+                targets = yield targets
+
+            if move.stagger == None:
+                self.attempt_move(move, player, targets)
+
+                if self.is_over():
+                    return self.result()
+
+            else:
+                player.add_staggered_move(move, player, targets, move.stagger)
+
+                if self.array_roster:
+                    self.roster.pin(targets)
+
+        return self.result()
+
+    # Asks the player's policy to make a decision
+    def decide(self, decision):
+        policy = self.policies[decision.player.name]
+
+        if self.profiler is not None:
+            self.profiler.enter("move selection")
+
+        if decision.kind == "move":
+            choice = policy.choose_move(decision.player, decision.options, self)
+
+        else:
+            choice = policy.choose_targets(decision.player, decision.move, decision.options, decision.count, self)
+
+        if self.profiler is not None:
+            self.profiler.exit()
+
+        return choice
+
+    # Plays the whole match using each player's policy
+    def play(self):
+        steps = self.steps()
+        send = steps.send
+        decide = self.decide
+
+        try:
+            decision = next(steps)
+            while True:
+                decision = send(decide(decision))
+
+        except StopIteration as finished:
+            return finished.value
+
+    # Builds the result of the match from its current state
+    def result(self):
+        winner = None
+        winning_team = None
+        if len(self.team_sizes) == 1:
+            winning_team = next(iter(self.team_sizes))
+
+        survivors = tuple(self.active_names())
+        if len(self.team_sizes) == 1 and len(survivors) == 1:
+            winner = survivors[0]
+
+        return Match_Result(winner, winning_team, self.round_count, self.turn_count, survivors, self.seed)
+
+# Play a single headless match and return its result
+def play_match(roster, policies = None, seed = None, teams = None, max_rounds = 200, initiative = None, events = None, profiler = None, array_roster = False):
+    return Match(roster, policies, seed, teams, max_rounds, initiative, events, profiler, array_roster).play()
+
+# sha256 of the results of check_upkeep() with its default matches and seed
+# It only changes if the rules or the dice rolls change, so when that is done on purpose it needs updating
+RESULTS_HASH = "e090c277703a64f7339815cc13b87f01487ea1c235040eb0b4eb4352b106f16f"
+
+# Returns a random roster of 2 to 5 players, and teams for it (None for every player on their own team)
+def random_roster(rng):
+    class_names = list(all_classes)
+    roster = [(f"Player {i + 1}", rng.choice(class_names)) for i in range(rng.randint(2, 5))]
+
+    teams = None
+    if len(roster) > 2 and rng.random() < 0.5:
+        teams = {name: i % 2 for i, (name, class_name) in enumerate(roster)}
+
+    return roster, teams
+
+# Checks that a player's effect totals and timings agree with their status effects and staggered moves
+# The totals are worked out again from scratch by going through every effect, the way they were before...
+#...the totals were kept up to date as effects come and go
+# Returns None if they agree, or a description of what doesn't
+def check_player(player):
+    speed_change = 0
+    burn_total = 0
+    counts = {}
+
+    for effect in player.status_fx:
+        if effect.expires_on <= player.turn_number:
+            return f"{player.name} still has {effect.name} {effect.power} on turn {player.turn_number}, which expired on turn {effect.expires_on}"
+
+        if effect.name == "+Speed":
+            speed_change += effect.power
+
+        elif effect.name == "-Speed":
+            speed_change -= effect.power
+
+        elif effect.name == "Burning":
+            burn_total += effect.power
+
+        elif effect.name == "Protection" or effect.name == "Weakness" or effect.name == "+Attack":
+            key = (effect.name, effect.power)
+            counts[key] = counts.get(key, 0) + 1
+
+    for stag_move in player.staggered_moves:
+        if stag_move.ready_on <= player.turn_number:
+            return f"{player.name} still has {stag_move.move.name} waiting on turn {player.turn_number}, which was due on turn {stag_move.ready_on}"
+
+    for stag_move in player.ready_moves:
+        if stag_move.ready_on != player.turn_number:
+            return f"{player.name} used {stag_move.move.name} on turn {player.turn_number}, it was due on turn {stag_move.ready_on}"
+
+    blocking_moves = sum(1 for stag_move in player.staggered_moves if stag_move.block_use_move == True)
+
+    kept = (player.speed_change, player.burn_total, player.multiplier_counts, (player.damage_taken_multiplier, player.attack_multiplier), player.blocking_moves)
+    rescanned = (speed_change, burn_total, counts, effect_multipliers(counts), blocking_moves)
+
+    if kept != rescanned:
+        return f"{player.name} on turn {player.turn_number} has (speed, burning, multiplier counts, multipliers, blocking moves) {kept}, going through their effects gives {rescanned}"
+
+    return None
+
+# Plays random matches of mixed classes, teams and initiative modes, checking every player with check_player()...
+#...each time a decision is made, and playing the matches without initiative again with an Array_Roster
+# Returns the sha256 of all the results and a list of (seed, roster, teams, initiative, problem) for matches...
+#...where something didn't agree
+def check_upkeep(matches = 3000, seed = 0):
+    rng = Roll_Stream(seed)
+    digest = hashlib.sha256()
+    failures = []
+
+    for i in range(matches):
+        roster, teams = random_roster(rng)
+        initiative = (None, "round", "timeline")[i % 3]
+
+        match = Match(roster, seed = seed + i, teams = teams, initiative = initiative)
+        steps = match.steps()
+        problem = None
+
+        try:
+            decision = next(steps)
+            while True:
+                for player in match.roster.turn_order():
+                    problem = problem or check_player(player)
+
+                decision = steps.send(match.decide(decision))
+
+        except StopIteration as finished:
+            result = finished.value
+
+        if problem is None and initiative is None:
+            compact = play_match(roster, seed = seed + i, teams = teams, array_roster = True)
+
+            if compact != result:
+                problem = f"with an Array_Roster the match ended with {compact}, instead of {result}"
+
+        if problem is not None:
+            failures.append((seed + i, roster, teams, initiative, problem))
+
+        digest.update(repr(tuple(result)).encode())
+
+    return digest.hexdigest(), failures
+
+# Usage: python Battle_game_headless.py <class> <class> [<class> ...] [--matches N] [--seed S] [--initiative round|timeline]
+# Plays N matches between one player of each given class and prints the win counts and speed
+# Usage: python Battle_game_headless.py --check
+# Plays 3000 random matches checking every player's effect totals as it goes, then checks the hash of the results...
+#...against RESULTS_HASH, exiting with status 1 if anything didn't match
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    if "--check" in args:
+        start = time.perf_counter()
+        results_hash, failures = check_upkeep()
+        elapsed = time.perf_counter() - start
+
+        for failed_seed, roster, teams, initiative, problem in failures[:10]:
+            print(f"Seed {failed_seed} {roster} teams {teams} initiative {initiative}: {problem}")
+
+        print(f"{len(failures)} of 3000 matches had effect totals that didn't match ({elapsed:.1f}s)")
+
+        if results_hash != RESULTS_HASH:
+            print(f"The results hash is {results_hash}, it should be {RESULTS_HASH}")
+
+        else:
+            print("The results hash matches")
+
+        sys.exit(1 if failures or results_hash != RESULTS_HASH else 0)
+
+    num_matches = 10000
+    seed = 0
+    initiative = None
+
+    if "--matches" in args:
+        i = args.index("--matches")
+        num_matches = int(args[i + 1])
+        del args[i:i + 2]
+
+    if "--seed" in args:
+        i = args.index("--seed")
+        seed = int(args[i + 1])
+        del args[i:i + 2]
+
+    if "--initiative" in args:
+        i = args.index("--initiative")
+        initiative = args[i + 1]
+        del args[i:i + 2]
+
+    if len(args) < 2:
+        args = ["Warrior", "Mage"]
+
+    roster = [(f"{class_name} {i + 1}", class_name) for i, class_name in enumerate(args)]
+    wins = {name: 0 for name, class_name in roster}
+    draws = 0
+
+    start = time.perf_counter()
+    for i in range(num_matches):
+        result = play_match(roster, seed = seed + i, initiative = initiative)
+
+        if result.winning_team is None:
+            draws += 1
+
+        else:
+            wins[result.winning_team] += 1
+
+    elapsed = time.perf_counter() - start
+
+    for name in wins:
+        print(f"{name}: {wins[name]} wins ({100 * wins[name] / num_matches:.1f}%)")
+
+    print(f"Draws: {draws}")
+    print(f"{num_matches} matches in {elapsed:.2f}s ({num_matches / elapsed:.0f} matches per second)")
@@ -0,0 +1,329 @@
+import sys
+import tracemalloc
+from array import array
+from collections.abc import Sequence, Mapping
+
+import numpy as np
+
+from Battle_game_classes import Player, Roster, Turn_Scheduler, Other_Players, all_classes
+
+# Compact storage for very large rosters, and a benchmark of how much memory each player takes up
+
+# A roster which keeps its players as arrays, one entry per player, for matches with huge numbers of players
+# It can be used anywhere a Roster is, e.g. Match(roster, array_roster = True)
+# Only players who are in the middle of something have a full Player object: the player taking their turn, the...
+#...players they target, anyone with status effects or staggered moves, and anyone a staggered move is aimed at
+# Everyone else is folded back into the arrays by settle(), which the match calls between turns. Folding a...
+#...player back and making them again gives a new Player object, so nothing may hold on to an idle player...
+#...across turns, which is why staggered moves pin their targets
+class Array_Roster:
+
+    # roster is a list of (name, atk_class) pairs, where atk_class is an Attack_Class or a class name
+    # scheduler is the Turn_Scheduler the players' Player objects use
+    def __init__(self, roster, scheduler = None):
+        self.classes = []
+        class_ids = {}
+
+        self.names = []
+        self.ids = {}
+        class_list = []
+
+        for name, atk_class in roster:
+            if isinstance(atk_class, str):
+                atk_class = all_classes[atk_class]
+
+            if name in self.ids:
+                raise ValueError(f"{name} is in the roster more than once")
+
+            if atk_class.name not in class_ids:
+                class_ids[atk_class.name] = len(self.classes)
+                self.classes.append(atk_class)
+
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            class_list.append(class_ids[atk_class.name])
+
+        self.class_ids = np.array(class_list, dtype = np.int16)
+
+        # Health is kept as a float along with whether it is a whole number, so it comes back as the same type
+        self.health = np.array([self.classes[i].health for i in class_list], dtype = np.float64)
+        self.whole_health = np.array([isinstance(self.classes[i].health, int) for i in class_list], dtype = np.bool_)
+        self.turn_numbers = np.zeros(len(class_list), dtype = np.int32)
+
+        # Same as in Roster, but as arrays of machine ints
+        self.active = array("l", range(len(class_list)))
+        self.positions = array("l", range(len(class_list)))
+
+        # Full Player objects for players who currently need one, as {id: Player}
+        self.expanded = {}
+
+        # Ids of players made or looked at since the last settle()
+        self.touched = []
+
+        # Number of staggered moves aimed at each player, as {id: count}
+        self.pins = {}
+
+        if scheduler is None:
+            scheduler = Turn_Scheduler()
+
+        self.scheduler = scheduler
+        self.players = Array_Players(self)
+
+    # Number of active players
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, name):
+        player_id = self.ids.get(name)
+        return player_id is not None and self.positions[player_id] >= 0
+
+    # Returns a full Player object for the player with the given id
+    # It stays the same object until the player is folded back by settle()
+    def player(self, player_id):
+        player = self.expanded.get(player_id)
+
+        if player is None:
+            player = Player(self.names[player_id], self.classes[self.class_ids[player_id]], self.scheduler)
+
+            health = self.health[player_id].item()
+            player.health = int(health) if self.whole_health[player_id] else health
+            player.turn_number = self.turn_numbers[player_id].item()
+
+            self.expanded[player_id] = player
+            self.touched.append(player_id)
+
+        return player
+
+    def get(self, name):
+        return self.player(self.ids[name])
+
+    def is_active(self, player):
+        return self.positions[self.ids[player.name]] >= 0
+
+    # Knock a player out of the match
+    def remove(self, player):
+        Roster.remove(self, player)
+        self.touched.append(self.ids[player.name])
+
+    # Returns the active players in the order they take their turns
+    # Players are only made as they are reached, so the order can be gone through without making everyone at once
+    def turn_order(self):
+        return (self.player(player_id) for player_id in sorted(self.active))
+
+    # Returns the active players other than the given one, in no particular order
+    def others(self, player):
+        return Other_Players(self, self.positions[self.ids[player.name]])
+
+    # Stop the given players being folded back, e.g. while a staggered move is aimed at them
+    def pin(self, players):
+        for player in players:
+            player_id = self.ids[player.name]
+            self.pins[player_id] = self.pins.get(player_id, 0) + 1
+
+    def unpin(self, players):
+        for player in players:
+            player_id = self.ids[player.name]
+            self.pins[player_id] -= 1
+
+            if self.pins[player_id] == 0:
+                del self.pins[player_id]
+
+    # Writes the players made or looked at since the last call back into the arrays, and folds back the ones...
+    #...with nothing going on. Knocked out players are always folded back, as nothing happens to them any more
+    # Must only be called between turns, when nothing is holding on to players
+    def settle(self):
+        for player_id in self.touched:
+            player = self.expanded.get(player_id)
+
+            if player is None:
+                continue
+
+            self.health[player_id] = player.health
+            self.whole_health[player_id] = isinstance(player.health, int)
+            self.turn_numbers[player_id] = player.turn_number
+
+            knocked_out = self.positions[player_id] < 0
+            idle = len(player.status_fx) == 0 and len(player.staggered_moves) == 0 and player_id not in self.pins
+
+            if knocked_out or idle:
+                del self.expanded[player_id]
+                self.scheduler.remove(player)
+
+        # Players still in the middle of something are looked at again once they are touched again
+        self.touched = []
+
+    # Returns the moves of the player with the given id, in the same order as their move set
+    def move_list(self, player_id):
+        return self.classes[self.class_ids[player_id]].move_list
+
+    def get_health(self, i):
+        player = self.expanded.get(i)
+
+        if player is not None:
+            return player.health
+
+        return self.health[i].item()
+
+    def get_speed(self, i):
+        player = self.expanded.get(i)
+
+        if player is not None:
+            return player.get_true_speed()
+
+        return self.classes[self.class_ids[i]].speed
+
+# Every player in an Array_Roster by id, whether they are active or not, made as they are looked up
+class Array_Players(Sequence):
+
+    def __init__(self, roster):
+        self.roster = roster
+
+    def __len__(self):
+        return len(self.roster.names)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+
+        if i < 0 or i >= len(self):
+            raise IndexError("player index out of range")
+
+        return self.roster.player(i)
+
+# Something about each player in an Array_Roster by name, e.g. their Player object or their team...
+#...worked out from their id when it is looked up, so a match doesn't need a dictionary entry for everyone
+class Roster_Names(Mapping):
+
+    # value is called with a player's id to get what is stored for them
+    def __init__(self, roster, value):
+        self.roster = roster
+        self.value = value
+
+    def __len__(self):
+        return len(self.roster.names)
+
+    def __iter__(self):
+        return iter(self.roster.names)
+
+    def __contains__(self, name):
+        return name in self.roster.ids
+
+    def __getitem__(self, name):
+        return self.value(self.roster.ids[name])
+
+# A Player as it was before slotted records: a plain object with its own copy of its class's moves...
+#...and its status effects and staggered moves as lists of dicts
+# Only used by the memory benchmark, to show what the compact layouts save
+class Legacy_Player:
+
+    def __init__(self, name, atk_class):
+        self.name = name
+        self.atk_class_name = atk_class.name
+        self.move_set = dict(atk_class.move_set)
+        self.speed = atk_class.speed
+        self.health = atk_class.health
+
+        self.status_fx = []
+        self.staggered_moves = []
+
+    def add_status_effect(self, name, **properties):
+        self.status_fx.append({"name": name, **properties})
+
+    def add_staggered_move(self, move, user, targets, stagger):
+        self.staggered_moves.append({"move": move, "user": user, "targets": targets, "remaining_turns": stagger[0], "block_use_move": stagger[1]})
+
+# Returns the number of bytes allocated while calling make()
+# The result of make() is kept alive until the memory has been measured
+def measure(make):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    result = make()
+
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del result
+    return after - before
+
+# Makes a roster of plain Player objects
+def make_players(count):
+    scheduler = Turn_Scheduler()
+    class_names = list(all_classes)
+
+    return [Player(f"Player {i}", all_classes[class_names[i % len(class_names)]], scheduler) for i in range(count)]
+
+# Makes a roster of Player objects which each have a couple of status effects and a staggered move, as in a busy match
+def make_busy_players(count):
+    players = make_players(count)
+    move = all_classes["Mage"].move_set["Lightning bolt"]
+
+    for player in players:
+        player.add_status_effect("Burning", remaining_turns = 3, value = 5)
+        player.add_status_effect("Protection", remaining_turns = 1, multiplier = 0.5)
+        player.add_staggered_move(move, player, [player], move.stagger)
+
+    return players
+
+# Makes a roster of players laid out as they were before slotted records
+def make_legacy_players(count):
+    class_names = list(all_classes)
+
+    return [Legacy_Player(f"Player {i}", all_classes[class_names[i % len(class_names)]]) for i in range(count)]
+
+# Same as make_busy_players, laid out as before slotted records
+def make_busy_legacy_players(count):
+    players = make_legacy_players(count)
+    move = all_classes["Mage"].move_set["Lightning bolt"]
+
+    for player in players:
+        player.add_status_effect("Burning", value = 5, remaining_turns = 3)
+        player.add_status_effect("Protection", multiplier = 0.5, remaining_turns = 1)
+        player.add_staggered_move(move, player, [player], move.stagger)
+
+    return players
+
+# Makes an Array_Roster with no expanded players
+def make_array_roster(count):
+    class_names = list(all_classes)
+
+    return Array_Roster([(f"Player {i}", class_names[i % len(class_names)]) for i in range(count)])
+
+# Makes a match of count players with an Array_Roster, or with a Player object for everyone
+def make_match(count, array_roster):
+    from Battle_game_headless import Match
+
+    class_names = list(all_classes)
+
+    return Match([(f"Player {i}", class_names[i % len(class_names)]) for i in range(count)], seed = 0, array_roster = array_roster)
+
+# Returns {description: bytes per player} for each way of storing a roster of the given size
+# The "before" entries lay players out as they were before slotted records, and the "after" entries as they are now
+# Slotted records only save memory for idle players. A player with status effects or staggered moves takes up...
+#...more than before, as each one is also put on the player's timing wheel (see Turn_Scheduler) so turns...
+#...don't have to look through every effect. Huge rosters are kept small by Array_Roster instead
+def run_memory_benchmark(count = 100000):
+    return {
+        "Before: Player objects": measure(lambda: make_legacy_players(count)) / count,
+        "After: Player objects": measure(lambda: make_players(count)) / count,
+        "Before: Player objects with 2 effects and a staggered move": measure(lambda: make_busy_legacy_players(count)) / count,
+        "After: Player objects with 2 effects and a staggered move": measure(lambda: make_busy_players(count)) / count,
+        "Array_Roster": measure(lambda: make_array_roster(count)) / count,
+        "Match with Player objects": measure(lambda: make_match(count, False)) / count,
+        "Match with an Array_Roster": measure(lambda: make_match(count, True)) / count,
+    }
+
+# Usage: python Battle_game_memory.py [--players N]
+# Prints how many bytes each player takes up in each kind of roster
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    count = 100000
+    if "--players" in args:
+        count = int(args[args.index("--players") + 1])
+
+    for description, size in run_memory_benchmark(count).items():
+        print(f"{description}: {size:.0f} bytes per player")
@@ -0,0 +1,403 @@
+import os
+import sys
+import copy
+import json
+import math
+import time
+import hashlib
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Battle_game_balance import Tally, play_chunk, merge_tallies, summarise, team_label, format_matrix, run_balance
+from Battle_game_rules import Ruleset_Error, default_classes, ruleset_data, validate_ruleset, read_ruleset, parse_ruleset, is_number
+
+# Searches for move numbers which bring the win rates between classes close to target win rates
+# A parameter is a number in a move, written as the move's name followed by the path to the number, e.g.
+#   Fireball.effect.Damage.value, Fireball.accuracy, Healing chi.crit_info.crit_effect
+# and is given bounds to search between. The search is a (1 + lambda) evolution strategy: each generation makes...
+#...a handful of random changes to the best ruleset so far, plays them all at once on a process pool, and keeps the...
+#...best if it beats the current one. The size of the changes grows after a success and shrinks after a failure
+# Every candidate plays exactly the same matches (the same seeds from Battle_game_balance's chunk streams), so the...
+#...difference between two candidates comes from their numbers and not from luck. This is what makes such small...
+#...steps worth taking with a few thousand matches per matchup
+# Candidates are saved as ruleset files in a temporary folder, which the workers load like any other ruleset
+# Scores are cached by parameter values, so a candidate seen before (values are rounded, so this happens a lot as the...
+#...steps shrink) is never played again, and with a cache file neither is anything from an earlier run with the same settings
+
+# One number to tune. keys is the path to it inside the move, and integer says if it must be a whole number
+Parameter = namedtuple("Parameter", ["label", "move", "keys", "low", "high", "integer"])
+
+# How a set of parameter values did
+# rates is the win rate of each target matchup, in the same order as the targets, and score is the sum of...
+#...squared differences from the targets, or infinity if the values made an invalid ruleset
+Evaluation = namedtuple("Evaluation", ["values", "score", "rates"])
+
+# Parses a matchup label like "Warrior vs Mage" or "Warrior+Mage vs Monk+Monk" into two teams
+def parse_matchup(label):
+    sides = label.split(" vs ")
+    if len(sides) != 2:
+        raise Ruleset_Error(f"{label}: matchups are written as <team> vs <team>, e.g. Warrior vs Mage")
+
+    return tuple(tuple(name.strip() for name in side.split("+")) for side in sides)
+
+# Every 1v1 matchup between different classes, all with a target of 50%
+def even_targets(data):
+    names = [atk_class["name"] for atk_class in data["classes"]]
+
+    return {((names[i],), (names[j],)): 0.5 for i in range(len(names)) for j in range(i + 1, len(names))}
+
+def find_move(data, name):
+    for move in data["moves"]:
+        if move["name"] == name:
+            return move
+
+    raise Ruleset_Error(f"{name}: there is no move with this name")
+
+# Makes a Parameter from a label like "Fireball.accuracy" and its bounds, checking the label points to a number
+# It is a whole number if the current value is one, as accuracy, damage and durations are
+def make_parameter(data, label, low, high):
+    move_name, *keys = label.split(".")
+    value = find_move(data, move_name)
+
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            raise Ruleset_Error(f"{label}: {move_name} has no {'.'.join(keys)}")
+
+        value = value[key]
+
+    if len(keys) == 0 or not is_number(value):
+        raise Ruleset_Error(f"{label}: must be a number in the move, e.g. {move_name}.accuracy")
+
+    if not low < high:
+        raise Ruleset_Error(f"{label}: the lower bound must be below the upper bound")
+
+    return Parameter(label, move_name, tuple(keys), low, high, isinstance(value, int))
+
+# Returns the current values of the parameters in a ruleset
+def current_values(data, parameters):
+    values = []
+
+    for parameter in parameters:
+        value = find_move(data, parameter.move)
+        for key in parameter.keys:
+            value = value[key]
+
+        values.append(value)
+
+    return tuple(values)
+
+# Clips values to their bounds and rounds them, to whole numbers or to 2 decimal places
+def round_values(parameters, values):
+    rounded = []
+
+    for parameter, value in zip(parameters, values):
+        value = min(max(value, parameter.low), parameter.high)
+        rounded.append(int(round(value)) if parameter.integer else round(float(value), 2))
+
+    return tuple(rounded)
+
+# Returns a validated copy of the ruleset with the parameters set to the values
+# Raises Ruleset_Error if the values break the ruleset, e.g. an accuracy above 100
+def apply_values(data, parameters, values):
+    data = copy.deepcopy(data)
+
+    for parameter, value in zip(parameters, values):
+        entry = find_move(data, parameter.move)
+        for key in parameter.keys[:-1]:
+            entry = entry[key]
+
+        entry[parameter.keys[-1]] = value
+
+    return validate_ruleset(data)
+
+class Balance_Optimiser:
+
+    # data is the ruleset to start from, parameters a list of Parameter, and targets {(team_a, team_b): win rate for team_a}
+    # matches is how many matches each candidate plays per target matchup, split into chunks of chunk_size
+    # workers is the number of processes to use. With 0 workers everything runs in this process
+    # cache_path is a JSON file of scores from earlier runs, which is added to as candidates are played
+    def __init__(self, data, parameters, targets, matches = 2000, seed = 0, workers = None, chunk_size = 250, max_rounds = 200, cache_path = None):
+        self.data = validate_ruleset(data)
+        self.parameters = list(parameters)
+        self.targets = list(targets.items())
+
+        self.chunk_size = chunk_size
+        self.chunks = max(1, math.ceil(matches / chunk_size))
+        self.seed = seed
+        self.max_rounds = max_rounds
+        self.workers = workers
+        if workers is None:
+            self.workers = os.cpu_count() or 1
+
+        # Cached results only apply to runs which would play exactly the same matches, so they are kept under a...
+        #...key made from everything except the parameter values
+        settings = json.dumps([self.data, [list(team_a) + ["vs"] + list(team_b) for (team_a, team_b), target in self.targets],
+                               [parameter.label for parameter in self.parameters], seed, self.chunks, chunk_size, max_rounds])
+        self.settings_key = hashlib.sha256(settings.encode()).hexdigest()[:16]
+
+        # {values: Evaluation}
+        self.cache = {}
+        self.cache_path = cache_path
+        self.load_cache()
+
+        # Candidate rulesets are written here for the workers to load
+        self.folder = tempfile.TemporaryDirectory(prefix = "balance_")
+        self.written = 0
+        self.pool = None
+        self.played = 0
+
+    def __enter__(self):
+        if self.workers > 0:
+            self.pool = ProcessPoolExecutor(self.workers)
+
+        return self
+
+    def __exit__(self, *exception):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+        self.save_cache()
+        self.folder.cleanup()
+
+    def load_cache(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return
+
+        with open(self.cache_path) as file:
+            saved = json.load(file).get(self.settings_key, [])
+
+        for values, rates in saved:
+            values = tuple(values)
+            self.cache[values] = Evaluation(values, self.score(rates), None if rates is None else tuple(rates))
+
+    # Saves every evaluation with these settings, keeping ones saved with other settings
+    def save_cache(self):
+        if self.cache_path is None:
+            return
+
+        saved = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path) as file:
+                saved = json.load(file)
+
+        saved[self.settings_key] = [[list(evaluation.values), None if evaluation.rates is None else list(evaluation.rates)]
+                                    for evaluation in self.cache.values()]
+
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(saved, file)
+
+        os.replace(temp_path, self.cache_path)
+
+    def score(self, rates):
+        if rates is None:
+            return math.inf
+
+        return sum((rate - target) ** 2 for rate, (matchup, target) in zip(rates, self.targets))
+
+    # Writes the ruleset for some values to the folder and returns its path, or None if the values make an invalid ruleset
+    def write_candidate(self, values):
+        try:
+            data = apply_values(self.data, self.parameters, values)
+
+        except Ruleset_Error:
+            return None
+
+        self.written += 1
+        path = os.path.join(self.folder.name, f"candidate_{self.written}.json")
+        with open(path, "w") as file:
+            json.dump(data, file)
+
+        return path
+
+    # Plays every candidate that isn't cached, all at once, and returns an Evaluation for each
+    def evaluate(self, candidates):
+        candidates = [round_values(self.parameters, values) for values in candidates]
+
+        # {values: ruleset path} for the candidates which need playing
+        paths = {}
+        for values in candidates:
+            if values not in self.cache and values not in paths:
+                paths[values] = self.write_candidate(values)
+
+        jobs = [(values, i, chunk_index) for values, path in paths.items() if path is not None
+                for i in range(len(self.targets)) for chunk_index in range(self.chunks)]
+
+        def job_args(values, i, chunk_index):
+            (team_a, team_b), target = self.targets[i]
+            return team_a, team_b, self.seed, chunk_index, self.chunk_size, self.max_rounds, paths[values]
+
+        if self.pool is None:
+            tallies = [play_chunk(*job_args(*job)) for job in jobs]
+
+        else:
+            futures = [self.pool.submit(play_chunk, *job_args(*job)) for job in jobs]
+            tallies = [future.result() for future in futures]
+
+        # {values: [Tally for each target]}
+        totals = {values: [Tally(0, 0, 0, 0, 0)] * len(self.targets) for values in paths}
+
+        for (values, i, chunk_index), tally in zip(jobs, tallies):
+            totals[values][i] = merge_tallies(totals[values][i], tally)
+            self.played += tally.matches
+
+        for values, path in paths.items():
+            rates = None
+            if path is not None:
+                rates = tuple(summarise(team_a, team_b, tally).win_rate for ((team_a, team_b), target), tally in zip(self.targets, totals[values]))
+
+            self.cache[values] = Evaluation(values, self.score(rates), rates)
+
+        return [self.cache[values] for values in candidates]
+
+    # Runs the search and returns the best Evaluation
+    # population is how many candidates each generation plays, and step the starting size of changes as a share of...
+    #...each parameter's range. The search stops early once every win rate is within tolerance of its target
+    # on_generation is called with (generation, best Evaluation, step) after each generation
+    def optimise(self, generations = 30, population = None, step = 0.2, tolerance = 0.01, min_step = 0.01, seed = 0, on_generation = None):
+        if population is None:
+            population = max(4, 2 * self.workers)
+
+        rng = np.random.default_rng(seed)
+        lows = np.array([parameter.low for parameter in self.parameters], dtype = float)
+        spans = np.array([parameter.high - parameter.low for parameter in self.parameters], dtype = float)
+
+        best = self.evaluate([current_values(self.data, self.parameters)])[0]
+
+        for generation in range(generations):
+            if self.is_close(best, tolerance) or step < min_step:
+                break
+
+            # Changes are made on a 0 to 1 scale for each parameter, so wide and narrow ranges move alike
+            centre = (np.array(best.values, dtype = float) - lows) / spans
+            scaled = np.clip(centre + step * rng.standard_normal((population, len(self.parameters))), 0, 1)
+
+            evaluations = self.evaluate([tuple(lows + spans * point) for point in scaled])
+            challenger = min(evaluations, key = lambda evaluation: evaluation.score)
+
+            if challenger.score < best.score:
+                best = challenger
+                step *= 1.5
+
+            else:
+                step *= 0.6
+
+            if on_generation is not None:
+                on_generation(generation, best, step)
+
+            self.save_cache()
+
+        return best
+
+    def is_close(self, evaluation, tolerance):
+        return evaluation.rates is not None and all(abs(rate - target) <= tolerance for rate, (matchup, target) in zip(evaluation.rates, self.targets))
+
+    # Returns the full ruleset for an Evaluation
+    def ruleset(self, evaluation):
+        return apply_values(self.data, self.parameters, evaluation.values)
+
+# Reads the parameters and targets from a JSON or TOML file like:
+# {"parameters": {"Fireball.effect.Damage.value": [15, 35], "Fireball.accuracy": [50, 95]},
+#  "targets": {"Warrior vs Mage": 0.5, "Mage vs Monk": 0.5}}
+# Without targets every 1v1 matchup is aimed at 50%
+def read_spec(path, data):
+    with open(path, "rb") as file:
+        spec = parse_ruleset(path, file.read())
+
+    parameters = [make_parameter(data, label, *bounds) for label, bounds in spec.get("parameters", {}).items()]
+    targets = {parse_matchup(label): rate for label, rate in spec.get("targets", {}).items()}
+
+    return parameters, targets
+
+# Usage: python Battle_game_optimiser.py [<spec file>] [--param Move.path=LOW:HIGH ...] [--target "A vs B=RATE" ...]
+#                                        [--ruleset FILE] [--matches N] [--generations N] [--population N] [--workers N]
+#                                        [--seed S] [--cache FILE] [--output FILE]
+# Searches for move numbers which give the target win rates, saves the best ruleset to --output (balanced.json by...
+#...default) and prints its win-rate table from a fresh balance sweep with different seeds, to check it wasn't just lucky
+# e.g. python Battle_game_optimiser.py --param Fireball.effect.Damage.value=15:40 --param "Healing chi.crit_info.crit_effect=1:8"
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default, convert):
+        if name not in args:
+            return default
+
+        i = args.index(name)
+        value = convert(args[i + 1])
+        del args[i:i + 2]
+        return value
+
+    def options(name):
+        values = []
+        while name in args:
+            values.append(option(name, None, str))
+
+        return values
+
+    ruleset = option("--ruleset", None, str)
+    matches = option("--matches", 2000, int)
+    generations = option("--generations", 30, int)
+    population = option("--population", None, int)
+    workers = option("--workers", None, int)
+    seed = option("--seed", 0, int)
+    cache_path = option("--cache", None, str)
+    output = option("--output", "balanced.json", str)
+    param_options = options("--param")
+    target_options = options("--target")
+
+    try:
+        data = ruleset_data(default_classes) if ruleset is None else read_ruleset(ruleset)
+        parameters, targets = read_spec(args[0], data) if len(args) > 0 else ([], {})
+
+        for param in param_options:
+            label, bounds = param.rsplit("=", 1)
+            low, high = bounds.split(":")
+            parameters.append(make_parameter(data, label, float(low), float(high)))
+
+        for target in target_options:
+            label, rate = target.rsplit("=", 1)
+            targets[parse_matchup(label)] = float(rate)
+
+        if len(parameters) == 0:
+            raise Ruleset_Error("no parameters to tune, give a spec file or --param Move.path=LOW:HIGH")
+
+    except Ruleset_Error as error:
+        print(f"Invalid settings: {error}")
+        sys.exit(1)
+
+    if len(targets) == 0:
+        targets = even_targets(data)
+
+    def report(generation, best, step):
+        errors = ", ".join(f"{100 * rate:.1f}%" for rate in best.rates)
+        print(f"Generation {generation + 1}: RMS error {100 * math.sqrt(best.score / len(targets)):.2f}% ({errors}), step {step:.3f}")
+
+    start = time.perf_counter()
+
+    with Balance_Optimiser(data, parameters, targets, matches, seed, workers, cache_path = cache_path) as optimiser:
+        best = optimiser.optimise(generations, population, seed = seed, on_generation = report)
+        proposed = optimiser.ruleset(best)
+        played = optimiser.played
+
+    print(f"\nPlayed {played} matches in {time.perf_counter() - start:.1f}s")
+
+    for parameter, old, new in zip(parameters, current_values(data, parameters), best.values):
+        print(f"{parameter.label}: {old} -> {new}")
+
+    with open(output, "w") as file:
+        json.dump(proposed, file, indent = 2)
+
+    print(f"Saved the proposed ruleset to {output}\n")
+
+    # Checked on different seeds from the search
+    results = run_balance(list(targets), 0.01, seed + 1, workers, ruleset = output)
+    print(format_matrix(results))
+
+    for result in results:
+        target = targets[result.team_a, result.team_b]
+        print(f"{team_label(result.team_a)} vs {team_label(result.team_b)}: {100 * result.win_rate:.1f}% "
+              f"({100 * result.low:.1f}% - {100 * result.high:.1f}%), target {100 * target:.1f}%")
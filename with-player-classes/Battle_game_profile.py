@@ -0,0 +1,176 @@
+import sys
+import json
+import time
+
+from Battle_game_headless import Match
+
+# Timings for each phase of a match, and counts of what happened in it
+# Games and Matches take an optional profiler and skip all of this when it is None, so profiling costs nothing...
+#...unless it is turned on
+# Phases can happen inside other phases (e.g. staggered moves are used with attempt move), so each phase has...
+#...a total time which includes the phases inside it and a self time which doesn't
+# Phases used by the game and headless matches:
+#   round start, new turn, staggered moves, move selection, attempt move
+# and by the interactive game only:
+#   summaries (printing the players' summaries), rendering (showing events), pacing (sleeping between messages)
+# Counters: rounds, turns, moves, rolls, hits, misses, crits, effects (each effect of a move which hit)
+
+class Profiler:
+
+    # trace keeps every phase as a separate event for a Chrome trace, rather than just the totals
+    # clock returns the time in nanoseconds
+    def __init__(self, trace = False, clock = time.perf_counter_ns):
+        self.clock = clock
+
+        # {phase: [calls, total time, self time]}, in nanoseconds
+        self.phases = {}
+
+        # {counter: count}
+        self.counters = {}
+
+        # Phases which have been entered and not exited, as [phase, start time, time spent in phases inside it]
+        self.stack = []
+
+        # Chrome trace events, or None if not tracing
+        self.trace_events = [] if trace else None
+        self.started = clock()
+
+    def enter(self, phase):
+        self.stack.append([phase, self.clock(), 0])
+
+    # Leaves the phase entered most recently
+    def exit(self):
+        end = self.clock()
+        phase, start, inner = self.stack.pop()
+        elapsed = end - start
+
+        totals = self.phases.get(phase)
+        if totals is None:
+            totals = self.phases[phase] = [0, 0, 0]
+
+        totals[0] += 1
+        totals[1] += elapsed
+        totals[2] += elapsed - inner
+
+        if len(self.stack) > 0:
+            self.stack[-1][2] += elapsed
+
+        if self.trace_events is not None:
+            self.trace_events.append({"name": phase, "ph": "X", "ts": (start - self.started) / 1000, "dur": elapsed / 1000, "pid": 0, "tid": 0})
+
+    def count(self, counter, amount = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    # Counts the result of a move on one target
+    # The crit roll is made even when the move misses, but only counts as a crit if the move hit
+    def record_hit(self, move, hit, crit):
+        if hit == True:
+            self.count("hits")
+            self.count("effects", len(move.compiled_effects))
+
+            if crit == True:
+                self.count("crits")
+
+        else:
+            self.count("misses")
+
+    # Returns a clock with a sleep(seconds) method which times each sleep as the pacing phase
+    def wrap_clock(self, clock):
+        return Profiled_Clock(clock, self)
+
+    # Returns the phases as {phase: {calls, total_ms, self_ms, mean_us}} and the counters, for JSON
+    def summary(self):
+        phases = {}
+
+        for phase, (calls, total, self_time) in sorted(self.phases.items(), key = lambda item: -item[1][2]):
+            phases[phase] = {"calls": calls, "total_ms": total / 1e6, "self_ms": self_time / 1e6, "mean_us": total / calls / 1000}
+
+        return {"elapsed_ms": (self.clock() - self.started) / 1e6, "phases": phases, "counters": dict(self.counters)}
+
+    # Returns the summary as a table, with the phases that took the most time first
+    def format_summary(self):
+        summary = self.summary()
+        total_self = sum(phase["self_ms"] for phase in summary["phases"].values())
+
+        lines = [f"{'Phase':18} {'Calls':>9} {'Total ms':>11} {'Self ms':>11} {'Self %':>7} {'Mean us':>10}"]
+
+        for phase, stats in summary["phases"].items():
+            share = 100 * stats["self_ms"] / total_self if total_self > 0 else 0.0
+            lines.append(f"{phase:18} {stats['calls']:9} {stats['total_ms']:11.2f} {stats['self_ms']:11.2f} {share:6.1f}% {stats['mean_us']:10.2f}")
+
+        lines.append("")
+        for counter, count in summary["counters"].items():
+            lines.append(f"{counter:18} {count:9}")
+
+        return "\n".join(lines)
+
+    # Returns a Chrome trace, which can be opened in chrome://tracing or Perfetto
+    # The counters are added at the end, and the summary is kept under otherData
+    def chrome_trace(self):
+        events = list(self.trace_events or [])
+        end = (self.clock() - self.started) / 1000
+
+        if len(self.counters) > 0:
+            events.append({"name": "counters", "ph": "C", "ts": end, "pid": 0, "tid": 0, "args": dict(self.counters)})
+
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": self.summary()}
+
+    # Saves a Chrome trace if the profiler is tracing, and just the summary otherwise
+    def save(self, path):
+        with open(path, "w") as file:
+            if self.trace_events is not None:
+                json.dump(self.chrome_trace(), file)
+
+            else:
+                json.dump(self.summary(), file, indent = 1)
+
+# Passes sleeps on to another clock, timing each one
+class Profiled_Clock:
+
+    def __init__(self, clock, profiler):
+        self.clock = clock
+        self.profiler = profiler
+
+    def sleep(self, seconds):
+        self.profiler.enter("pacing")
+        self.clock.sleep(seconds)
+        self.profiler.exit()
+
+# Usage: python Battle_game_profile.py <class> <class> [<class> ...] [--matches N] [--seed S] [--players N] [--output FILE]
+# Plays N headless matches with a profiler and prints where the time went
+# --players N makes a roster of N players by cycling through the given classes
+# --output saves a Chrome trace of every phase to FILE (ending in .json), which can be opened in chrome://tracing
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default, convert):
+        if name not in args:
+            return default
+
+        i = args.index(name)
+        value = convert(args[i + 1])
+        del args[i:i + 2]
+        return value
+
+    num_matches = option("--matches", 1000, int)
+    seed = option("--seed", 0, int)
+    num_players = option("--players", None, int)
+    output = option("--output", None, str)
+
+    if len(args) < 2:
+        args = ["Warrior", "Mage"]
+
+    if num_players is None:
+        num_players = len(args)
+
+    roster = [(f"{args[i % len(args)]} {i + 1}", args[i % len(args)]) for i in range(num_players)]
+    profiler = Profiler(trace = output is not None)
+
+    for i in range(num_matches):
+        Match(roster, seed = seed + i, profiler = profiler).play()
+
+    print(profiler.format_summary())
+
+    if output is not None:
+        profiler.save(output)
+        print(f"Saved trace to {output}")
@@ -0,0 +1,565 @@
+import sys
+import time
+import zlib
+import struct
+from collections import namedtuple
+
+from Battle_game_classes import Status_Effect, Staggered_Move, Initiative_Queue, all_classes
+from Battle_game_headless import Match, random_roster
+from Battle_game_rng import Roll_Stream
+
+# Records headless matches as compact binary replays, and plays them back to check they still give the same result
+# A replay only stores the seed, the roster and each decision. Everything else is re-simulated by the rules...
+#...so a replay which no longer matches its checksums shows that the rules have changed
+# Snapshots of the whole match are saved every few rounds, so playback can skip to a round without starting from the beginning
+
+# Record layout, all little-endian:
+#   header: magic, version, seed, max_rounds, initiative, number of players
+#   players: name, class name and team of each player, as length-prefixed UTF-8
+#   decisions: a move decision is the move's index in the player's move set (1 byte)...
+#   ...and a target decision is the number of targets (1 byte) followed by each target's roster id (2 bytes each)
+#   round checksums: a CRC-32 of every player's health and the turn count at the start of each round which was played
+#   snapshots: the round they were taken before, where the round's decisions start, how many rounds were played before it...
+#   ...and the saved match state
+#   result: the winner's roster id (or -1), rounds, turns, and a CRC-32 of the whole result
+MAGIC = b"BGRP"
+VERSION = 4
+
+HEADER = struct.Struct("<4sBQHBH")
+RESULT = struct.Struct("<hHII")
+SNAPSHOT = struct.Struct("<HIHI")
+
+INITIATIVE_MODES = [None, "round", "timeline"]
+EFFECT_NAMES = ["+Attack", "-Attack", "+Speed", "-Speed", "Protection", "Weakness", "Burning"]
+POWER_KEYS = ["value", "multiplier"]
+
+# A match restored part way through a replay, where its next decision is in the replay's decisions...
+#...and how many rounds had been started before it
+Replay_Position = namedtuple("Replay_Position", ["match", "decision_offset", "rounds_played"])
+
+# Raised inside a match to stop playback at a round
+class Replay_Stop(Exception):
+    pass
+
+# Appends a length-prefixed UTF-8 string
+def pack_text(parts, text):
+    data = str(text).encode()
+    parts.append(struct.pack("<B", len(data)))
+    parts.append(data)
+
+# Reads a length-prefixed UTF-8 string and returns it with the offset after it
+def unpack_text(data, offset):
+    length = data[offset]
+    return data[offset + 1:offset + 1 + length].decode(), offset + 1 + length
+
+# Returns a CRC-32 of the turn count and every player's health
+def round_checksum(match):
+    healths = [float(player.health) for player in match.roster.players]
+    return zlib.crc32(struct.pack(f"<I{len(healths)}d", match.turn_count, *healths))
+
+# Returns a CRC-32 of a match result, with players given by roster id
+def result_checksum(match, result):
+    ids = [match.roster.ids[name] for name in result.survivors]
+    return zlib.crc32(struct.pack(f"<IIH{len(ids)}H", result.rounds, result.turns, len(ids), *ids) + str(result.winning_team).encode())
+
+# Saves everything needed to carry on a match from between two rounds as bytes
+# Players are saved by roster id and moves by their index in the user's move set
+def save_state(match):
+    ids = match.roster.ids
+    parts = [struct.pack("<HIH", match.round_count, match.turn_count, len(match.roster.active))]
+    parts.append(struct.pack(f"<{len(match.roster.active)}H", *match.roster.active))
+
+    # The rules' Roll_Stream only needs its position, as the seed is in the header
+    parts.append(struct.pack("<Q", match.rng.position()))
+
+    for player in match.roster.players:
+        parts.append(struct.pack("<d?IBB", player.health, isinstance(player.health, int), player.turn_number, len(player.status_fx), len(player.staggered_moves)))
+
+        for effect in player.status_fx:
+            parts.append(struct.pack("<BBd?I", EFFECT_NAMES.index(effect.name), POWER_KEYS.index(effect.power_key), effect.power, isinstance(effect.power, int), effect.expires_on))
+
+        for stag_move in player.staggered_moves:
+            move_index = match.move_lists[stag_move.user.name].index(stag_move.move)
+            target_ids = [ids[target.name] for target in stag_move.targets]
+
+            parts.append(struct.pack(f"<BHIBB{len(target_ids)}H", move_index, ids[stag_move.user.name], stag_move.ready_on, bool(stag_move.block_use_move), len(target_ids), *target_ids))
+
+    # Timeline initiative carries on between rounds, so the waiting players are saved too
+    if match.initiative == "timeline" and match.initiative_queue is not None:
+        queue = match.initiative_queue
+        waiting = sorted((order, key) for player, (key, order) in queue.keys.items())
+
+        parts.append(struct.pack("<dH", queue.now, len(waiting)))
+        for order, key in waiting:
+            parts.append(struct.pack("<Hd", order, key))
+
+    return b"".join(parts)
+
+# Puts a match made from the same roster back into a state from save_state()
+def load_state(match, data):
+    players = match.roster.players
+
+    round_count, turn_count, active_count = struct.unpack_from("<HIH", data, 0)
+    offset = 8
+
+    active = list(struct.unpack_from(f"<{active_count}H", data, offset))
+    offset += 2 * active_count
+
+    match.rng.seek(struct.unpack_from("<Q", data, offset)[0])
+    offset += 8
+
+    match.round_count = round_count
+    match.turn_count = turn_count
+
+    # Rebuild the roster in the saved order, as it decides the order of possible targets
+    match.roster.active = active
+    match.roster.positions = [-1] * len(players)
+    for position, player_id in enumerate(active):
+        match.roster.positions[player_id] = position
+
+    match.team_sizes = {}
+    for player_id in active:
+        team = match.teams[players[player_id].name]
+        match.team_sizes[team] = match.team_sizes.get(team, 0) + 1
+
+    for player in players:
+        match.scheduler.remove(player)
+
+    for player in players:
+        health, is_int, turn_number, effect_count, stag_count = struct.unpack_from("<d?IBB", data, offset)
+        offset += 15
+
+        # Health and effect powers are saved as floats along with whether they were ints, so they are shown the same way...
+        #...after a seek as in the match itself
+        player.health = int(health) if is_int else health
+        player.turn_number = turn_number
+        player.status_fx = {}
+        player.staggered_moves = {}
+        player.ready_moves = ()
+        player.blocking_moves = 0
+        player.speed_change = 0
+        player.damage_taken_multiplier = 1
+        player.attack_multiplier = 1
+        player.multiplier_counts = {}
+        player.burn_total = 0
+        player.speed_listener = None
+        player.clear_formatting()
+
+        for i in range(effect_count):
+            name, power_key, power, is_int, expires_on = struct.unpack_from("<BBd?I", data, offset)
+            offset += 15
+
+            player.apply_status_effect(Status_Effect(EFFECT_NAMES[name], POWER_KEYS[power_key], int(power) if is_int else power, expires_on))
+
+        for i in range(stag_count):
+            move_index, user_id, ready_on, block_use_move, target_count = struct.unpack_from("<BHIBB", data, offset)
+            offset += 9
+
+            target_ids = struct.unpack_from(f"<{target_count}H", data, offset)
+            offset += 2 * target_count
+
+            user = players[user_id]
+            move = match.move_lists[user.name][move_index]
+            player.apply_staggered_move(Staggered_Move(move, user, [players[i] for i in target_ids], ready_on, block_use_move == 1))
+
+    # Knocked out players don't need anything scheduled
+    for player in players:
+        if match.roster.positions[match.roster.ids[player.name]] < 0:
+            match.scheduler.remove(player)
+
+    match.initiative_queue = None
+    if match.initiative == "timeline" and offset < len(data):
+        now, waiting_count = struct.unpack_from("<dH", data, offset)
+        offset += 10
+
+        queue = Initiative_Queue("timeline")
+        for i in range(waiting_count):
+            order, key = struct.unpack_from("<Hd", data, offset)
+            offset += 10
+
+            queue.push(players[order], key, order)
+            players[order].speed_listener = queue.speed_changed
+
+        queue.now = now
+        match.initiative_queue = queue
+
+# Writes down a match's decisions as it is played
+class Replay_Recorder:
+
+    def __init__(self, match, snapshot_every = 10):
+        self.match = match
+        self.snapshot_every = snapshot_every
+
+        self.decisions = bytearray()
+        self.checksums = []
+        self.snapshots = []
+
+        match.round_listener = self.round_starting
+
+    # Saves a checksum before every round and a snapshot before every snapshot_every rounds
+    def round_starting(self, match, round_number):
+        self.checksums.append(round_checksum(match))
+
+        if self.snapshot_every > 0 and round_number > 1 and len(self.snapshots) < (round_number - 1) // self.snapshot_every:
+            self.snapshots.append((round_number, len(self.decisions), len(self.checksums) - 1, save_state(match)))
+
+    def record(self, decision, answer):
+        if decision.kind == "move":
+            self.decisions.append(decision.options.index(answer))
+
+        else:
+            ids = self.match.roster.ids
+            self.decisions += struct.pack(f"<B{len(answer)}H", len(answer), *(ids[target.name] for target in answer))
+
+    # Returns the whole replay as bytes
+    def to_bytes(self, result):
+        match = self.match
+        players = match.roster.players
+
+        parts = [HEADER.pack(MAGIC, VERSION, match.seed, match.max_rounds, INITIATIVE_MODES.index(match.initiative), len(players))]
+
+        for player in players:
+            pack_text(parts, player.name)
+            pack_text(parts, player.atk_class_name)
+            pack_text(parts, match.teams[player.name])
+
+        parts.append(struct.pack("<I", len(self.decisions)))
+        parts.append(bytes(self.decisions))
+
+        parts.append(struct.pack(f"<I{len(self.checksums)}I", len(self.checksums), *self.checksums))
+
+        parts.append(struct.pack("<H", len(self.snapshots)))
+        for round_number, decision_offset, rounds_played, state in self.snapshots:
+            parts.append(SNAPSHOT.pack(round_number, decision_offset, rounds_played, len(state)))
+            parts.append(state)
+
+        winner = match.roster.ids[result.winner] if result.winner is not None else -1
+        parts.append(RESULT.pack(winner, result.rounds, result.turns, result_checksum(match, result)))
+
+        return b"".join(parts)
+
+# Plays a match like play_match() and returns (Match_Result, replay bytes)
+# Teams are saved as text, so they should be strings if the replay is going to be checked
+def record_match(roster, policies = None, seed = None, teams = None, max_rounds = 200, initiative = None, snapshot_every = 10):
+    match = Match(roster, policies, seed, teams, max_rounds, initiative)
+    recorder = Replay_Recorder(match, snapshot_every)
+
+    steps = match.steps()
+    try:
+        decision = next(steps)
+        while True:
+            answer = match.decide(decision)
+            recorder.record(decision, answer)
+            decision = steps.send(answer)
+
+    except StopIteration as finished:
+        result = finished.value
+
+    return result, recorder.to_bytes(result)
+
+# A recorded match which can be played back, checked, or jumped into at any round
+class Replay:
+
+    # classes is an optional dictionary of {name: Attack_Class} for classes which aren't in all_classes
+    def __init__(self, data, classes = None):
+        magic, version, self.seed, self.max_rounds, initiative, player_count = HEADER.unpack_from(data, 0)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a replay, or a replay from a different version")
+
+        self.initiative = INITIATIVE_MODES[initiative]
+        self.classes = all_classes if classes is None else {**all_classes, **classes}
+
+        offset = HEADER.size
+        self.roster = []
+        self.teams = {}
+        for i in range(player_count):
+            name, offset = unpack_text(data, offset)
+            class_name, offset = unpack_text(data, offset)
+            team, offset = unpack_text(data, offset)
+
+            self.roster.append((name, self.classes[class_name]))
+            self.teams[name] = team
+
+        decision_length, = struct.unpack_from("<I", data, offset)
+        self.decisions = bytes(data[offset + 4:offset + 4 + decision_length])
+        offset += 4 + decision_length
+
+        checksum_count, = struct.unpack_from("<I", data, offset)
+        self.checksums = struct.unpack_from(f"<{checksum_count}I", data, offset + 4)
+        offset += 4 + 4 * checksum_count
+
+        snapshot_count, = struct.unpack_from("<H", data, offset)
+        offset += 2
+
+        # Snapshots as [(round, decision offset, rounds played, state)], in round order
+        self.snapshots = []
+        for i in range(snapshot_count):
+            round_number, decision_offset, rounds_played, length = SNAPSHOT.unpack_from(data, offset)
+            offset += SNAPSHOT.size
+
+            self.snapshots.append((round_number, decision_offset, rounds_played, bytes(data[offset:offset + length])))
+            offset += length
+
+        self.winner, self.rounds, self.turns, self.result_checksum = RESULT.unpack_from(data, offset)
+        self.size = offset + RESULT.size
+
+    def new_match(self):
+        return Match(self.roster, seed = self.seed, teams = self.teams, max_rounds = self.max_rounds, initiative = self.initiative)
+
+    # Reads the answer to a decision from the recorded decisions and returns it with the offset after it
+    def read_decision(self, match, decision, offset):
+        if decision.kind == "move":
+            return decision.options[self.decisions[offset]], offset + 1
+
+        count = self.decisions[offset]
+        ids = struct.unpack_from(f"<{count}H", self.decisions, offset + 1)
+
+        return [match.roster.players[i] for i in ids], offset + 1 + 2 * count
+
+    # Plays the match on from a Replay_Position using the recorded decisions
+    # If stop_round is given, playback stops just before that round (or the next one played) starts and returns...
+    #...a Replay_Position, otherwise the Match_Result is returned
+    # With verify, every round checksum and snapshot is checked, and a ValueError is raised at the first difference
+    def run(self, start, stop_round = None, verify = True):
+        snapshots = {round_number: state for round_number, snapshot_offset, rounds_played, state in self.snapshots}
+        match = start.match
+        position = [start.decision_offset]
+        stopped = []
+
+        # Rounds which have already been played, so the next round's checksum can be found
+        rounds_played = [start.rounds_played]
+
+        def round_starting(match, round_number):
+            checksum_index = rounds_played[0]
+            rounds_played[0] += 1
+
+            if verify:
+                if checksum_index >= len(self.checksums) or round_checksum(match) != self.checksums[checksum_index]:
+                    raise ValueError(f"Replay no longer matches at the start of round {round_number}")
+
+                if round_number in snapshots and save_state(match) != snapshots[round_number]:
+                    raise ValueError(f"Replay snapshot for round {round_number} no longer matches")
+
+            if stop_round is not None and round_number >= stop_round:
+                stopped.append(Replay_Position(self.load(save_state(match)), position[0], checksum_index))
+                raise Replay_Stop()
+
+        match.round_listener = round_starting
+
+        steps = match.steps()
+        try:
+            decision = next(steps)
+            while True:
+                answer, position[0] = self.read_decision(match, decision, position[0])
+                decision = steps.send(answer)
+
+        except StopIteration as finished:
+            result = finished.value
+
+        except Replay_Stop:
+            return stopped[0]
+
+        if verify:
+            winner = match.roster.ids[result.winner] if result.winner is not None else -1
+
+            if (winner, result.rounds, result.turns, result_checksum(match, result)) != (self.winner, self.rounds, self.turns, self.result_checksum):
+                raise ValueError("Replay result no longer matches")
+
+        if stop_round is not None:
+            raise ValueError(f"The match ended before round {stop_round}")
+
+        return result
+
+    # Makes a match from the roster and puts it into a saved state
+    def load(self, state):
+        match = self.new_match()
+        load_state(match, state)
+        return match
+
+    # Re-simulates the whole match and returns its Match_Result, raising a ValueError if it no longer matches
+    def play(self, verify = True):
+        return self.run(Replay_Position(self.new_match(), 0, 0), verify = verify)
+
+    # Returns a Replay_Position just before the given round starts
+    # Playback starts from the latest snapshot before that round, so earlier rounds don't need to be played again
+    def seek(self, round_number, verify = True):
+        position = Replay_Position(self.new_match(), 0, 0)
+
+        if round_number <= 1:
+            return position
+
+        for snapshot_round, decision_offset, rounds_played, state in self.snapshots:
+            if snapshot_round <= round_number:
+                position = Replay_Position(self.load(state), decision_offset, rounds_played)
+
+                if snapshot_round == round_number:
+                    return position
+
+        return self.run(position, round_number, verify)
+
+    # Plays a match on to the end from a Replay_Position
+    def resume(self, position, verify = True):
+        return self.run(position, verify = verify)
+
+# Writes replays to a file, each one after its length so they can be skipped through
+def write_replays(path, replays):
+    with open(path, "wb") as file:
+        for data in replays:
+            file.write(struct.pack("<I", len(data)))
+            file.write(data)
+
+# Reads each replay's bytes from a file written by write_replays()
+def read_replays(path):
+    with open(path, "rb") as file:
+        while True:
+            length = file.read(4)
+            if len(length) < 4:
+                break
+
+            yield file.read(struct.unpack("<I", length)[0])
+
+# Returns everything about a match between two rounds which playback has to get back exactly, read straight...
+#...from the match rather than through save_state(), so it can be used to check seek()
+# Health and effect powers are given with their types, as an int and a float of the same value print differently
+def describe_match(match):
+    players = []
+    for player in match.roster.players:
+        effects = tuple((effect.name, effect.power_key, effect.power, type(effect.power), effect.expires_on) for effect in player.status_fx)
+        staggered = tuple((stag_move.move.name, stag_move.user.name, tuple(target.name for target in stag_move.targets), stag_move.ready_on, stag_move.block_use_move) for stag_move in player.staggered_moves)
+
+        players.append((player.name, player.health, type(player.health), player.turn_number, player.get_true_speed(), player.burn_total,
+                        player.damage_taken_multiplier, player.attack_multiplier, player.blocking_moves, effects, staggered, player.format_self()))
+
+    # A match that hasn't started yet makes its timeline queue when it does, so there's only a queue to compare after that
+    queue = None
+    if match.initiative == "timeline" and match.initiative_queue is not None and match.round_count > 0:
+        queue = (match.initiative_queue.now, sorted(match.initiative_queue.keys.values()))
+
+    return (match.round_count, match.turn_count, match.rng.position(), match.active_names(), dict(match.team_sizes), queue, players)
+
+# Records random matches of mixed classes, teams and initiative modes, then plays each replay back, seeks to...
+#...every round and checks the match found there against the live match at the start of that round, and...
+#...resumes from it to the end
+# Returns the number of seeks made and a list of (seed, problem) for replays that didn't match
+def check_replays(matches = 300, seed = 0):
+    rng = Roll_Stream(seed)
+    failures = []
+    seeks = 0
+
+    for i in range(matches):
+        roster, teams = random_roster(rng)
+        if teams is not None:
+            teams = {name: str(team) for name, team in teams.items()}
+
+        match = Match(roster, seed = seed + i, teams = teams, initiative = INITIATIVE_MODES[i % 3])
+        recorder = Replay_Recorder(match)
+
+        # Every round start of the live match, as {round: describe_match()}
+        live = {}
+        def round_starting(match, round_number, record = recorder.round_starting):
+            record(match, round_number)
+            live[round_number] = describe_match(match)
+
+        match.round_listener = round_starting
+
+        steps = match.steps()
+        try:
+            decision = next(steps)
+            while True:
+                answer = match.decide(decision)
+                recorder.record(decision, answer)
+                decision = steps.send(answer)
+
+        except StopIteration as finished:
+            result = finished.value
+
+        try:
+            replay = Replay(recorder.to_bytes(result))
+
+            if replay.play() != result:
+                raise ValueError("Replay gave a different result")
+
+            for round_number in sorted(live):
+                position = replay.seek(round_number)
+                seeks += 1
+
+                if describe_match(position.match) != live[round_number]:
+                    raise ValueError(f"Seeking to round {round_number} gave {describe_match(position.match)}, the match had {live[round_number]}")
+
+                if replay.resume(position) != result:
+                    raise ValueError(f"Resuming from round {round_number} gave a different result")
+
+        except ValueError as error:
+            failures.append((seed + i, str(error)))
+
+    return seeks, failures
+
+# Usage:
+#   python Battle_game_replay.py record <file> <matches> <class> <class> [...] [--initiative round|timeline]
+#   python Battle_game_replay.py verify <file>
+#   python Battle_game_replay.py seek <file> <replay number> <round>
+#   python Battle_game_replay.py check [<matches>]
+# check records random matches and seeks to every round of each, exiting with status 1 if any replay didn't match
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    if args[0] == "check":
+        num_matches = int(args[1]) if len(args) > 1 else 300
+
+        start = time.perf_counter()
+        seeks, failures = check_replays(num_matches)
+        elapsed = time.perf_counter() - start
+
+        for failed_seed, problem in failures[:10]:
+            print(f"Seed {failed_seed}: {problem}")
+
+        print(f"Recorded {num_matches} matches and made {seeks} seeks in {elapsed:.2f}s, {len(failures)} replays didn't match")
+        sys.exit(1 if failures else 0)
+
+    initiative = None
+    if "--initiative" in args:
+        i = args.index("--initiative")
+        initiative = args[i + 1]
+        del args[i:i + 2]
+
+    command, path = args[0], args[1]
+
+    if command == "record":
+        num_matches = int(args[2])
+        roster = [(f"{class_name} {i + 1}", class_name) for i, class_name in enumerate(args[3:] or ["Warrior", "Mage"])]
+
+        start = time.perf_counter()
+        replays = [record_match(roster, seed = i, initiative = initiative)[1] for i in range(num_matches)]
+        elapsed = time.perf_counter() - start
+
+        write_replays(path, replays)
+        total = sum(len(data) for data in replays)
+        print(f"Recorded {num_matches} matches in {elapsed:.2f}s, {total / num_matches:.0f} bytes per match")
+
+    elif command == "verify":
+        start = time.perf_counter()
+        count = 0
+        failures = 0
+
+        for i, data in enumerate(read_replays(path)):
+            count += 1
+
+            try:
+                Replay(data).play()
+
+            except ValueError as error:
+                failures += 1
+                print(f"Replay {i}: {error}")
+
+        elapsed = time.perf_counter() - start
+        print(f"Checked {count} replays in {elapsed:.2f}s ({count / elapsed:.0f} per second), {failures} no longer match")
+
+    elif command == "seek":
+        index, round_number = int(args[2]), int(args[3])
+        data = list(read_replays(path))[index]
+
+        position = Replay(data).seek(round_number)
+        print(f"Before round {round_number}:")
+        for player in position.match.roster.players:
+            print(player.format_self())
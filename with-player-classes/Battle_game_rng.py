@@ -0,0 +1,200 @@
+import sys
+import time
+import threading
+
+import numpy as np
+
+# Random numbers for every roll the game makes, handed out from blocks made by NumPy
+# Each Roll_Stream is a counter-based Philox stream picked out by a seed and a stream key, e.g. (seed, RULES_STREAM)...
+#...for the rules of a match or (seed, worker number) for a worker process
+# Philox works out the numbers at any position straight from a counter, so a block can be made without...
+#...making the ones before it. A stream can be saved as just its position and jumped back to later, and the...
+#...numbers don't depend on the block size
+# To reproduce anything made with a stream, all that is needed is its seed, key and position
+
+# Stream keys used by matches
+RULES_STREAM = 0
+POLICY_STREAM = 1
+
+# Streams make their blocks with a Philox bit generator kept by each thread, by setting its key and counter first
+# Making a Philox costs far more than the few rolls a short match needs, and streams are made for every match
+# Setting the state and drawing the block are two steps, so streams used from different threads can't share...
+#...one Philox without mixing up each other's blocks
+thread_state = threading.local()
+
+# Returns this thread's (Philox, Generator drawing from it, counter, buffer), making them on first use
+# The counter and buffer are handed to the Philox, and are filled in again for each block instead of being made
+def thread_philox():
+    try:
+        return thread_state.philox
+
+    except AttributeError:
+        philox = np.random.Philox(0)
+        thread_state.philox = (philox, np.random.Generator(philox), np.zeros(4, dtype = np.uint64), np.zeros(4, dtype = np.uint64))
+        return thread_state.philox
+
+# SplitMix64's mixing step, used to turn a seed and stream key into a Philox key
+def mix64(x):
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+# Returns the 128-bit Philox key of a seed and stream key, as 2 64-bit words
+# This is a SplitMix64 hash in plain Python, as SeedSequence takes tens of microseconds and a match makes 2 streams
+# The seed is split into 64-bit words, and the number of words is hashed in too so no two keys run together
+def stream_key(seed, stream):
+    if seed < 0 or any(part < 0 for part in stream):
+        raise ValueError("Seeds and stream keys must not be negative")
+
+    words = [seed & 0xFFFFFFFFFFFFFFFF]
+    seed >>= 64
+    while seed > 0:
+        words.append(seed & 0xFFFFFFFFFFFFFFFF)
+        seed >>= 64
+
+    state = 0
+    for word in (len(words), *words, len(stream), *stream):
+        state = mix64((state + word + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF)
+
+    return [mix64((state + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF), mix64((state + 0x3C6EF372FE94F82A) & 0xFFFFFFFFFFFFFFFF)]
+
+# How many numbers the first block after a start or a seek has. Each block after it is twice the size of the one...
+#...before, up to the stream's block_size, so short matches don't make numbers they never use
+FIRST_BLOCK = 32
+
+class Roll_Stream:
+
+    # seed is a whole number, or None to pick one from the operating system (it is kept in self.seed)
+    # stream is a whole number or tuple of whole numbers, so each seed can have any number of separate streams
+    # block_size is the most numbers made at once, and must be a multiple of 4
+    def __init__(self, seed = None, stream = (), block_size = 1024):
+        if block_size <= 0 or block_size % 4 != 0:
+            raise ValueError("block_size must be a positive multiple of 4")
+
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+
+        if isinstance(stream, int):
+            stream = (stream,)
+
+        self.seed = seed
+        self.stream = tuple(stream)
+        self.block_size = block_size
+
+        # Philox has a 128-bit key, which is taken from the seed and stream key
+        self.key = np.array(stream_key(seed, self.stream), dtype = np.uint64)
+
+        # The numbers from position start onwards, and the index of the next one to use
+        self.start = 0
+        self.block = []
+        self.index = 0
+
+    # Makes size random numbers between 0 and 1, starting at the given position, which must be a multiple of 4
+    # Each step of the Philox counter makes 4 numbers, so position n is n / 4 steps in
+    def load_block(self, start, size):
+        steps = start // 4
+        philox, generator, counter, buffer = thread_philox()
+
+        counter[0] = steps & 0xFFFFFFFFFFFFFFFF
+        counter[1] = steps >> 64
+
+        philox.state = {"bit_generator": "Philox", "state": {"counter": counter, "key": self.key},
+                        "buffer": buffer, "buffer_pos": 4, "has_uint32": 0, "uinteger": 0}
+
+        self.block = generator.random(size).tolist()
+        self.start = start
+        self.index = 0
+
+    # Makes the block after the current one
+    def next_block(self):
+        self.load_block(self.start + len(self.block), min(2 * len(self.block) or FIRST_BLOCK, self.block_size))
+
+    # Returns how many numbers have been used
+    def position(self):
+        return self.start + self.index
+
+    # Carries on from a position returned by position()
+    def seek(self, position):
+        if not self.start <= position <= self.start + len(self.block):
+            self.load_block(position - position % 4, min(FIRST_BLOCK, self.block_size))
+
+        self.index = position - self.start
+
+    # Same as random.random
+    def random(self):
+        index = self.index
+
+        if index == len(self.block):
+            self.next_block()
+            index = 0
+
+        self.index = index + 1
+        return self.block[index]
+
+    # Same as random.randint, rolling a whole number from a to b inclusive
+    def randint(self, a, b):
+        index = self.index
+
+        if index == len(self.block):
+            self.next_block()
+            index = 0
+
+        self.index = index + 1
+        return a + int(self.block[index] * (b - a + 1))
+
+    def choice(self, sequence):
+        return sequence[int(self.random() * len(sequence))]
+
+    # Shuffles a list in place with the Fisher-Yates shuffle
+    def shuffle(self, items):
+        for i in range(len(items) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            items[i], items[j] = items[j], items[i]
+
+    # Returns k different items from population, in the order they were picked
+    # This is a Fisher-Yates shuffle stopped after k swaps, which keeps only the swapped positions in a dictionary...
+    #...so population isn't copied and only the k items picked are looked up. It can be any sequence, e.g. a roster view
+    def sample(self, population, k):
+        size = len(population)
+
+        if k > size:
+            raise ValueError("Sample larger than population")
+
+        # {position: index of the item now at that position}, for positions which have been swapped
+        swapped = {}
+        picked = []
+
+        for i in range(k):
+            j = i + int(self.random() * (size - i))
+            picked.append(population[swapped.get(j, j)])
+            swapped[j] = swapped.get(i, i)
+
+        return picked
+
+    # Returns a new stream with the same seed and a longer key, e.g. for one worker out of many
+    def spawn(self, *stream):
+        return Roll_Stream(self.seed, self.stream + stream, self.block_size)
+
+    def __repr__(self):
+        return f"Roll_Stream(seed = {self.seed}, stream = {self.stream}, position = {self.position()})"
+
+# Usage: python Battle_game_rng.py [--rolls N]
+# Times rolling 1-100 with a Roll_Stream and with the random module
+if __name__ == "__main__":
+    import random
+
+    args = sys.argv[1:]
+
+    num_rolls = 1000000
+    if "--rolls" in args:
+        num_rolls = int(args[args.index("--rolls") + 1])
+
+    for name, rng in (("Roll_Stream", Roll_Stream(0)), ("random.Random", random.Random(0))):
+        randint = rng.randint
+
+        start = time.perf_counter()
+        for i in range(num_rolls):
+            randint(1, 100)
+
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {1e9 * elapsed / num_rolls:.0f} ns per roll")
@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import marshal
+import hashlib
+import tomllib
+
+from Battle_game_classes import Move, Attack_Class, all_classes, effect_compilers
+
+# Loads moves and classes from JSON or TOML rulesets instead of the ones written in Battle_game_classes
+# A ruleset has a list of moves, with the same fields as Move, and a list of classes which use them by name:
+#
+# {"moves": [{"name": "Sword slash", "move_type": "Melee", "effect": {"Damage": {"value": 20}}, "accuracy": 90,
+#             "crit_info": {"chance": 20, "crit_effect": 1.5}, "targets": 1, "description": "...", "stagger": null}],
+#  "classes": [{"name": "Warrior", "speed": 50, "health": 100, "moves": ["Sword slash"]}]}
+#
+# Run "python Battle_game_rules.py export rules.json" for a full example with every built in move and class
+#
+# Loading a ruleset is cached twice over:
+# - Each validated ruleset is saved in a __rulescache__ folder next to it, named by the hash of the file,...
+#...so a ruleset that hasn't changed is never parsed or validated again
+# - Each process remembers the classes it has built for each file, so loading an unchanged file again only...
+#...costs an os.stat()
+# Classes are switched by changing all_classes in place, so every module using it sees the new ruleset...
+#...without being imported again. This is how worker processes change ruleset between jobs
+
+# Bumped whenever the cache format or validation changes, so old cache files are ignored
+CACHE_VERSION = 1
+CACHE_MAGIC = b"BGRS"
+
+# The properties each built in effect needs
+effect_properties = {
+    "Damage": ("value",),
+    "Heal": ("value",),
+    "+Attack": ("percentage", "duration"),
+    "-Attack": ("percentage", "duration"),
+    "+Speed": ("value", "duration"),
+    "-Speed": ("value", "duration"),
+    "Protection": ("value", "duration"),
+    "Weakness": ("value", "duration"),
+    "Burning": ("value", "duration"),
+}
+
+move_fields = ("name", "move_type", "effect", "accuracy", "crit_info", "targets", "description", "stagger")
+class_fields = ("name", "speed", "health", "moves")
+
+# The classes written in Battle_game_classes, so they can be switched back to
+default_classes = dict(all_classes)
+
+# {path: (modified time, size, classes)} for every ruleset file this process has loaded
+loaded_rulesets = {}
+
+# Raised when a ruleset doesn't match the schema. The message says where the problem is
+class Ruleset_Error(ValueError):
+    pass
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def check(condition, where, message):
+    if not condition:
+        raise Ruleset_Error(f"{where}: {message}")
+
+def check_fields(entry, fields, required, where):
+    check(isinstance(entry, dict), where, "must be an object")
+
+    for key in entry:
+        check(key in fields, where, f"unknown field {key}")
+
+    for key in required:
+        check(key in entry, where, f"missing field {key}")
+
+def validate_effect(name, props, where):
+    check(name in effect_compilers, where, f"unknown effect {name}")
+    check(isinstance(props, dict), where, "must be an object of properties")
+
+    for key, value in props.items():
+        check(is_number(value), f"{where}.{key}", "must be a number")
+
+    for key in effect_properties.get(name, ()):
+        check(key in props, where, f"missing property {key}")
+
+    if "duration" in props:
+        check(isinstance(props["duration"], int) and props["duration"] >= 0, f"{where}.duration", "must be a whole number of turns, 0 or more")
+
+# Checks a move and returns it with every field filled in
+def validate_move(move, where):
+    check_fields(move, move_fields, ("name", "move_type", "effect", "accuracy", "crit_info", "targets"), where)
+
+    name = move["name"]
+    check(isinstance(name, str) and name != "", f"{where}.name", "must be a name")
+    check(isinstance(move["move_type"], str), f"{where}.move_type", "must be text, e.g. Melee or Ranged")
+
+    check(isinstance(move["effect"], dict), f"{where}.effect", "must be an object of {effect: {property: value}}")
+    for effect, props in move["effect"].items():
+        validate_effect(effect, props, f"{where}.effect.{effect}")
+
+    accuracy = move["accuracy"]
+    check(accuracy is True or (is_number(accuracy) and 0 <= accuracy <= 100), f"{where}.accuracy", "must be a chance from 0 to 100, or true if it can't miss")
+
+    crit_info = move["crit_info"]
+    if crit_info is not False:
+        check_fields(crit_info, ("chance", "crit_effect"), ("chance", "crit_effect"), f"{where}.crit_info")
+        check(is_number(crit_info["chance"]) and 0 <= crit_info["chance"] <= 100, f"{where}.crit_info.chance", "must be a chance from 0 to 100")
+        check(is_number(crit_info["crit_effect"]), f"{where}.crit_info.crit_effect", "must be a number")
+
+    targets = move["targets"]
+    check(targets in ("Self", "All", "All others") or (isinstance(targets, int) and not isinstance(targets, bool) and targets > 0),
+          f"{where}.targets", "must be a number of targets, Self, All or All others")
+
+    description = move.get("description", "")
+    check(isinstance(description, str), f"{where}.description", "must be text")
+
+    stagger = move.get("stagger")
+    if stagger is not None:
+        check(isinstance(stagger, list) and len(stagger) == 2 and isinstance(stagger[0], int) and not isinstance(stagger[0], bool)
+              and stagger[0] >= 0 and isinstance(stagger[1], bool), f"{where}.stagger", "must be [turns, whether it blocks other moves]")
+
+    return {"name": name, "move_type": move["move_type"], "effect": move["effect"], "accuracy": accuracy, "crit_info": crit_info,
+            "targets": targets, "description": description, "stagger": stagger}
+
+# Checks a whole ruleset and returns it with every field filled in
+# Raises Ruleset_Error if anything is wrong
+def validate_ruleset(data):
+    check_fields(data, ("moves", "classes"), ("moves", "classes"), "ruleset")
+    check(isinstance(data["moves"], list), "moves", "must be a list")
+    check(isinstance(data["classes"], list) and len(data["classes"]) > 0, "classes", "must be a list of at least 1 class")
+
+    moves = []
+    move_names = set()
+
+    for i, move in enumerate(data["moves"]):
+        move = validate_move(move, f"moves[{i}]")
+        check(move["name"] not in move_names, f"moves[{i}].name", f"{move['name']} is defined more than once")
+
+        move_names.add(move["name"])
+        moves.append(move)
+
+    classes = []
+    class_names = set()
+
+    for i, atk_class in enumerate(data["classes"]):
+        where = f"classes[{i}]"
+        check_fields(atk_class, class_fields, class_fields, where)
+
+        name = atk_class["name"]
+        check(isinstance(name, str) and name != "", f"{where}.name", "must be a name")
+        check(name not in class_names, f"{where}.name", f"{name} is defined more than once")
+        check(is_number(atk_class["speed"]), f"{where}.speed", "must be a number")
+        check(is_number(atk_class["health"]) and atk_class["health"] > 0, f"{where}.health", "must be a number above 0")
+        check(isinstance(atk_class["moves"], list) and len(atk_class["moves"]) > 0, f"{where}.moves", "must be a list of at least 1 move name")
+
+        for move_name in atk_class["moves"]:
+            check(move_name in move_names, f"{where}.moves", f"{move_name} isn't one of the moves")
+
+        class_names.add(name)
+        classes.append({"name": name, "speed": atk_class["speed"], "health": atk_class["health"], "moves": list(atk_class["moves"])})
+
+    return {"moves": moves, "classes": classes}
+
+# Builds {class name: Attack_Class} from a validated ruleset
+def build_classes(data):
+    moves = {move["name"]: Move(**move) for move in data["moves"]}
+
+    return {atk_class["name"]: Attack_Class(atk_class["name"], [moves[name] for name in atk_class["moves"]], atk_class["speed"], atk_class["health"])
+            for atk_class in data["classes"]}
+
+# Returns the ruleset for a set of classes, e.g. to save the built in classes as a file
+def ruleset_data(classes):
+    moves = []
+    move_names = set()
+
+    for atk_class in classes.values():
+        for move in atk_class.move_list:
+            if move.name not in move_names:
+                move_names.add(move.name)
+                moves.append({field: getattr(move, field) for field in move_fields})
+
+    return {"moves": moves,
+            "classes": [{"name": atk_class.name, "speed": atk_class.speed, "health": atk_class.health, "moves": list(atk_class.move_set)}
+                        for atk_class in classes.values()]}
+
+# Parses a ruleset file, which can be JSON or TOML depending on its extension
+def parse_ruleset(path, raw):
+    try:
+        if path.endswith(".toml"):
+            return tomllib.loads(raw.decode())
+
+        return json.loads(raw)
+
+    except (ValueError, UnicodeDecodeError) as error:
+        raise Ruleset_Error(f"{path}: {error}")
+
+def cache_path(path, raw, cache_dir):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "__rulescache__")
+
+    digest = hashlib.sha256(CACHE_MAGIC + bytes([CACHE_VERSION]) + raw).hexdigest()
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{digest[:32]}.bin")
+
+# Returns the validated ruleset in a file, from its cache file if it hasn't changed since it was last validated
+def read_ruleset(path, cache_dir = None):
+    with open(path, "rb") as file:
+        raw = file.read()
+
+    cached = cache_path(path, raw, cache_dir)
+
+    try:
+        with open(cached, "rb") as file:
+            data = file.read()
+
+        if data[:4] == CACHE_MAGIC:
+            return marshal.loads(data[4:])
+
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+
+    data = validate_ruleset(parse_ruleset(path, raw))
+
+    # The cache is only a speed up, so it doesn't matter if it can't be written
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok = True)
+
+        temp_path = f"{cached}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(CACHE_MAGIC + marshal.dumps(data))
+
+        os.replace(temp_path, cached)
+
+    except OSError:
+        pass
+
+    return data
+
+# Returns {class name: Attack_Class} for a ruleset file
+# Loading the same unchanged file again in the same process returns the same classes
+def load_ruleset(path, cache_dir = None):
+    path = os.path.abspath(path)
+    info = os.stat(path)
+
+    loaded = loaded_rulesets.get(path)
+    if loaded is not None and loaded[0] == info.st_mtime_ns and loaded[1] == info.st_size:
+        return loaded[2]
+
+    classes = build_classes(read_ruleset(path, cache_dir))
+    loaded_rulesets[path] = (info.st_mtime_ns, info.st_size, classes)
+
+    return classes
+
+# Makes all_classes hold the given classes, so new players and matches use them
+def use_ruleset(classes):
+    if all_classes == classes:
+        return
+
+    all_classes.clear()
+    all_classes.update(classes)
+
+# Switches to the ruleset in a file, or back to the built in classes if path is None
+def select_ruleset(path = None, cache_dir = None):
+    if path is None:
+        use_ruleset(default_classes)
+
+    else:
+        use_ruleset(load_ruleset(path, cache_dir))
+
+# Usage:
+# python Battle_game_rules.py export <file>   Saves the built in moves and classes as a JSON ruleset
+# python Battle_game_rules.py check <file>    Validates a ruleset and lists its classes
+# python Battle_game_rules.py time <file>     Times loading a ruleset with and without its caches
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    if len(args) != 2 or args[0] not in ("export", "check", "time"):
+        print("Usage: python Battle_game_rules.py export|check|time <file>")
+        sys.exit(1)
+
+    command, path = args
+
+    if command == "export":
+        with open(path, "w") as file:
+            json.dump(ruleset_data(default_classes), file, indent = 2)
+
+        print(f"Saved {len(default_classes)} classes to {path}")
+
+    elif command == "check":
+        try:
+            classes = load_ruleset(path)
+
+        except Ruleset_Error as error:
+            print(f"Invalid ruleset: {error}")
+            sys.exit(1)
+
+        for atk_class in classes.values():
+            print(f"{atk_class.name}: {atk_class.health} HP, {atk_class.speed} speed, moves: {', '.join(atk_class.move_set)}")
+
+    else:
+        with open(path, "rb") as file:
+            raw = file.read()
+
+        def time_call(call, repeats):
+            start = time.perf_counter()
+            for i in range(repeats):
+                call()
+
+            return (time.perf_counter() - start) / repeats * 1e6
+
+        uncached = time_call(lambda: build_classes(validate_ruleset(parse_ruleset(path, raw))), 200)
+        read_ruleset(path)
+        file_cached = time_call(lambda: build_classes(read_ruleset(path)), 200)
+        load_ruleset(path)
+        memory_cached = time_call(lambda: load_ruleset(path), 10000)
+
+        print(f"Parse, validate and build: {uncached:.1f} us")
+        print(f"From the cache file: {file_cached:.1f} us")
+        print(f"Already loaded in this process: {memory_cached:.2f} us")
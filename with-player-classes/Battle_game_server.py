@@ -0,0 +1,508 @@
+import sys
+import asyncio
+
+from Battle_game_classes import all_classes, summary_limit, format_accuracy, check_if_info_req, get_true_accuracy
+from Battle_game_events import Event_Buffer, Terminal_Renderer
+from Battle_game_headless import Match, Random_Policy
+
+# Hosts matches over a line based TCP protocol, with every match sharing one asyncio event loop
+# Each match keeps its own state in a headless Match, and the players in it are asked for moves and targets...
+#...the same way as select_move and select_target, with pauses between events made by asyncio.sleep()
+
+# Protocol:
+# The client sends one command or answer per line, and the server sends back lines of text
+# Lines starting with "? " are prompts, which the client must answer with one line
+# Lines starting with "! " are errors
+# Outside of a match, the commands are:
+# - NEW <seat> [<seat> ...] starts a match. Each seat is name:class for a player this connection controls...
+#...name:class:cpu for a computer player, or name:class:open for a seat another connection can take
+# - JOIN <match id> [<name>] takes an open seat in a match, by name or the first one free
+# - LIST shows matches with open seats
+# - CLASSES shows the classes which can be used
+# - QUIT disconnects
+# A match starts once all of its seats are taken. The server sends "MATCH <id>" when a connection joins a match...
+#...and "END <id>" once it is over
+
+help_text = """Commands:
+NEW <seat> [<seat> ...]   Start a match. Seats are name:class, name:class:cpu or name:class:open
+JOIN <match id> [<name>]  Take an open seat in a match
+LIST                      Show matches with open seats
+CLASSES                   Show the classes you can play as
+QUIT                      Disconnect"""
+
+# One client connected to the server
+class Connection:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+        # The Hosted_Match the connection is playing in, if any
+        self.match = None
+
+        # Future for the answer to the prompt the connection was last sent, while it is waiting for one
+        self.answer = None
+
+        self.closed = False
+
+    def send(self, text):
+        if self.closed:
+            return
+
+        self.writer.write((text + "\n").encode())
+
+    async def flush(self):
+        if self.closed:
+            return
+
+        try:
+            await self.writer.drain()
+
+        except ConnectionError:
+            self.close()
+
+    # Sends a prompt and waits for the answer
+    # Raises ConnectionError if the client disconnects first
+    async def ask(self, prompt):
+        if self.closed:
+            raise ConnectionError("Connection closed")
+
+        self.send(f"? {prompt}")
+        await self.flush()
+
+        self.answer = asyncio.get_running_loop().create_future()
+        try:
+            return await self.answer
+
+        finally:
+            self.answer = None
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.writer.close()
+
+        if self.answer is not None and not self.answer.done():
+            self.answer.set_exception(ConnectionError("Connection closed"))
+
+# A match being played on the server
+# seats is a dictionary of {name: Connection}, with None for computer players and "open" for seats nobody has taken yet
+class Hosted_Match:
+
+    def __init__(self, match_id, roster, seats, game_speed = 1):
+        self.match_id = match_id
+        self.roster = roster
+        self.seats = seats
+        self.game_speed = game_speed
+
+        self.events = Event_Buffer()
+        self.renderer = Terminal_Renderer()
+        self.computer_policy = Random_Policy()
+        self.started = False
+        self.match = None
+
+    def open_seats(self):
+        return [name for name, connection in self.seats.items() if connection == "open"]
+
+    def connections(self):
+        connections = []
+
+        for connection in self.seats.values():
+            if isinstance(connection, Connection) and not connection.closed and connection not in connections:
+                connections.append(connection)
+
+        return connections
+
+    def broadcast(self, text):
+        for connection in self.connections():
+            connection.send(text)
+
+    # Waits for the given number of seconds, scaled by game_speed, unless nobody is watching
+    # Even then it lets the event loop run everything else first, so a match nobody is watching doesn't hold up...
+    #...every other match and connection until it finishes
+    async def pause(self, seconds):
+        if self.game_speed > 0 and seconds > 0 and len(self.connections()) > 0:
+            await asyncio.sleep(seconds / self.game_speed)
+
+        else:
+            await asyncio.sleep(0)
+
+    # Sends out everything that has happened since the last time, pausing after each event as the game does
+    async def show_events(self):
+        for event in self.events.drain():
+            text, pause = self.renderer.format_event(event)
+
+            if text is not None:
+                self.broadcast(text)
+                await self.pause(pause)
+
+        for connection in self.connections():
+            await connection.flush()
+
+    # Plays the match to the end
+    async def play(self):
+        self.match = Match(self.roster, events = self.events)
+        self.broadcast(f"Match {self.match_id} is starting!")
+
+        steps = self.match.steps()
+
+        try:
+            decision = next(steps)
+            while True:
+                await self.show_events()
+                decision = steps.send(await self.decide(decision))
+
+        except StopIteration as finished:
+            result = finished.value
+
+        await self.show_events()
+
+        self.broadcast("\n=======================================")
+        if result.winner is not None:
+            self.broadcast(f"{result.winner} wins!")
+
+        elif result.winning_team is not None:
+            self.broadcast(f"Team {result.winning_team} wins!")
+
+        else:
+            self.broadcast(f"The match is a draw after {result.rounds} rounds")
+
+        for connection in self.connections():
+            connection.send(f"END {self.match_id}")
+            connection.match = None
+            await connection.flush()
+
+        return result
+
+    # Asks the seat's connection for the decision, or the computer if nobody is in the seat
+    # If the connection drops part way through the match, the computer takes over the seat
+    async def decide(self, decision):
+        connection = self.seats[decision.player.name]
+
+        if isinstance(connection, Connection) and not connection.closed:
+            try:
+                if decision.kind == "move":
+                    return await self.select_move(connection, decision)
+
+                return await self.select_target(connection, decision)
+
+            except ConnectionError:
+                self.seats[decision.player.name] = None
+
+        # Computer decisions don't wait on anything, so give the other matches a turn
+        await asyncio.sleep(0)
+
+        if decision.kind == "move":
+            return self.computer_policy.choose_move(decision.player, decision.options, self.match)
+
+        return self.computer_policy.choose_targets(decision.player, decision.move, decision.options, decision.count, self.match)
+
+    # Same as select_move, over the connection
+    async def select_move(self, connection, decision):
+        player = decision.player
+        moves = decision.options
+
+        # Show the player's summary, and everyone else's if there aren't too many to read
+        active = self.match.roster.turn_order()
+        connection.send(f"\n------ {player.name}'s turn ------")
+
+        if len(active) <= summary_limit:
+            for p in active:
+                connection.send(p.format_self())
+
+        else:
+            connection.send(player.format_self())
+            connection.send(f"...and {len(active) - 1} other players")
+
+        for stag_move in player.staggered_moves:
+            connection.send(f"{player.name} is charging a {stag_move.move.name}")
+
+        while True:
+            connection.send("CHOOSE YOUR MOVE")
+            for i, move in enumerate(moves):
+                connection.send(f"{i + 1}: {move.name} --- {move.description}")
+
+            is_info_req, choice = check_if_info_req(await connection.ask("Which move would you like to use? Type 'INFO <choice>' to get information about that move."))
+            move = None
+
+            if choice == "":
+                connection.send("! NOTHING ENTERED: You must enter a move to use")
+
+            elif choice.isnumeric():
+                if int(choice) in range(1, len(moves) + 1):
+                    move = moves[int(choice) - 1]
+
+                else:
+                    connection.send(f"! INVALID NUMBER: You must either enter the move name or a number from 1 to {len(moves)}")
+
+            else:
+                move = next((move for move in moves if move.name == choice.capitalize()), None)
+
+                if move is None:
+                    connection.send(f"! INVALID INPUT: {choice} is not in your move set")
+
+            if move is not None:
+                if not is_info_req:
+                    return move
+
+                connection.send(move.format_self())
+
+    # Same as select_target, over the connection
+    async def select_target(self, connection, decision):
+        player = decision.player
+        move = decision.move
+        possible_targets = list(decision.options)
+        chosen_targets = []
+
+        while len(chosen_targets) < decision.count:
+            connection.send(f"Choose {decision.count - len(chosen_targets)} more target(s) for {move.name}")
+            for i, target in enumerate(possible_targets):
+                connection.send(f"{i + 1}: {target.name}")
+
+            is_info_req, choice = check_if_info_req(await connection.ask("Who would you like to target? Type 'INFO <choice>' to see how accurate the move will be on them."))
+            target = None
+
+            if choice.isnumeric():
+                if int(choice) in range(1, len(possible_targets) + 1):
+                    target = possible_targets[int(choice) - 1]
+
+                else:
+                    connection.send(f"! INVALID NUMBER: You must only enter a number between 1 and {len(possible_targets)} (inclusive)")
+
+            else:
+                target = next((target for target in possible_targets if target.name == choice), None)
+
+                if target is None:
+                    connection.send("! INVALID TARGET: You must enter a player name with correct casing or corresponding number")
+
+            if target is None:
+                continue
+
+            if is_info_req:
+                connection.send(target.format_self())
+                connection.send(f"Baseline chance of hitting: {format_accuracy(move.accuracy)}")
+                connection.send(f"Actual chance of hitting: {format_accuracy(get_true_accuracy(move, player, target))}")
+
+            else:
+                chosen_targets.append(target)
+                possible_targets.remove(target)
+
+        return chosen_targets
+
+# Accepts connections and keeps track of the matches being played
+class Match_Server:
+
+    def __init__(self, game_speed = 1):
+        self.game_speed = game_speed
+
+        # {match id: Hosted_Match} for matches waiting for players or being played
+        self.matches = {}
+        self.next_match_id = 1
+
+        # Number of matches which have finished
+        self.finished = 0
+
+        # asyncio tasks for the matches being played, kept so they aren't garbage collected
+        self.tasks = set()
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        connection.send("Welcome to the battle game server! Type HELP for a list of commands")
+        await connection.flush()
+
+        try:
+            while not connection.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                line = line.decode().strip()
+
+                # Answers go to whichever match is waiting on them
+                if connection.answer is not None and not connection.answer.done():
+                    connection.answer.set_result(line)
+
+                elif line.upper() == "QUIT":
+                    break
+
+                elif connection.match is not None:
+                    connection.send("! Waiting for the other players")
+
+                else:
+                    self.command(connection, line)
+
+                await connection.flush()
+
+        except ConnectionError:
+            pass
+
+        finally:
+            if connection.match is not None and not connection.match.started:
+                self.leave_lobby(connection)
+
+            connection.close()
+
+    def command(self, connection, line):
+        words = line.split()
+        if len(words) == 0:
+            return
+
+        command = words[0].upper()
+
+        if command == "HELP":
+            connection.send(help_text)
+
+        elif command == "CLASSES":
+            connection.send(", ".join(all_classes))
+
+        elif command == "LIST":
+            waiting = [hosted for hosted in self.matches.values() if not hosted.started]
+
+            for hosted in waiting:
+                connection.send(f"{hosted.match_id}: {', '.join(hosted.open_seats())}")
+
+            if len(waiting) == 0:
+                connection.send("No matches are waiting for players")
+
+        elif command == "NEW":
+            self.new_match(connection, words[1:])
+
+        elif command == "JOIN" and len(words) >= 2 and words[1].isnumeric():
+            self.join_match(connection, int(words[1]), words[2] if len(words) > 2 else None)
+
+        else:
+            connection.send(f"! Unknown command {line}. Type HELP for a list of commands")
+
+    def new_match(self, connection, seat_args):
+        roster = []
+        seats = {}
+
+        for seat in seat_args:
+            parts = seat.split(":")
+
+            if len(parts) not in (2, 3) or parts[1] not in all_classes or (len(parts) == 3 and parts[2] not in ("cpu", "open")):
+                connection.send(f"! INVALID SEAT: {seat} must be name:class, name:class:cpu or name:class:open")
+                return
+
+            if parts[0] in seats:
+                connection.send("! INVALID PLAYER NAME: You cannot enter the same name more than once")
+                return
+
+            roster.append((parts[0], parts[1]))
+
+            if len(parts) == 2:
+                seats[parts[0]] = connection
+
+            elif parts[2] == "cpu":
+                seats[parts[0]] = None
+
+            else:
+                seats[parts[0]] = "open"
+
+        if len(roster) < 2:
+            connection.send("! INVALID PLAYER COUNT: You must enter 2 or more players")
+            return
+
+        hosted = Hosted_Match(self.next_match_id, roster, seats, self.game_speed)
+        self.matches[hosted.match_id] = hosted
+        self.next_match_id += 1
+
+        if connection in seats.values():
+            connection.match = hosted
+
+        connection.send(f"MATCH {hosted.match_id}")
+        self.start_if_ready(hosted)
+
+    def join_match(self, connection, match_id, name):
+        hosted = self.matches.get(match_id)
+
+        if hosted is None or hosted.started:
+            connection.send(f"! Match {match_id} isn't waiting for players")
+            return
+
+        open_seats = hosted.open_seats()
+        if name is None and len(open_seats) > 0:
+            name = open_seats[0]
+
+        if name not in open_seats:
+            connection.send(f"! {name} isn't an open seat in match {match_id}")
+            return
+
+        hosted.seats[name] = connection
+        connection.match = hosted
+        connection.send(f"MATCH {hosted.match_id}")
+
+        hosted.broadcast(f"{name} has joined match {match_id}")
+        self.start_if_ready(hosted)
+
+    # Gives up a connection's seats in a match which hasn't started yet
+    def leave_lobby(self, connection):
+        hosted = connection.match
+
+        for name, seat in hosted.seats.items():
+            if seat is connection:
+                hosted.seats[name] = "open"
+
+        connection.match = None
+
+        if len(hosted.connections()) == 0:
+            del self.matches[hosted.match_id]
+
+    def start_if_ready(self, hosted):
+        if len(hosted.open_seats()) > 0:
+            return
+
+        hosted.started = True
+
+        task = asyncio.get_running_loop().create_task(self.run_match(hosted))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run_match(self, hosted):
+        try:
+            await hosted.play()
+
+        finally:
+            del self.matches[hosted.match_id]
+            self.finished += 1
+
+# Starts a server on the given address and returns the asyncio Server and Match_Server
+async def start_server(host = "127.0.0.1", port = 7777, game_speed = 1):
+    match_server = Match_Server(game_speed)
+    server = await asyncio.start_server(match_server.handle, host, port, limit = 2 ** 16)
+
+    return server, match_server
+
+async def serve(host, port, game_speed):
+    server, match_server = await start_server(host, port, game_speed)
+    print(f"Serving on {host}:{port}")
+
+    async with server:
+        await server.serve_forever()
+
+# Usage: python Battle_game_server.py [--host HOST] [--port PORT] [--speed S]
+# Try it with: nc localhost 7777, then NEW Me:Warrior Them:Mage:cpu
+# A speed of 0 turns the pauses between events off
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    host = "127.0.0.1"
+    port = 7777
+    game_speed = 1
+
+    if "--host" in args:
+        host = args[args.index("--host") + 1]
+
+    if "--port" in args:
+        port = int(args[args.index("--port") + 1])
+
+    if "--speed" in args:
+        game_speed = float(args[args.index("--speed") + 1])
+
+    try:
+        asyncio.run(serve(host, port, game_speed))
+
+    except KeyboardInterrupt:
+        pass
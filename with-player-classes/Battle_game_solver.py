@@ -0,0 +1,733 @@
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from Battle_game_classes import all_classes, effect_multipliers, get_true_accuracy, get_crit_chance, execute_move
+
+# Works out the chances of each outcome of a 1v1 duel, instead of estimating them with random matches
+# A duel is a Markov chain. Each state holds both players' HP, status FX and staggered moves, and whose turn...
+#...it is. The chance of moving between states comes from get_true_accuracy and get_crit_chance, and each hit...
+#...is applied by the move's compiled effect handlers through execute_move, the same as in a match
+# The turn rules are the same as the headless Match, so a player knocked out by burning loses straight away
+# There is no round limit. Duels between classes which can't heal are solved exactly, and take a few seconds...
+#...each. Healing lets HP grow without limit, so those duels are cut off at max_health (see Duel_Solver): their...
+#...win and loss chances are lower bounds, and the draw chance is how much of the duel was cut off. They take...
+#...tens of seconds each, and most of the few minutes the whole table takes
+
+# HP is never used by the rules except to check for knockouts, so states are split into two parts:
+# - A config, which is (acting player, (status FX, staggered moves) of each player)
+# - Both players' HP
+# The outcomes of a turn are worked out (and memoised) once per config, as changes to HP along with the...
+#...knockout checks made on the way. Every state with that config then reuses them with NumPy
+# The duel is then solved backwards: the value of each state (its chances of each outcome) is memoised in...
+#...an array and worked out from the values of the states its turns lead to
+
+# win, loss and draw are from the first player's point of view
+# draw is the chance of the duel being cut off, and expected_rounds is the average number of rounds it lasts
+Duel_Result = namedtuple("Duel_Result", ["win", "loss", "draw", "expected_rounds", "states"])
+
+# Status FX are a sorted tuple of (name, value, remaining turns), so the order effects were given in doesn't matter
+# Staggered moves are a tuple of (move, remaining turns)
+
+# Policies give the chance of a player choosing each move, as a list of (move, probability) pairs
+# They are given the player's moves and the (status FX, staggered moves) of the player and their opponent
+# Policies can't look at HP, as the outcomes of a turn are shared by every state with the same config
+
+# Chooses every move with the same chance, like Random_Policy
+def uniform_policy(moves, player, opponent):
+    return [(move, 1 / len(moves)) for move in moves]
+
+# Returns a policy which always uses the named move
+def fixed_move_policy(move_name):
+
+    def policy(moves, player, opponent):
+        return [(move, 1.0) for move in moves if move.name == move_name]
+
+    return policy
+
+# The status effects the solver keeps track of in configs, which are all the ones Player.apply_status_effect knows
+STATUS_NAMES = {"+Attack", "-Attack", "+Speed", "-Speed", "Protection", "Weakness", "Burning"}
+
+# Effects moves can have in a duel. Any other registered effect could change something about a player which...
+#...configs don't hold, so the solver won't solve duels with it
+SOLVER_EFFECTS = {"Damage", "Heal"} | STATUS_NAMES
+
+# A player part way through a turn, with the attributes and methods of Player which the rules use, so moves are...
+#...carried out by the same compiled effect handlers, get_true_accuracy and get_crit_chance as in a match
+# health is the change in the player's HP so far this turn, as the rules never read HP itself
+# name is the player's index, as the rules only use names to tell whether a move is used on its own user
+class Duel_Draft:
+
+    __slots__ = ("name", "speed", "health", "status_fx", "speed_change", "damage_taken_multiplier", "attack_multiplier", "burn_total")
+
+    def __init__(self, index, speed, health, status_fx):
+        self.name = index
+        self.speed = speed
+        self.health = health
+        self.status_fx = status_fx
+        self.update_totals()
+
+    # Works out the same totals as Player keeps, from the status FX
+    def update_totals(self):
+        self.speed_change = 0
+        self.burn_total = 0
+        counts = {}
+
+        for name, power, turns in self.status_fx:
+            if name == "+Speed":
+                self.speed_change += power
+
+            elif name == "-Speed":
+                self.speed_change -= power
+
+            elif name == "Burning":
+                self.burn_total += power
+
+            elif name == "Protection" or name == "Weakness" or name == "+Attack":
+                counts[name, power] = counts.get((name, power), 0) + 1
+
+        self.damage_taken_multiplier, self.attack_multiplier = effect_multipliers(counts)
+
+    def get_true_speed(self):
+        return self.speed + self.speed_change
+
+    # Same as Player.add_status_effect, keeping the effects sorted
+    def add_status_effect(self, name, remaining_turns, **properties):
+        if name not in STATUS_NAMES:
+            raise ValueError(f"The duel solver doesn't know the status effect {name}")
+
+        (power_key, power), = properties.items()
+        self.status_fx = tuple(sorted(self.status_fx + ((name, power, remaining_turns),)))
+        self.update_totals()
+
+    # Same as Player.inflict_damage
+    def inflict_damage(self, damage):
+        damage = round(damage * self.damage_taken_multiplier, 0)
+        self.health -= damage
+
+        return damage
+
+    def heal(self, heal):
+        self.health += heal
+
+# Scrambles the bits of 64 bit integers, so outcomes can be hashed when grouping configs
+def mix_bits(x):
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+# Solves duels between two classes
+class Duel_Solver:
+
+    # policies is a pair of policies, one for each player
+    # Healing lets HP grow without limit, so a duel is cut off and counted as a draw if a player's HP would go...
+    #...above max_health
+    def __init__(self, class_a, class_b, policies = (uniform_policy, uniform_policy), max_health = 250):
+        self.atk_classes = [all_classes[atk_class] if isinstance(atk_class, str) else atk_class for atk_class in (class_a, class_b)]
+        self.moves = [list(atk_class.move_set.values()) for atk_class in self.atk_classes]
+
+        for moves in self.moves:
+            for move in moves:
+                for name in move.effect:
+                    if name not in SOLVER_EFFECTS:
+                        raise ValueError(f"{move.name} has the effect {name}, which the duel solver doesn't know")
+        self.speeds = [atk_class.speed for atk_class in self.atk_classes]
+        self.policies = policies
+        self.max_health = max_health
+
+        # Outcomes of a turn from each config
+        self.transitions = {}
+
+    # Returns the (probability, players, checks) branches of using a move on one target
+    # players is a list of (change in health, status FX, staggered moves) and checks is a tuple of...
+    #...(player, change in health) knockout checks made so far this turn
+    def attempt_outcomes(self, probability, players, checks, user_index, move, target_index):
+        user = self.draft(players, user_index)
+        target = user if target_index == user_index else self.draft(players, target_index)
+
+        # Chances of each roll, as in hit_or_miss
+        # A roll of 1-100 below the hit chance hits, so there are hit chance - 1 rolls which hit
+        hit_chance = 1.0
+        if move.accuracy != True:
+            hit_chance = min(max(get_true_accuracy(move, user, target) - 1, 0), 100) / 100
+
+        crit_chance = 0.0
+        if move.crit_info != False:
+            crit_chance = min(max(get_crit_chance(move, user), 0), 100) / 100
+
+        outcomes = []
+        for branch_probability, hit, crit in ((hit_chance * crit_chance, True, True), (hit_chance * (1 - crit_chance), True, False), (1 - hit_chance, False, False)):
+            if branch_probability <= 0:
+                continue
+
+            if not hit:
+                outcomes.append((probability * branch_probability, players, checks))
+                continue
+
+            user = self.draft(players, user_index)
+            target = user if target_index == user_index else self.draft(players, target_index)
+
+            # A handler which uses any other part of Player does something the solver can't follow
+            try:
+                execute_move(move, user, target, crit)
+
+            except AttributeError as error:
+                raise ValueError(f"{move.name} uses a part of Player the duel solver doesn't know about ({error})")
+
+            new_players = list(players)
+            for draft in (user, target):
+                new_players[draft.name] = (draft.health, draft.status_fx, players[draft.name][2])
+
+            outcomes.append((probability * branch_probability, new_players, checks + ((target_index, target.health),)))
+
+        return outcomes
+
+    # Returns a Duel_Draft of a player in a branch
+    def draft(self, players, index):
+        health, status_fx, staggered_moves = players[index]
+        return Duel_Draft(index, self.speeds[index], health, status_fx)
+
+    # Applies a move to each of its targets in turn
+    def use_move(self, probability, players, checks, user_index, move):
+        branches = [(probability, players, checks)]
+
+        for target_index in self.find_targets(move, user_index):
+            next_branches = []
+
+            for branch in branches:
+                next_branches += self.attempt_outcomes(*branch, user_index, move, target_index)
+
+            branches = next_branches
+
+        return branches
+
+    # Works out who a move is used on. In a duel, moves with a number of targets always hit the opponent
+    def find_targets(self, move, acting):
+        if move.targets == "Self":
+            return [acting]
+
+        elif move.targets == "All":
+            return [0, 1]
+
+        return [1 - acting]
+
+    # Returns the (probability, next config, change in each player's health, knockout checks) outcomes...
+    #...of one turn from a config
+    def turn_outcomes(self, config):
+        if config in self.transitions:
+            return self.transitions[config]
+
+        acting = config[0]
+        status_fx, staggered_moves = config[1 + acting]
+
+        # Make all status effects and staggered moves progress by 1 turn, as in Player.increment_turns
+        status_fx = tuple((name, value, turns - 1) for name, value, turns in status_fx if turns > 0)
+        staggered_moves = tuple((move, turns - 1) for move, turns in staggered_moves)
+
+        # Burning, as in Player.burn_tick
+        player = Duel_Draft(acting, self.speeds[acting], 0, status_fx)
+        if player.burn_total > 0:
+            player.inflict_damage(player.burn_total)
+
+        health = player.health
+
+        # Take out staggered moves which are ready, and check if the player is blocked from choosing a move
+        ready = [move for move, turns in staggered_moves if turns <= 0]
+        block_use_move = any(move.stagger[1] == True for move, turns in staggered_moves)
+        staggered_moves = tuple((move, turns) for move, turns in staggered_moves if turns > 0)
+
+        players = [(0, *config[1]), (0, *config[2])]
+        players[acting] = (health, status_fx, staggered_moves)
+
+        branches = [(1.0, players, ((acting, health),))]
+
+        for move in ready:
+            next_branches = []
+
+            for probability, branch_players, checks in branches:
+                next_branches += self.use_move(probability, branch_players, checks, acting, move)
+
+            branches = next_branches
+
+        if not block_use_move:
+            next_branches = []
+
+            for probability, branch_players, checks in branches:
+                moves = self.policies[acting](self.moves[acting], branch_players[acting][1:], branch_players[1 - acting][1:])
+
+                for move, move_probability in moves:
+                    if move_probability <= 0:
+                        continue
+
+                    if move.stagger == None:
+                        next_branches += self.use_move(probability * move_probability, branch_players, checks, acting, move)
+
+                    else:
+                        staggered = list(branch_players)
+                        health, status_fx, staggered_moves = branch_players[acting]
+                        staggered[acting] = (health, status_fx, staggered_moves + ((move, move.stagger[0]),))
+
+                        next_branches.append((probability * move_probability, staggered, checks))
+
+            branches = next_branches
+
+        # Merge branches which ended up in the same config with the same changes to health
+        # The other player's status FX with no turns left run out at the start of their turn before doing anything,...
+        #...so they are dropped from the next config
+        merged = {}
+        for probability, branch_players, checks in branches:
+            next_players = [branch_players[0][1:], branch_players[1][1:]]
+            status_fx, staggered_moves = next_players[1 - acting]
+            next_players[1 - acting] = (tuple(effect for effect in status_fx if effect[2] > 0), staggered_moves)
+
+            key = ((1 - acting, *next_players), (int(branch_players[0][0]), int(branch_players[1][0])), tuple((i, int(change)) for i, change in checks))
+            merged[key] = merged.get(key, 0.0) + probability
+
+        self.transitions[config] = [(probability, *key) for key, probability in merged.items()]
+        return self.transitions[config]
+
+    # Finds every config that can be reached, then stores the outcomes of each group of configs (see group_configs)...
+    #...as flat arrays. Returns the group of the start config
+    def build_tables(self, start):
+        config_ids = {start: 0}
+        configs = [start]
+
+        i = 0
+        while i < len(configs):
+            for probability, next_config, changes, checks in self.turn_outcomes(configs[i]):
+                if next_config not in config_ids:
+                    config_ids[next_config] = len(configs)
+                    configs.append(next_config)
+
+            i += 1
+
+        outcomes = [self.turn_outcomes(config) for config in configs]
+        flat = [outcome for config_outcomes in outcomes for outcome in config_outcomes]
+
+        # Outcomes with the same changes to HP and knockout checks are of the same kind
+        kinds = {}
+        source = np.repeat(np.arange(len(configs)), [len(config_outcomes) for config_outcomes in outcomes])
+        next_config = np.array([config_ids[next_config] for probability, next_config, changes, checks in flat], dtype = np.int64)
+        kind = np.array([kinds.setdefault((changes, checks), len(kinds)) for probability, next_config, changes, checks in flat], dtype = np.int64)
+        probability = np.array([probability for probability, next_config, changes, checks in flat])
+
+        group, group_count, row_keys, row_probability = self.group_configs([config[0] for config in configs], source, next_config, kind, probability, len(kinds))
+
+        # Each group keeps the outcomes of its first config
+        first = np.unique(group, return_index = True)[1]
+        row_source = row_keys // (group_count * len(kinds))
+        keep = np.nonzero(np.isin(row_source, first))[0]
+        keep = keep[np.argsort(group[row_source[keep]], kind = "stable")]
+
+        self.acting = np.array([configs[i][0] for i in first])
+        self.counts = np.bincount(group[row_source[keep]], minlength = group_count)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+
+        self.probability = row_probability[keep]
+        self.next_config = row_keys[keep] % (group_count * len(kinds)) // len(kinds)
+        kind = row_keys[keep] % len(kinds)
+
+        # Knockout checks, padded with player -1 where a branch made fewer checks
+        max_checks = max(len(checks) for changes, checks in kinds)
+        check_player = np.full((len(kinds), max_checks), -1, dtype = np.int64)
+        check_change = np.zeros((len(kinds), max_checks), dtype = np.int64)
+
+        # Each player is knocked out by an outcome if their HP is below its threshold, which is 1 minus...
+        #...the biggest drop in HP at any of their checks
+        threshold = np.full((len(kinds), 2), np.iinfo(np.int64).min, dtype = np.int64)
+
+        for i, (changes, checks) in enumerate(kinds):
+            for j, (player, change) in enumerate(checks):
+                check_player[i, j] = player
+                check_change[i, j] = change
+                threshold[i, player] = max(threshold[i, player], 1 - change)
+
+        self.changes = np.array([changes for changes, checks in kinds], dtype = np.int64)[kind]
+        self.check_player = check_player[kind]
+        self.check_change = check_change[kind]
+        self.threshold = threshold[kind]
+
+        # Outcomes which change nobody's HP and can't knock anyone out
+        self.unchanged = (self.changes == 0).all(axis = 1) & (self.threshold <= 1).all(axis = 1)
+
+        # Outcomes which don't lower the total HP, apart from those
+        self.rising = ~self.unchanged & (self.changes.sum(axis = 1) >= 0)
+        self.build_cycles(group_count)
+
+        return group[0]
+
+    # Splits configs into groups which have the same chance of each kind of outcome leading to each group, as the...
+    #...rest of the duel plays out the same from every config in a group. Groups start out split by acting player
+    # Each config is summed up by hashes of its outcomes, with chances rounded to 50 bits so sums made in...
+    #...a different order still match
+    # Returns the group of each config, the number of groups, and the outcomes merged by (config, next group, kind)...
+    #...as keys with their chances
+    def group_configs(self, acting, source, next_config, kind, probability, kind_count):
+        group = np.array(acting, dtype = np.int64)
+        group_count = group.max() + 1
+
+        while True:
+            row_keys, inverse = np.unique((source * group_count + group[next_config]) * kind_count + kind, return_inverse = True)
+            row_probability = np.bincount(inverse.reshape(-1), weights = probability)
+
+            outcome = (row_keys % (group_count * kind_count)).astype(np.uint64)
+            rounded = np.round(row_probability * 2.0 ** 50).astype(np.uint64)
+            row_source = row_keys // (group_count * kind_count)
+
+            signature = np.zeros((3, len(acting)), dtype = np.uint64)
+            signature[0] = group
+            for i, salt in ((1, 0x9E3779B97F4A7C15), (2, 0xD1B54A32D192ED03)):
+                np.add.at(signature[i], row_source, mix_bits(mix_bits(outcome ^ np.uint64(salt)) ^ rounded))
+
+            signatures, new_group = np.unique(signature, axis = 1, return_inverse = True)
+            if signatures.shape[1] == group_count:
+                return group, group_count, row_keys, row_probability
+
+            group = new_group.reshape(-1)
+            group_count = signatures.shape[1]
+
+    # Turns which don't change HP (misses, or effects wearing off) can go round in cycles between groups. These...
+    #...are found as strongly connected sets of groups with Tarjan's algorithm, which finishes each set after...
+    #...every set it leads to. Each set is given a level one above the highest set it leads to, so states...
+    #...with the same HP can be solved a level at a time, and each set is solved as a small linear system
+    # Row g of the cycle table is how often each group in g's set is visited, starting from g, before leaving the set
+    def build_cycles(self, group_count):
+        source = np.repeat(np.arange(group_count), self.counts)
+
+        links = [[] for i in range(group_count)]
+        for i in np.nonzero(self.unchanged)[0].tolist():
+            links[source[i]].append((int(self.next_config[i]), float(self.probability[i])))
+
+        cycle = np.zeros(group_count, dtype = np.int64)
+        self.level = np.zeros(group_count, dtype = np.int64)
+        rows = [None] * group_count
+
+        index = [-1] * group_count
+        low = [0] * group_count
+        stack = []
+        on_stack = [False] * group_count
+        count = 0
+        cycle_count = 0
+
+        for root in range(group_count):
+            if index[root] >= 0:
+                continue
+
+            work = [(root, 0)]
+            while work:
+                node, i = work.pop()
+
+                if i == 0:
+                    index[node] = low[node] = count
+                    count += 1
+                    stack.append(node)
+                    on_stack[node] = True
+
+                else:
+                    low[node] = min(low[node], low[links[node][i - 1][0]])
+
+                while i < len(links[node]):
+                    linked = links[node][i][0]
+                    i += 1
+
+                    if index[linked] < 0:
+                        work.append((node, i))
+                        work.append((linked, 0))
+                        break
+
+                    elif on_stack[linked]:
+                        low[node] = min(low[node], index[linked])
+
+                else:
+                    if low[node] == index[node]:
+                        members = []
+                        while not members or members[-1] != node:
+                            members.append(stack.pop())
+                            on_stack[members[-1]] = False
+
+                        cycle[members] = cycle_count
+                        cycle_count += 1
+
+                        self.level[members] = max([self.level[linked] + 1 for member in members for linked, probability in links[member] if cycle[linked] != cycle[node]] or [0])
+                        self.solve_cycle(members, links, rows)
+
+        # Turns which don't change HP and leave their set are followed one level at a time
+        self.leaving = self.unchanged & (cycle[self.next_config] != cycle[source])
+
+        self.cycle_counts = np.array([len(row) for row in rows])
+        self.cycle_offsets = np.concatenate([[0], np.cumsum(self.cycle_counts)[:-1]])
+        self.cycle_config = np.array([group for row in rows for group in row], dtype = np.int64)
+        self.cycle_weight = np.array([weight for row in rows for weight in row.values()])
+
+    # Fills in the cycle table rows of a strongly connected set of groups
+    def solve_cycle(self, members, links, rows):
+        position = {member: i for i, member in enumerate(members)}
+
+        staying = np.eye(len(members))
+        for i, member in enumerate(members):
+            for linked, probability in links[member]:
+                if linked in position:
+                    staying[i, position[linked]] -= probability
+
+        # A set that can't be left is a duel where nobody can ever lose HP, like two players who only buff themselves
+        if np.abs(staying.sum(axis = 1)).max() < 1e-12:
+            raise ValueError("The duel can go on forever without either player losing HP")
+
+        if len(members) == 1:
+            rows[members[0]] = {members[0]: 1 / staying[0, 0]}
+            return
+
+        visits = np.linalg.inv(staying)
+        for i, member in enumerate(members):
+            rows[member] = {group: visits[i, j] for j, group in enumerate(members)}
+
+    # Each state is stored as a single key of (group, HP, HP), counting through every HP a player can have: up to...
+    #...their starting HP, or up to max_health if anything can heal them
+    def make_keys(self, config, health):
+        return (config * (self.limits[0] + 1) + health[:, 0]) * (self.limits[1] + 1) + health[:, 1]
+
+    # Returns the group and both players' HP of each key
+    def split_keys(self, keys):
+        config, health_b = np.divmod(keys, self.limits[1] + 1)
+        config, health_a = np.divmod(config, self.limits[0] + 1)
+
+        return config, np.stack([health_a, health_b], axis = 1)
+
+    # Works out every outcome of every state with the given keys, returned as a tuple of:
+    # - state_index, the state each outcome came from, and outcome, its row in the outcome tables
+    # - knocked_out, the player each outcome knocks out, or -1 if the duel carries on
+    # - next_health, both players' HP after each outcome
+    def expand(self, keys):
+        config, health = self.split_keys(keys)
+
+        # One row for every outcome of every state
+        counts = self.counts[config]
+        state_index = np.repeat(np.arange(len(config)), counts)
+        outcome = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(self.offsets[config], counts)
+
+        # np.take is used for the big lookups, as it is a lot faster than indexing with an array
+        outcome_health = np.take(health, state_index, axis = 0)
+
+        # A player is knocked out if their HP is below one of their thresholds
+        failed = outcome_health < np.take(self.threshold, outcome, axis = 0)
+        knocked_out = np.where(failed[:, 1], 1, -1)
+        knocked_out[failed[:, 0]] = 0
+
+        # If both players would be knocked out, the first knockout check that fails decides who it was
+        both = np.nonzero(failed[:, 0] & failed[:, 1])[0]
+        if len(both) > 0:
+            check_player = self.check_player[outcome[both]]
+            checked_health = np.where(check_player == 1, outcome_health[both, 1:2], outcome_health[both, 0:1])
+            both_failed = (check_player >= 0) & (checked_health + self.check_change[outcome[both]] < 1)
+
+            knocked_out[both] = check_player[np.arange(len(both)), both_failed.argmax(axis = 1)]
+
+        return state_index, outcome, knocked_out, outcome_health + np.take(self.changes, outcome, axis = 0)
+
+    # Finds every state which can be reached from the start
+    # Returns their keys in order, and the number of keys there could be
+    def find_states(self, start_key):
+        seen = np.zeros(len(self.counts) * (self.limits[0] + 1) * (self.limits[1] + 1), dtype = bool)
+        seen[start_key] = True
+        new_keys = np.array([start_key])
+
+        # New keys are marked in a second array and read back in order, which is faster than np.unique as...
+        #...there are only a few dozen rounds
+        marked = np.zeros(len(seen), dtype = bool)
+
+        while len(new_keys) > 0:
+            state_index, outcome, knocked_out, next_health = self.expand(new_keys)
+
+            carry_on = (knocked_out < 0) & (next_health[:, 0] <= self.limits[0]) & (next_health[:, 1] <= self.limits[1])
+            next_keys = self.make_keys(self.next_config[outcome[carry_on]], next_health[carry_on])
+
+            marked[next_keys] = True
+            marked[seen] = False
+            new_keys = np.flatnonzero(marked)
+
+            marked[new_keys] = False
+            seen[new_keys] = True
+
+        return np.flatnonzero(seen), len(seen)
+
+    # Works out where the turns from a slice of states lead, returned as a tuple of:
+    # - ending, the part of each state's value that comes from this turn
+    # - link_state, link_target and link_probability, the turns which lead to another state
+    # - cycle_state, cycle_target and cycle_weight, how each state's value is spread around its set of groups
+    # Targets are given by where they are solved, with the states in the same slice counted from start
+    def link_slice(self, keys, rank, start):
+        size = len(keys)
+        config, health = self.split_keys(keys)
+
+        state_index, outcome, knocked_out, next_health = self.expand(keys)
+        probability = np.take(self.probability, outcome)
+
+        # A duel where a player's HP would go over their limit is cut off there
+        cut_off = (knocked_out < 0) & ((next_health[:, 0] > self.limits[0]) | (next_health[:, 1] > self.limits[1]))
+        ended = (knocked_out >= 0) | cut_off
+
+        ending = np.zeros((3, size))
+        ending[0] = np.bincount(state_index, weights = probability * (knocked_out == 1), minlength = size)
+        ending[1] = np.bincount(state_index, weights = probability * (knocked_out == 0), minlength = size)
+        ending[2] = 1 - self.acting[config]
+
+        # Turns which change HP, or leave their set of groups without changing HP, lead to another state
+        linked = np.nonzero(~ended & (np.take(self.leaving, outcome) | ~np.take(self.unchanged, outcome)))[0]
+        link_target = np.take(rank, self.make_keys(np.take(self.next_config, np.take(outcome, linked)), np.take(next_health, linked, axis = 0)))
+
+        # Then each state's value is spread around its set of groups with the cycle table
+        counts = self.cycle_counts[config]
+        cycle_state = np.repeat(np.arange(size), counts)
+        cycle_row = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(self.cycle_offsets[config], counts)
+        cycle_target = np.take(rank, self.make_keys(np.take(self.cycle_config, cycle_row), np.take(health, cycle_state, axis = 0))) - start
+
+        return ending, np.take(state_index, linked), link_target, np.take(probability, linked), cycle_state, cycle_target, np.take(self.cycle_weight, cycle_row)
+
+    # Works out the value of every state that can be reached, as 3 rows of:
+    # - the chance of the first player winning, and of them losing
+    # - the expected number of rounds left, counting the current one. A round starts on each turn of the first player
+    # States are solved in waves of the same total HP, lowest first. Without healing, every turn which changes HP...
+    #...lowers the total, so it leads to a wave that is already solved. Turns which don't change HP stay in the...
+    #...wave, which is solved a level at a time (see build_cycles). Healing leads to states which aren't solved...
+    #...yet, so then the waves are swept again, using their values from the last sweep, until no value changes...
+    #...by more than tolerance
+    # Returns the keys of the states in the order they were solved, and their values
+    def solve_states(self, start_key, tolerance):
+        keys, key_count = self.find_states(start_key)
+
+        config, health = self.split_keys(keys)
+        total = health.sum(axis = 1)
+        level = self.level[config]
+
+        order = np.lexsort((keys, level, total))
+        keys = keys[order]
+        total = total[order]
+        level = level[order]
+
+        rank = np.zeros(key_count, dtype = np.int32)
+        rank[keys] = np.arange(len(keys))
+        del config, health, order
+
+        # Each slice holds the states of one level of a wave
+        slices = np.concatenate([[0], np.nonzero((np.diff(total) != 0) | (np.diff(level) != 0))[0] + 1, [len(keys)]])
+
+        # Only turns which don't lower the total HP, like healing, can lead to states which aren't solved yet. When...
+        #...there are any, the links of each slice are kept for the next sweep
+        sweeping = bool(self.rising.any())
+        links = [None] * (len(slices) - 1)
+
+        values = np.zeros((3, len(keys)))
+
+        while True:
+            change = 0.0
+
+            for i in range(len(slices) - 1):
+                start, end = slices[i], slices[i + 1]
+                size = end - start
+
+                if links[i] is None:
+                    slice_links = self.link_slice(keys[start:end], rank, start)
+                    if sweeping:
+                        links[i] = slice_links
+
+                else:
+                    slice_links = links[i]
+
+                ending, link_state, link_target, link_probability, cycle_state, cycle_target, cycle_weight = slice_links
+
+                linked = np.take(values, link_target, axis = 1) * link_probability
+                before = ending + np.array([np.bincount(link_state, weights = row, minlength = size) for row in linked])
+
+                spread = np.take(before, cycle_target, axis = 1) * cycle_weight
+                after = np.array([np.bincount(cycle_state, weights = row, minlength = size) for row in spread])
+
+                if sweeping:
+                    change = max(change, (np.abs(after - values[:, start:end]) / (1 + after)).max())
+
+                values[:, start:end] = after
+
+            if change <= tolerance:
+                return keys, values
+
+    # Works out the chances of each outcome of the duel
+    # Without healing the values are exact. With healing they are accurate to about tolerance, apart from duels...
+    #...cut off at max_health, which are counted as draws rather than wins or losses
+    def solve(self, tolerance = 1e-10):
+        start = (0, ((), ()), ((), ()))
+        start_group = self.build_tables(start)
+
+        health = [atk_class.health for atk_class in self.atk_classes]
+        self.limits = np.array([max(self.max_health, health[i]) if (self.changes[:, i] > 0).any() else health[i] for i in (0, 1)])
+
+        start_key = self.make_keys(np.array([start_group]), np.array([health]))[0]
+        keys, values = self.solve_states(start_key, tolerance)
+        win, loss, rounds = values[:, np.flatnonzero(keys == start_key)[0]]
+
+        return Duel_Result(float(win), float(loss), float(max(1 - win - loss, 0.0)), float(rounds), len(keys))
+
+# Solve a duel between two classes, with class_a moving first
+def solve_duel(class_a, class_b, policies = (uniform_policy, uniform_policy), max_health = 250):
+    return Duel_Solver(class_a, class_b, policies, max_health).solve()
+
+# Solves every pairing of classes, with each class taking the first move in half of the duels
+# Returns a dictionary of {(class_a, class_b): Duel_Result} with both orders of each pair
+def solve_table(class_names = None, max_health = 250):
+    if class_names is None:
+        class_names = list(all_classes)
+
+    # Each duel with a set player moving first is only solved once
+    duels = {}
+    for class_a in class_names:
+        for class_b in class_names:
+            duels[class_a, class_b] = solve_duel(class_a, class_b, max_health = max_health)
+
+    table = {}
+    for class_a in class_names:
+        for class_b in class_names:
+            a_first = duels[class_a, class_b]
+            b_first = duels[class_b, class_a]
+
+            table[class_a, class_b] = Duel_Result(
+                (a_first.win + b_first.loss) / 2,
+                (a_first.loss + b_first.win) / 2,
+                (a_first.draw + b_first.draw) / 2,
+                (a_first.expected_rounds + b_first.expected_rounds) / 2,
+                a_first.states + b_first.states
+            )
+
+    return table
+
+# Usage: python Battle_game_solver.py [<class> <class>] [--max-health N]
+# Prints the outcome of a duel, or the whole class-vs-class table if no classes are given
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    max_health = 250
+    if "--max-health" in args:
+        i = args.index("--max-health")
+        max_health = int(args[i + 1])
+        del args[i:i + 2]
+
+    start = time.perf_counter()
+
+    if len(args) == 2:
+        result = solve_duel(args[0], args[1], max_health = max_health)
+
+        print(f"{args[0]} (moving first) vs {args[1]}")
+        print(f"Win: {100 * result.win:.4f}%  Loss: {100 * result.loss:.4f}%  Draw: {100 * result.draw:.6f}%")
+        print(f"Expected rounds: {result.expected_rounds:.3f} ({result.states} states solved)")
+
+    else:
+        class_names = list(all_classes)
+        table = solve_table(class_names, max_health)
+        width = max(len(name) for name in class_names) + 4
+
+        print("Win chance of each row class against each column class, averaged over who moves first")
+        print("vs".ljust(width) + "".join(name.rjust(width) for name in class_names))
+
+        for class_a in class_names:
+            print(class_a.ljust(width) + "".join(f"{100 * table[class_a, class_b].win:.2f}%".rjust(width) for class_b in class_names))
+
+    print(f"\nSolved in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,758 @@
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from collections.abc import Sequence
+from itertools import combinations
+
+from Battle_game_classes import all_classes, effect_multipliers, get_true_accuracy, get_crit_chance, execute_move
+from Battle_game_headless import Match, Match_Result, random_roster
+from Battle_game_rng import Roll_Stream, RULES_STREAM
+
+# An immutable copy of a headless match for lookahead AIs to search through
+# A Game_State is made of tuples and Player_Vectors, which never change, so copying it is free and two states...
+#...share everything they have in common
+# Applying an action returns a new state and only rebuilds the players it changes and the chunks they are in...
+#...so undoing an action is just going back to the state it was applied to
+# The rules are the same as the headless Match with initiative = None, and random numbers are used in...
+#...the same order, so a state given Roll_Stream(seed, RULES_STREAM) with the match's seed rolls exactly what the match does
+
+# What a player has going on, in the same form as the Player attributes with the same names
+# status_fx is a tuple of (name, power, expires_on), in the order the effects were given
+# staggered_moves is a tuple of Pending_Move, in the order they were used
+Player_State = namedtuple("Player_State", ["health", "turn_number", "status_fx", "staggered_moves", "speed_change",
+                                           "damage_taken_multiplier", "attack_multiplier", "burn_total", "blocking_moves"])
+
+# A staggered move, with the move given as its index in the user's move list and the targets as player ids
+Pending_Move = namedtuple("Pending_Move", ["move", "targets", "ready_on", "block_use_move"])
+
+# Counts the multiplier effects in a Player_State's status_fx, in the form effect_multipliers takes
+def multiplier_counts(status_fx):
+    counts = {}
+
+    for name, power, expires_on in status_fx:
+        if name == "Protection" or name == "Weakness" or name == "+Attack":
+            counts[name, power] = counts.get((name, power), 0) + 1
+
+    return counts
+
+# The players of a Game_State by id, kept in chunks of CHUNK_SIZE players
+# Changing a few players only copies the chunks they are in and the tuple of chunks, and shares every other...
+#...chunk with the vector it came from, so applying an action to a huge match doesn't copy every player
+# Vectors with the same players are equal and hash the same, so they can be part of a state's key
+class Player_Vector(Sequence):
+
+    CHUNK_BITS = 5
+    CHUNK_SIZE = 1 << CHUNK_BITS
+
+    __slots__ = ("chunks", "size")
+
+    def __init__(self, players = ()):
+        players = tuple(players)
+
+        self.size = len(players)
+        self.chunks = tuple(players[i:i + self.CHUNK_SIZE] for i in range(0, len(players), self.CHUNK_SIZE))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.size))]
+
+        if i < 0:
+            i += self.size
+
+        if i < 0 or i >= self.size:
+            raise IndexError("player index out of range")
+
+        return self.chunks[i >> self.CHUNK_BITS][i & (self.CHUNK_SIZE - 1)]
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def __eq__(self, other):
+        return isinstance(other, Player_Vector) and self.chunks == other.chunks
+
+    def __hash__(self):
+        return hash(self.chunks)
+
+    def __repr__(self):
+        return f"Player_Vector({list(self)})"
+
+    # Returns a new vector with some players replaced, given as {player id: Player_State}
+    def replace(self, changes):
+        chunks = list(self.chunks)
+
+        # Chunks which have been copied to lists so far, as {chunk index: list}
+        copied = {}
+
+        for player_id, player in changes.items():
+            i = player_id >> self.CHUNK_BITS
+
+            if i not in copied:
+                copied[i] = list(chunks[i])
+
+            copied[i][player_id & (self.CHUNK_SIZE - 1)] = player
+
+        for i, chunk in copied.items():
+            chunks[i] = tuple(chunk)
+
+        vector = Player_Vector.__new__(Player_Vector)
+        vector.size = self.size
+        vector.chunks = tuple(chunks)
+
+        return vector
+
+# Everything about a match which doesn't change while it is played, shared by every state of the match
+# Players are given ids in roster order, the same as Roster
+class Game_Setup:
+
+    # roster is a list of (name, atk_class) pairs, where atk_class is an Attack_Class or a class name
+    # teams is an optional dictionary of {name: team}. By default, every player is on their own team
+    def __init__(self, roster, teams = None, max_rounds = 200):
+        self.names = []
+        self.classes = []
+        ids = {}
+
+        for name, atk_class in roster:
+            if isinstance(atk_class, str):
+                atk_class = all_classes[atk_class]
+
+            if name in ids:
+                raise ValueError(f"{name} is in the roster more than once")
+
+            ids[name] = len(self.names)
+
+            self.names.append(name)
+            self.classes.append(atk_class)
+
+        if len(self.names) < 2:
+            raise ValueError("A match needs 2 or more players")
+
+        if teams is None:
+            teams = {name: name for name in self.names}
+
+        self.max_rounds = max_rounds
+        self.move_lists = [atk_class.move_list for atk_class in self.classes]
+        self.speeds = [atk_class.speed for atk_class in self.classes]
+
+        # Teams are numbered in the order they first appear, and each player's team is stored by number
+        self.team_names = []
+        self.teams = []
+        team_numbers = {}
+
+        for name in self.names:
+            if teams[name] not in team_numbers:
+                team_numbers[teams[name]] = len(self.team_names)
+                self.team_names.append(teams[name])
+
+            self.teams.append(team_numbers[teams[name]])
+
+    # Setups are sent to other processes as their roster, as Attack_Classes can't be pickled
+    def __reduce__(self):
+        roster = [(name, atk_class.name) for name, atk_class in zip(self.names, self.classes)]
+        teams = {name: self.team_names[team] for name, team in zip(self.names, self.teams)}
+
+        return (Game_Setup, (roster, teams, self.max_rounds))
+
+    # Returns the state at the first decision of the match
+    # rng is only used if something random happens before then, which it doesn't with the usual classes
+    def new_game(self, rng = None):
+        players = Player_Vector(Player_State(atk_class.health, 0, (), (), 0, 1, 1, 0, 0) for atk_class in self.classes)
+
+        team_sizes = [0] * len(self.team_names)
+        for team in self.teams:
+            team_sizes[team] += 1
+
+        start = Game_State(self, players, tuple(range(len(players))), tuple(team_sizes), 0, 0, None)
+
+        return start.advance(Sampled_Rolls(rng or Roll_Stream()))
+
+# Answers hit and crit rolls with a random number generator, the same way as hit_or_miss
+class Sampled_Rolls:
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def hit(self, hit_chance):
+        return self.rng.randint(1, 100) < hit_chance
+
+    def crit(self, crit_chance):
+        return self.rng.randint(1, 100) <= crit_chance
+
+# Answers rolls from a fixed list of results, then picks the first possible result for any rolls after that
+# Every roll made is kept in results, with the chance of each in chances, so all outcomes can be explored
+class Scripted_Rolls:
+
+    def __init__(self, script = ()):
+        self.script = script
+        self.results = []
+        self.chances = []
+
+    # Chance of each result out of the 100 possible rolls, as a (chance of True, chance of False) pair
+    def roll(self, true_chance):
+        true_chance = min(max(true_chance, 0), 100) / 100
+
+        if len(self.results) < len(self.script):
+            result = self.script[len(self.results)]
+
+        else:
+            result = true_chance > 0
+
+        self.results.append(result)
+        self.chances.append((true_chance, 1 - true_chance))
+
+        return result
+
+    # A roll of 1-100 below hit_chance hits, so there are hit_chance - 1 rolls which hit
+    def hit(self, hit_chance):
+        return self.roll(hit_chance - 1)
+
+    def crit(self, crit_chance):
+        return self.roll(crit_chance)
+
+    # Chance of every roll having come out the way it did
+    def probability(self):
+        probability = 1.0
+
+        for result, (true_chance, false_chance) in zip(self.results, self.chances):
+            probability *= true_chance if result else false_chance
+
+        return probability
+
+# One point of a match where a player has to choose an action, or the end of the match
+# acting is the id of the player choosing, or None once the match is over
+# players is a Player_Vector of every player's Player_State, by id
+# active is the ids of the players still in the match, in turn order
+# team_sizes is the number of active players on each team, by team number
+# Actions are (move index, target ids) pairs, as returned by legal_actions()
+class Game_State(namedtuple("Game_State", ["setup", "players", "active", "team_sizes", "round_count", "turn_count", "acting"])):
+
+    __slots__ = ()
+
+    def is_over(self):
+        return self.acting is None
+
+    def teams_left(self):
+        return sum(1 for size in self.team_sizes if size > 0)
+
+    # Returns the ids of the players the given player is allowed to target with a move that picks its targets
+    def possible_targets(self, player_id):
+        team = self.setup.teams[player_id]
+
+        return [target for target in self.active if self.setup.teams[target] != team]
+
+    # Returns the targets of a move, or None if the move picks its targets
+    def fixed_targets(self, move, player_id):
+        if move.targets == "Self":
+            return (player_id,)
+
+        elif move.targets == "All":
+            return self.active
+
+        elif move.targets == "All others":
+            return tuple(target for target in self.active if target != player_id)
+
+        return None
+
+    # Returns every action the acting player can take
+    # Moves which pick more than one target give every combination of targets, as the order they are hit in...
+    #...only changes which roll each target gets
+    def legal_actions(self):
+        if self.acting is None:
+            return []
+
+        actions = []
+        possible_targets = None
+
+        for i, move in enumerate(self.setup.move_lists[self.acting]):
+            targets = self.fixed_targets(move, self.acting)
+
+            if targets is not None:
+                actions.append((i, targets))
+                continue
+
+            if possible_targets is None:
+                possible_targets = self.possible_targets(self.acting)
+
+            count = min(move.targets, len(possible_targets))
+            actions.extend((i, targets) for targets in combinations(possible_targets, count))
+
+        return actions
+
+    # Returns the state after the acting player takes the action and the match reaches its next decision
+    # rolls is a Sampled_Rolls or Scripted_Rolls, or a random number generator to sample rolls from
+    def apply(self, action, rolls):
+        if not hasattr(rolls, "hit"):
+            rolls = Sampled_Rolls(rolls)
+
+        turn = State_Builder(self, rolls)
+        turn.take_action(self.acting, action)
+        turn.advance()
+
+        return turn.freeze()
+
+    # Plays on from the current point until someone has to make a decision
+    def advance(self, rolls):
+        turn = State_Builder(self, rolls)
+        turn.advance()
+
+        return turn.freeze()
+
+    # Returns every way the action can turn out, as a list of (probability, state) pairs
+    # Outcomes are found by trying the action again with each combination of roll results
+    def outcomes(self, action):
+        outcomes = []
+        scripts = [()]
+
+        while len(scripts) > 0:
+            script = scripts.pop()
+            rolls = Scripted_Rolls(script)
+
+            state = self.apply(action, rolls)
+            outcomes.append((rolls.probability(), state))
+
+            # Every roll made after the end of the script could have gone the other way
+            for i in range(len(script), len(rolls.results)):
+                result = rolls.results[i]
+                true_chance, false_chance = rolls.chances[i]
+
+                if (false_chance if result else true_chance) > 0:
+                    scripts.append(tuple(rolls.results[:i]) + (not result,))
+
+        return outcomes
+
+    # Returns a hashable key for the state, e.g. for a transposition table
+    # turn_count and team_sizes are left out, as they don't change how the rest of the match can play out...
+    #...and every player's turn_number follows from the round and who is acting
+    def key(self):
+        return (self.players, self.active, self.round_count, self.acting)
+
+    # Returns the health of every player, by id
+    def health(self):
+        return [player.health for player in self.players]
+
+    # Builds the result of the match from the state, the same as Match.result
+    def result(self, seed = None):
+        setup = self.setup
+
+        winner = None
+        winning_team = None
+        if self.teams_left() == 1:
+            team = next(team for team, size in enumerate(self.team_sizes) if size > 0)
+            winning_team = setup.team_names[team]
+
+        survivors = tuple(setup.names[player_id] for player_id in self.active)
+        if winning_team is not None and len(survivors) == 1:
+            winner = survivors[0]
+
+        return Match_Result(winner, winning_team, self.round_count, self.turn_count, survivors, seed)
+
+# A player's Player_State while a State_Builder changes it, with the methods and attributes of Player which...
+#...the rules use, so moves are carried out by the same compiled effect handlers, get_true_accuracy...
+#...and get_crit_chance as in a match
+# name is the player's id, as the rules only use names to tell whether a move is used on its own user
+class Player_Draft:
+
+    __slots__ = ("name", "speed") + Player_State._fields
+
+    def __init__(self, player_id, speed, player):
+        self.name = player_id
+        self.speed = speed
+
+        (self.health, self.turn_number, self.status_fx, self.staggered_moves, self.speed_change,
+         self.damage_taken_multiplier, self.attack_multiplier, self.burn_total, self.blocking_moves) = player
+
+    def freeze(self):
+        return Player_State(self.health, self.turn_number, self.status_fx, self.staggered_moves, self.speed_change,
+                            self.damage_taken_multiplier, self.attack_multiplier, self.burn_total, self.blocking_moves)
+
+    def get_true_speed(self):
+        return self.speed + self.speed_change
+
+    # Same as Player.add_status_effect
+    def add_status_effect(self, name, remaining_turns, **properties):
+        (power_key, power), = properties.items()
+        self.status_fx += ((name, power, self.turn_number + 1 + remaining_turns),)
+
+        if name == "+Speed":
+            self.speed_change += power
+
+        elif name == "-Speed":
+            self.speed_change -= power
+
+        elif name == "Protection" or name == "Weakness" or name == "+Attack":
+            self.damage_taken_multiplier, self.attack_multiplier = effect_multipliers(multiplier_counts(self.status_fx))
+
+        elif name == "Burning":
+            self.burn_total += power
+
+    # Same as Player.inflict_damage
+    def inflict_damage(self, damage):
+        damage = round(damage * self.damage_taken_multiplier, 0)
+        self.health -= damage
+
+        return damage
+
+    def heal(self, heal):
+        self.health += heal
+
+    # Same as Player.new_turn. Returns the staggered moves which are ready and whether the player is blocked
+    def new_turn(self):
+        self.turn_number += 1
+        turn_number = self.turn_number
+
+        # A move which blocks the player still blocks them on the turn it is used
+        block_use_move = self.blocking_moves > 0
+
+        expired_fx = [effect for effect in self.status_fx if effect[2] == turn_number]
+        ready_moves = [pending for pending in self.staggered_moves if pending.ready_on == turn_number]
+
+        if len(expired_fx) > 0:
+            self.status_fx = tuple(effect for effect in self.status_fx if effect[2] != turn_number)
+
+            for name, power, expires_on in expired_fx:
+                if name == "+Speed":
+                    self.speed_change -= power
+
+                elif name == "-Speed":
+                    self.speed_change += power
+
+                elif name == "Burning":
+                    self.burn_total -= power
+
+                elif name == "Protection" or name == "Weakness" or name == "+Attack":
+                    self.damage_taken_multiplier, self.attack_multiplier = effect_multipliers(multiplier_counts(self.status_fx))
+
+        if len(ready_moves) > 0:
+            self.staggered_moves = tuple(pending for pending in self.staggered_moves if pending.ready_on != turn_number)
+
+            for pending in ready_moves:
+                if pending.block_use_move == True:
+                    self.blocking_moves -= 1
+
+        # All Burning effects are dealt as one lot of damage
+        if self.burn_total > 0:
+            self.inflict_damage(self.burn_total)
+
+        return ready_moves, block_use_move
+
+# Applies the rules to a state, so a new Game_State can be made once everything is done
+# Only the players the rules touch get a Player_Draft, and the rest are shared with the old state, so applying...
+#...an action costs the same however many players there are. active and team_sizes are only copied when...
+#...a player is knocked out
+class State_Builder:
+
+    def __init__(self, state, rolls):
+        self.setup = state.setup
+        self.players = state.players
+        self.active = state.active
+        self.team_sizes = state.team_sizes
+        self.round_count = state.round_count
+        self.turn_count = state.turn_count
+        self.acting = state.acting
+        self.rolls = rolls
+
+        # Drafts of the players touched so far, as {player id: Player_Draft}
+        self.drafts = {}
+
+        # A state waiting on a player always has at least 2 teams left, so this is only checked for new games...
+        #...and when a team loses its last player
+        self.over = state.acting is None and self.one_team_left()
+
+    def freeze(self):
+        players = self.players
+        if len(self.drafts) > 0:
+            players = players.replace({player_id: draft.freeze() for player_id, draft in self.drafts.items()})
+
+        return Game_State(self.setup, players, self.active, self.team_sizes, self.round_count, self.turn_count, self.acting)
+
+    # Returns the Player_Draft of the player with the given id, making it the first time they are touched
+    def player(self, player_id):
+        draft = self.drafts.get(player_id)
+
+        if draft is None:
+            draft = self.drafts[player_id] = Player_Draft(player_id, self.setup.speeds[player_id], self.players[player_id])
+
+        return draft
+
+    def is_over(self):
+        return self.over
+
+    def is_active(self, player_id):
+        position = bisect_left(self.active, player_id)
+        return position < len(self.active) and self.active[position] == player_id
+
+    def remove_player(self, player_id):
+        position = bisect_left(self.active, player_id)
+        self.active = self.active[:position] + self.active[position + 1:]
+
+        team = self.setup.teams[player_id]
+        self.team_sizes = self.team_sizes[:team] + (self.team_sizes[team] - 1,) + self.team_sizes[team + 1:]
+
+        if self.team_sizes[team] == 0:
+            self.over = self.one_team_left()
+
+    # Whether every active player is on the same team
+    # This stops at the first player on another team, which is almost always one of the first few
+    def one_team_left(self):
+        if len(self.active) == 0:
+            return True
+
+        teams = self.setup.teams
+        first_team = teams[self.active[0]]
+
+        return all(teams[player_id] == first_team for player_id in self.active)
+
+    def take_action(self, player_id, action):
+        move_index, targets = action
+        move = self.setup.move_lists[player_id][move_index]
+
+        if move.stagger == None:
+            self.attempt_move(move, player_id, targets)
+
+        else:
+            player = self.player(player_id)
+            pending = Pending_Move(move_index, tuple(targets), player.turn_number + max(move.stagger[0], 1), move.stagger[1])
+
+            player.staggered_moves += (pending,)
+            if pending.block_use_move == True:
+                player.blocking_moves += 1
+
+    # Plays turns in roster order until a player has to choose an action or the match ends, as in Match.steps
+    def advance(self):
+        while True:
+            if self.is_over():
+                self.acting = None
+                return
+
+            # The next player is the first active one after the last player to act, or the first one in a new round
+            position = 0 if self.acting is None else bisect_right(self.active, self.acting)
+
+            if position == len(self.active):
+                position = 0
+                self.acting = None
+
+            if self.acting is None:
+                if self.round_count >= self.setup.max_rounds:
+                    return
+
+                self.round_count += 1
+
+            player_id = self.active[position]
+            self.acting = player_id
+            self.turn_count += 1
+
+            player = self.player(player_id)
+            ready_moves, block_use_move = player.new_turn()
+
+            # Players can be knocked out by burning at the start of their turn
+            if player.health < 1:
+                self.remove_player(player_id)
+                continue
+
+            # Use any staggered moves which are ready
+            for pending in ready_moves:
+                self.attempt_move(self.setup.move_lists[player_id][pending.move], player_id, pending.targets)
+
+            if self.is_over():
+                continue
+
+            if not block_use_move:
+                return
+
+    # Same as Match.attempt_move
+    def attempt_move(self, move, user_id, targets):
+        user = self.player(user_id)
+
+        for target_id in targets:
+
+            # Players who were knocked out before a staggered move landed can't be hit again
+            if not self.is_active(target_id):
+                continue
+
+            target = self.player(target_id)
+            hit, crit = self.hit_or_miss(move, user, target)
+
+            if hit == True:
+                execute_move(move, user, target, crit)
+
+            if target.health < 1:
+                self.remove_player(target_id)
+
+    # Same as hit_or_miss, with the rolls made by self.rolls
+    def hit_or_miss(self, move, user, target):
+        hit = True
+        if move.accuracy != True:
+            hit = self.rolls.hit(get_true_accuracy(move, user, target))
+
+        crit = False
+        if move.crit_info != False:
+            crit = self.rolls.crit(get_crit_chance(move, user))
+
+        return hit, crit
+
+# Returns the state of a headless Match which is waiting for the given player to choose a move
+# The match must take turns in roster order (initiative = None)
+# setup can be given to reuse the Game_Setup from an earlier state of the same match
+def state_from_match(match, player, setup = None):
+    if match.initiative is not None:
+        raise ValueError("Game_State only follows matches which take turns in roster order")
+
+    return state_from_roster(match.roster, player, match.teams, match.max_rounds, match.round_count, match.turn_count, setup)
+
+# Returns the state of the players in a Roster when it is the given player's turn to choose a move
+# Works for the interactive game as well as headless matches, as moves are looked up by name
+def state_from_roster(roster, player, teams = None, max_rounds = 200, round_count = 0, turn_count = 0, setup = None):
+    if setup is None:
+        setup = Game_Setup([(p.name, all_classes[p.atk_class_name]) for p in roster.players], teams, max_rounds)
+
+    players = []
+    for p in roster.players:
+        status_fx = tuple((effect.name, effect.power, effect.expires_on) for effect in p.status_fx)
+
+        move_names = list(p.move_set)
+        staggered_moves = tuple(Pending_Move(move_names.index(stag_move.move.name),
+                                             tuple(roster.ids[target.name] for target in stag_move.targets),
+                                             stag_move.ready_on, stag_move.block_use_move)
+                                for stag_move in p.staggered_moves)
+
+        players.append(Player_State(p.health, p.turn_number, status_fx, staggered_moves, p.speed_change,
+                                    p.damage_taken_multiplier, p.attack_multiplier, p.burn_total, p.blocking_moves))
+
+    team_sizes = [0] * len(setup.team_names)
+    for player_id in roster.active:
+        team_sizes[setup.teams[player_id]] += 1
+
+    return Game_State(setup, Player_Vector(players), tuple(sorted(roster.active)), tuple(team_sizes),
+                      round_count, turn_count, roster.ids[player.name])
+
+# Plays random actions from the start of a match until it ends, and returns the final state and the number...
+#...of states made on the way
+def random_playout(setup, rng):
+    state = setup.new_game(rng)
+    nodes = 1
+
+    while not state.is_over():
+        actions = state.legal_actions()
+        state = state.apply(actions[int(rng.random() * len(actions))], rng)
+        nodes += 1
+
+    return state, nodes
+
+# Plays a headless match and follows it with Game_States, checking each state made by apply() against the...
+#...live match every time a player chooses a move, and the final result against the match's
+# The state is given the match's rules stream at the same position, so it rolls exactly what the match does
+# Returns None if every state matched, or a description of the first one that didn't
+def check_match(roster, seed, teams = None, max_rounds = 200):
+    match = Match(roster, seed = seed, teams = teams, max_rounds = max_rounds)
+    rules = Roll_Stream(seed, RULES_STREAM)
+
+    setup = None
+    predicted = None
+    result = None
+
+    steps = match.steps()
+    decision = next(steps)
+
+    while result is None:
+        live = state_from_match(match, decision.player, setup)
+        setup = live.setup
+
+        if predicted is not None and tuple(predicted)[1:] != tuple(live)[1:]:
+            return f"turn {match.turn_count}: apply() gave {tuple(predicted)[1:]}, the match has {tuple(live)[1:]}"
+
+        rules.seek(match.rng.position())
+
+        move = match.decide(decision)
+        targets = live.fixed_targets(move, live.acting)
+
+        # A move which picks its targets asks for them next, before any rolls are made
+        try:
+            decision = steps.send(move)
+
+            if targets is None:
+                chosen = match.decide(decision)
+                targets = tuple(match.roster.ids[target.name] for target in chosen)
+                decision = steps.send(chosen)
+
+        except StopIteration as finished:
+            result = finished.value
+
+        predicted = live.apply((live.setup.move_lists[live.acting].index(move), targets), rules)
+
+    if not predicted.is_over() or predicted.result(seed) != result:
+        return f"the match ended with {result}, the states ended with {predicted.result(seed)}"
+
+    return None
+
+# Checks Game_State against check_match() for random rosters of mixed classes and teams
+# Returns the number of matches and a list of (seed, roster, teams, problem) for those that didn't match
+def check_against_matches(matches = 3000, seed = 0):
+    rng = Roll_Stream(seed)
+    failures = []
+
+    for i in range(matches):
+        roster, teams = random_roster(rng)
+        problem = check_match(roster, seed + i, teams)
+
+        if problem is not None:
+            failures.append((seed + i, roster, teams, problem))
+
+    return matches, failures
+
+# Usage: python Battle_game_state.py <class> <class> [<class> ...] [--nodes N] [--seed S]
+# Plays random matches until N states have been made and prints how many states are made per second
+# Usage: python Battle_game_state.py --check [--matches N] [--seed S]
+# Follows N random matches with Game_States and checks every state against the live match, exiting with status 1...
+#...if any didn't match
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    num_nodes = 100000
+    seed = 0
+
+    if "--nodes" in args:
+        i = args.index("--nodes")
+        num_nodes = int(args[i + 1])
+        del args[i:i + 2]
+
+    if "--seed" in args:
+        i = args.index("--seed")
+        seed = int(args[i + 1])
+        del args[i:i + 2]
+
+    if "--check" in args:
+        num_matches = 3000
+        if "--matches" in args:
+            num_matches = int(args[args.index("--matches") + 1])
+
+        start = time.perf_counter()
+        matches, failures = check_against_matches(num_matches, seed)
+
+        for failure_seed, roster, teams, problem in failures[:10]:
+            print(f"Seed {failure_seed}, {[class_name for name, class_name in roster]}, teams {teams}: {problem}")
+
+        print(f"Checked {matches} matches in {time.perf_counter() - start:.2f}s, {len(failures)} didn't match")
+        sys.exit(1 if failures else 0)
+
+    if len(args) < 2:
+        args = ["Warrior", "Mage"]
+
+    setup = Game_Setup([(f"{class_name} {i + 1}", class_name) for i, class_name in enumerate(args)])
+    rng = Roll_Stream(seed, RULES_STREAM)
+
+    nodes = 0
+    matches = 0
+
+    start = time.perf_counter()
+    while nodes < num_nodes:
+        state, playout_nodes = random_playout(setup, rng)
+        nodes += playout_nodes
+        matches += 1
+
+    elapsed = time.perf_counter() - start
+
+    print(f"{nodes} states in {matches} matches, {elapsed:.2f}s ({nodes / elapsed:.0f} states per second, {60 * nodes / elapsed / 1e6:.2f} million per minute)")
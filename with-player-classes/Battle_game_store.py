@@ -0,0 +1,289 @@
+import os
+import sys
+import time
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from Battle_game_events import Event_Buffer, MoveUsed, Hit, Crit, EffectApplied
+from Battle_game_headless import Match
+
+# Keeps the results of headless matches in a SQLite database, so they can be looked at after the simulations finish
+# Every match gets a row in matches, a row in match_players for each player, and a row in move_stats for each...
+#...move each player used
+# Matches are written in batches, each in one transaction, with the database in WAL mode so readers...
+#...don't hold up the writer. Only one process should write to a database at a time, e.g. workers play...
+#...the matches and send their Match_Summary records back to the process with the store
+
+# Everything the store keeps about a match
+# players is a tuple of (slot, name, class name, team, won, survived), where slot is the player's roster id
+# moves is a tuple of (slot, move name, uses, hits, crits, damage)
+# winning_team is None for a draw
+Match_Summary = namedtuple("Match_Summary", ["seed", "rounds", "turns", "winning_team", "players", "moves"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    seed INTEGER,
+    players INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    winning_team TEXT
+);
+
+CREATE TABLE IF NOT EXISTS match_players (
+    match_id INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    class TEXT NOT NULL,
+    team TEXT NOT NULL,
+    won INTEGER NOT NULL,
+    survived INTEGER NOT NULL,
+    PRIMARY KEY (match_id, slot)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS move_stats (
+    match_id INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    move TEXT NOT NULL,
+    uses INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    crits INTEGER NOT NULL,
+    damage REAL NOT NULL,
+    PRIMARY KEY (match_id, slot, move)
+) WITHOUT ROWID;
+
+-- Each query below can be answered from its index alone, without reading the tables
+CREATE INDEX IF NOT EXISTS match_players_by_class ON match_players (class, won);
+CREATE INDEX IF NOT EXISTS move_stats_by_move ON move_stats (move, uses, hits, crits, damage);
+CREATE INDEX IF NOT EXISTS matches_by_rounds ON matches (rounds, players);
+"""
+
+# Win rate of each class, as (class, matches, wins, win rate)
+# With players, only matches with that many players are counted
+WIN_RATES = """
+SELECT class, COUNT(*), SUM(won), AVG(won) FROM match_players
+WHERE ? IS NULL OR match_id IN (SELECT id FROM matches WHERE players = ?)
+GROUP BY class ORDER BY AVG(won) DESC
+"""
+
+# How each move did overall, as (move, uses, hits, crits, damage, damage per use, hit rate, crit rate)
+# The hit and crit rates are per target, so moves with more than one target can hit more often than they are used
+MOVE_DAMAGE = """
+SELECT move, SUM(uses), SUM(hits), SUM(crits), SUM(damage),
+       SUM(damage) / SUM(uses), 1.0 * SUM(hits) / SUM(uses), 1.0 * SUM(crits) / MAX(SUM(hits), 1)
+FROM move_stats GROUP BY move ORDER BY SUM(damage) / SUM(uses) DESC
+"""
+
+# How many matches lasted each number of rounds, as (rounds, matches)
+MATCH_LENGTHS = """
+SELECT rounds, COUNT(*) FROM matches
+WHERE ? IS NULL OR players = ?
+GROUP BY rounds ORDER BY rounds
+"""
+
+# Works out a match's Match_Summary from its result and the events it made
+# A move which hits runs each of its effects once, and each effect makes exactly one Hit or EffectApplied event...
+#...so the number of hits is the number of those events divided by the number of effects the move has
+def summarise_match(match, result, events):
+    ids = match.roster.ids
+    survivors = set(result.survivors)
+
+    players = []
+    for name, player in match.players.items():
+        team = match.teams[name]
+        won = result.winning_team is not None and team == result.winning_team
+
+        players.append((ids[name], name, player.atk_class_name, str(team), int(won), int(name in survivors)))
+
+    # {(slot, move): [uses, effect events, crits, damage]}
+    counts = {}
+
+    for event in events:
+        kind = type(event)
+
+        if kind is MoveUsed:
+            key = (ids[event.user.name], event.move)
+            if key not in counts:
+                counts[key] = [0, 0, 0, 0]
+
+            counts[key][0] += 1
+
+        elif kind is Hit:
+            entry = counts[(ids[event.user.name], event.move)]
+            entry[1] += 1
+            entry[3] += event.damage
+
+        elif kind is EffectApplied:
+            counts[(ids[event.user.name], event.move)][1] += 1
+
+        elif kind is Crit:
+            counts[(ids[event.user.name], event.move)][2] += 1
+
+    moves = tuple((slot, move.name, uses, effect_events // len(move.compiled_effects), crits, damage)
+                  for (slot, move), (uses, effect_events, crits, damage) in counts.items())
+
+    winning_team = None if result.winning_team is None else str(result.winning_team)
+
+    return Match_Summary(result.seed, result.rounds, result.turns, winning_team, tuple(players), moves)
+
+# Plays a headless match and returns its Match_Summary
+def play_summarised(roster, policies = None, seed = None, teams = None, max_rounds = 200, initiative = None):
+    events = Event_Buffer()
+    match = Match(roster, policies, seed, teams, max_rounds, initiative, events)
+    result = match.play()
+
+    return summarise_match(match, result, events.drain())
+
+class Results_Store:
+
+    # path is the database file, which is made if it doesn't exist
+    # Matches are written once batch_size of them have been added, and when the store is flushed or closed
+    def __init__(self, path, batch_size = 1000):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+
+        # With WAL, NORMAL only syncs at checkpoints, so a crash can lose the last few batches but never corrupts the database
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+        self.batch_size = batch_size
+        self.next_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM matches").fetchone()[0]
+
+        # Rows waiting to be written
+        self.match_rows = []
+        self.player_rows = []
+        self.move_rows = []
+
+    def add(self, summary):
+        match_id = self.next_id
+        self.next_id += 1
+
+        self.match_rows.append((match_id, summary.seed, len(summary.players), summary.rounds, summary.turns, summary.winning_team))
+        self.player_rows.extend((match_id,) + player for player in summary.players)
+        self.move_rows.extend((match_id,) + move for move in summary.moves)
+
+        if len(self.match_rows) >= self.batch_size:
+            self.flush()
+
+        return match_id
+
+    # Writes every waiting match in one transaction
+    def flush(self):
+        if len(self.match_rows) == 0:
+            return
+
+        with self.connection:
+            self.connection.executemany("INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?)", self.match_rows)
+            self.connection.executemany("INSERT INTO match_players VALUES (?, ?, ?, ?, ?, ?, ?)", self.player_rows)
+            self.connection.executemany("INSERT INTO move_stats VALUES (?, ?, ?, ?, ?, ?, ?)", self.move_rows)
+
+        self.match_rows = []
+        self.player_rows = []
+        self.move_rows = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def match_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM matches").fetchone()[0] + len(self.match_rows)
+
+    # num_players limits the results to matches with that many players
+    def win_rates(self, num_players = None):
+        return self.connection.execute(WIN_RATES, (num_players, num_players)).fetchall()
+
+    def move_damage(self):
+        return self.connection.execute(MOVE_DAMAGE).fetchall()
+
+    def match_lengths(self, num_players = None):
+        return self.connection.execute(MATCH_LENGTHS, (num_players, num_players)).fetchall()
+
+# Plays a chunk of matches in a worker process and returns their Match_Summary records
+def play_chunk(roster, first_seed, count, max_rounds):
+    return [play_summarised(roster, seed = first_seed + i, max_rounds = max_rounds) for i in range(count)]
+
+def print_report(store, num_players = None):
+    print(f"{'Class':12} {'Players':>10} {'Wins':>10} {'Win rate':>9}")
+    for class_name, players, wins, win_rate in store.win_rates(num_players):
+        print(f"{class_name:12} {players:10} {wins:10} {100 * win_rate:8.1f}%")
+
+    print(f"\n{'Move':18} {'Uses':>10} {'Hits/use':>9} {'Crits/hit':>10} {'Damage/use':>11}")
+    for move, uses, hits, crits, damage, damage_per_use, hit_rate, crit_rate in store.move_damage():
+        print(f"{move:18} {uses:10} {hit_rate:9.2f} {crit_rate:10.2f} {damage_per_use:11.2f}")
+
+    lengths = store.match_lengths(num_players)
+    total = sum(count for rounds, count in lengths)
+
+    print(f"\n{'Rounds':>6} {'Matches':>10}")
+    for rounds, count in lengths:
+        print(f"{rounds:6} {count:10} {'#' * round(50 * count / total)}")
+
+# Usage:
+#   python Battle_game_store.py ingest <database> <class> <class> [<class> ...] [--matches N] [--seed S] [--workers N] [--batch N]
+#   python Battle_game_store.py report <database> [--players N]
+# ingest plays N matches between one player of each given class and adds them to the database
+# report prints win rates by class, how each move did, and how long matches lasted
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default, convert):
+        if name not in args:
+            return default
+
+        i = args.index(name)
+        value = convert(args[i + 1])
+        del args[i:i + 2]
+        return value
+
+    if len(args) < 2 or args[0] not in ("ingest", "report"):
+        print("Use: ingest <database> <class> <class> ... or report <database>")
+        sys.exit(2)
+
+    command, path = args[0], args[1]
+
+    if command == "report":
+        num_players = option("--players", None, int)
+
+        with Results_Store(path) as store:
+            print_report(store, num_players)
+
+        sys.exit()
+
+    num_matches = option("--matches", 10000, int)
+    seed = option("--seed", 0, int)
+    workers = option("--workers", 1, int)
+    batch_size = option("--batch", 1000, int)
+
+    class_names = args[2:] or ["Warrior", "Mage"]
+    roster = [(f"{class_name} {i + 1}", class_name) for i, class_name in enumerate(class_names)]
+    chunk_size = 500
+
+    start = time.perf_counter()
+
+    with Results_Store(path, batch_size) as store:
+        chunks = [(seed + first, min(chunk_size, num_matches - first)) for first in range(0, num_matches, chunk_size)]
+
+        if workers <= 1:
+            for first_seed, count in chunks:
+                for summary in play_chunk(roster, first_seed, count, 200):
+                    store.add(summary)
+
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(play_chunk, roster, first_seed, count, 200) for first_seed, count in chunks]
+
+                for future in futures:
+                    for summary in future.result():
+                        store.add(summary)
+
+        total = store.match_count()
+
+    elapsed = time.perf_counter() - start
+    print(f"Added {num_matches} matches in {elapsed:.2f}s ({3600 * num_matches / elapsed:,.0f} per hour), {total} in {os.path.basename(path)}")